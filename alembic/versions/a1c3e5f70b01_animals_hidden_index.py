@@ -0,0 +1,26 @@
+"""animals hidden index
+
+Revision ID: a1c3e5f70b01
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f70b01'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_animals_hidden'), 'animals', ['hidden'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_animals_hidden'), table_name='animals')
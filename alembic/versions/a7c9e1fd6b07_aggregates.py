@@ -0,0 +1,32 @@
+"""aggregates
+
+Revision ID: a7c9e1fd6b07
+Revises: f6b8d0ec5a06
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1fd6b07'
+down_revision: Union[str, None] = 'f6b8d0ec5a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the table may already be created by the application start (create_all_tables),
+    # the counters are computed by the reconciliation at the next server start
+    if not sa.inspect(op.get_bind()).has_table('aggregates'):
+        op.create_table('aggregates',
+                        sa.Column('name', sa.String(length=256), nullable=False),
+                        sa.Column('value', sa.BigInteger(), nullable=False),
+                        sa.PrimaryKeyConstraint('name'))
+
+
+def downgrade() -> None:
+    op.drop_table('aggregates')
@@ -0,0 +1,27 @@
+"""animals photo hash
+
+Revision ID: b2d4f6a81c02
+Revises: a1c3e5f70b01
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a81c02'
+down_revision: Union[str, None] = 'a1c3e5f70b01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # photos stay in the photo column until `python manage.py migrate-photos` moves them to the photo storage
+    op.add_column('animals', sa.Column('photo_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('animals', 'photo_hash')
@@ -0,0 +1,26 @@
+"""animals version
+
+Revision ID: b8d0f2ae7c08
+Revises: a7c9e1fd6b07
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d0f2ae7c08'
+down_revision: Union[str, None] = 'a7c9e1fd6b07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('animals', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('animals', 'version')
@@ -0,0 +1,26 @@
+"""sessions expiration index
+
+Revision ID: c3e5a7b92d03
+Revises: b2d4f6a81c02
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b92d03'
+down_revision: Union[str, None] = 'b2d4f6a81c02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_sessions_expiration'), 'sessions', ['expiration'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_sessions_expiration'), table_name='sessions')
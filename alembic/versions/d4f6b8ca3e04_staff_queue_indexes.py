@@ -0,0 +1,32 @@
+"""staff queue indexes
+
+Revision ID: d4f6b8ca3e04
+Revises: c3e5a7b92d03
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8ca3e04'
+down_revision: Union[str, None] = 'c3e5a7b92d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_volunteer_applications_status_date_id', 'volunteer_applications', ['status', 'date', 'id'],
+                    unique=False)
+    op.create_index('ix_adoption_requests_status_date_id', 'adoption_requests', ['status', 'date', 'id'],
+                    unique=False)
+    op.create_index('ix_walks_status_date_id', 'walks', ['status', 'date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_walks_status_date_id', table_name='walks')
+    op.drop_index('ix_adoption_requests_status_date_id', table_name='adoption_requests')
+    op.drop_index('ix_volunteer_applications_status_date_id', table_name='volunteer_applications')
@@ -0,0 +1,62 @@
+"""walk slots
+
+Revision ID: e5a7c9db4f05
+Revises: d4f6b8ca3e04
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9db4f05'
+down_revision: Union[str, None] = 'd4f6b8ca3e04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_walks_animal_id_date', 'walks', ['animal_id', 'date'], unique=False)
+    # the table may already be created by the application start (prepare_schema)
+    if not sa.inspect(op.get_bind()).has_table('walk_slots'):
+        op.create_table('walk_slots',
+                        sa.Column('animal_id', sa.Integer(), nullable=False),
+                        sa.Column('hour', sa.DateTime(), nullable=False),
+                        sa.Column('walk_id', sa.Integer(), nullable=False),
+                        sa.ForeignKeyConstraint(['animal_id'], ['animals.id'], ondelete='CASCADE'),
+                        sa.ForeignKeyConstraint(['walk_id'], ['walks.id'], ondelete='CASCADE'),
+                        sa.PrimaryKeyConstraint('animal_id', 'hour'))
+        op.create_index(op.f('ix_walk_slots_walk_id'), 'walk_slots', ['walk_id'], unique=False)
+
+    # take the hours of the active walks, the earliest walk keeps an hour that was booked twice
+    connection = op.get_bind()
+    walks_table = sa.table('walks', sa.column('id', sa.Integer), sa.column('animal_id', sa.Integer),
+                           sa.column('date', sa.DateTime), sa.column('duration', sa.Integer),
+                           sa.column('status', sa.String))
+    slots_table = sa.table('walk_slots', sa.column('animal_id', sa.Integer), sa.column('hour', sa.DateTime),
+                           sa.column('walk_id', sa.Integer))
+    walks = connection.execute(sa.select(walks_table.c.id, walks_table.c.animal_id, walks_table.c.date,
+                                         walks_table.c.duration)
+                               .where(walks_table.c.status.not_in(['rejected', 'cancelled']))
+                               .order_by(walks_table.c.id)).all()
+    taken = set(connection.execute(sa.select(slots_table.c.animal_id, slots_table.c.hour)).all())
+    slots = []
+    for walk_id, animal_id, date, duration in walks:
+        hour = date.replace(minute=0, second=0, microsecond=0)
+        while hour < date + timedelta(minutes=duration):
+            if (animal_id, hour) not in taken:
+                taken.add((animal_id, hour))
+                slots.append({"animal_id": animal_id, "hour": hour, "walk_id": walk_id})
+            hour += timedelta(hours=1)
+    if slots:
+        op.bulk_insert(slots_table, slots)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_walk_slots_walk_id'), table_name='walk_slots')
+    op.drop_table('walk_slots')
+    op.drop_index('ix_walks_animal_id_date', table_name='walks')
@@ -0,0 +1,27 @@
+"""animals fulltext index
+
+Revision ID: f6b8d0ec5a06
+Revises: e5a7c9db4f05
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0ec5a06'
+down_revision: Union[str, None] = 'e5a7c9db4f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_animals_fulltext', 'animals', ['name', 'species', 'description'], unique=False,
+                    mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_animals_fulltext', table_name='animals')
@@ -0,0 +1,5 @@
+__all__ = ['Aggregates', 'aggregate', 'count_rows', 'bump_version', 'get_aggregates', 'reconcile_aggregates',
+           'aggregates_cache']
+
+from .counters import Aggregates, aggregate, count_rows, bump_version, get_aggregates, reconcile_aggregates, \
+    aggregates_cache
@@ -0,0 +1,280 @@
+import collections
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import event, select, func, inspect
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.database import AggregatesOrm, AnimalsOrm, AnimalStatus, WalksOrm, AdoptionRequestsOrm, VetRequestOrm, \
+    UsersOrm
+from app.database.models import VolunteerApplicationsOrm
+from app.metrics import Counter
+
+# counter changes of a database session, the pending ones are written to the aggregates table before
+# the session commits, the written ones are applied to the cached counters after it commits
+pending_key = "aggregate_changes"
+written_key = "aggregate_written"
+versions_prefix = "version."
+
+aggregate_corrections = Counter("aggregate_corrections_total",
+                                "Stored counters found wrong and fixed by the reconciliation")
+
+
+class Aggregate:
+    """
+    Counters of one model, named by the values of its columns.
+    """
+
+    def __init__(self, model: Any, columns: tuple[str, ...], names: Callable[..., list[str]]):
+        self.model = model
+        self.columns = columns
+        self.names = names
+
+
+aggregates: dict[Any, Aggregate] = {}
+
+
+def aggregate(model: Any, *columns: str) -> Callable:
+    """
+    Registers the function naming the counters a row of the model is counted in, given the values of the columns.
+    """
+
+    def decorator(names: Callable[..., list[str]]) -> Callable[..., list[str]]:
+        aggregates[model] = Aggregate(model, columns, names)
+        return names
+
+    return decorator
+
+
+@aggregate(AnimalsOrm, "status", "hidden", "species")
+def animal_counters(status: AnimalStatus, hidden: bool, species: str) -> list[str]:
+    names = [f"animals.{status.value}", "animals.hidden" if hidden else "animals.visible"]
+    if status == AnimalStatus.available and not hidden:
+        # species are free text, they are counted regardless of the case like MySQL compares them
+        names.append(f"animals.available.{species.strip().lower()}")
+    return names
+
+
+@aggregate(WalksOrm, "status")
+def walk_counters(status) -> list[str]:
+    return [f"walks.{status.value}"]
+
+
+@aggregate(AdoptionRequestsOrm, "status")
+def adoption_request_counters(status) -> list[str]:
+    return [f"adoption_requests.{status.value}"]
+
+
+@aggregate(VetRequestOrm, "status")
+def vet_request_counters(status) -> list[str]:
+    return [f"vet_requests.{status.value}"]
+
+
+@aggregate(VolunteerApplicationsOrm, "status")
+def volunteer_application_counters(status) -> list[str]:
+    return [f"volunteer_applications.{status.value}"]
+
+
+@aggregate(UsersOrm, "role")
+def user_counters(role) -> list[str]:
+    return [f"users.{role.value}"]
+
+
+def count_rows(db: Session, model: Any, rows: Iterable[Any], delta: int = 1):
+    """
+    Counts the rows added (delta 1) or removed (delta -1) from the counters of the model.
+    rows are dicts or rows with the aggregate columns, e.g. the rows changed by a set-based statement;
+    the changes of ORM objects are counted by the mapper events below.
+    """
+    model_aggregate = aggregates[model]
+    changes = db.info.setdefault(pending_key, collections.Counter())
+    for row in rows:
+        values = row if isinstance(row, dict) else row._mapping
+        for name in model_aggregate.names(*(values[column] for column in model_aggregate.columns)):
+            changes[name] += delta
+
+
+def bump_version(db: Session, name: str):
+    """
+    Increases the version counter version.<name> when the session commits, e.g. to invalidate cached pages.
+    The versions are not computed from the tables, the reconciliation leaves them alone.
+    """
+    db.info.setdefault(pending_key, collections.Counter())[f"{versions_prefix}{name}"] += 1
+
+
+def object_values(target: Any, model_aggregate: Aggregate, committed: bool) -> dict:
+    # the committed values are the ones in the database before the flush
+    state = inspect(target)
+    values = {}
+    for column in model_aggregate.columns:
+        history = state.attrs[column].history
+        values[column] = history.deleted[0] if committed and history.deleted else getattr(target, column)
+    return values
+
+
+def count_inserted(mapper, _, target):
+    model_aggregate = aggregates[mapper.class_]
+    count_rows(object_session(target), mapper.class_, [object_values(target, model_aggregate, False)], 1)
+
+
+def count_updated(mapper, _, target):
+    model_aggregate = aggregates[mapper.class_]
+    state = inspect(target)
+    if not any(state.attrs[column].history.has_changes() for column in model_aggregate.columns):
+        return
+    db = object_session(target)
+    count_rows(db, mapper.class_, [object_values(target, model_aggregate, True)], -1)
+    count_rows(db, mapper.class_, [object_values(target, model_aggregate, False)], 1)
+
+
+def count_deleted(mapper, _, target):
+    # before the delete, the values of an expired object can still be loaded
+    model_aggregate = aggregates[mapper.class_]
+    count_rows(object_session(target), mapper.class_, [object_values(target, model_aggregate, True)], -1)
+
+
+def keep_old_value(_, value, *__):
+    return value
+
+
+for counted_model, counted_aggregate in aggregates.items():
+    event.listen(counted_model, "after_insert", count_inserted)
+    event.listen(counted_model, "after_update", count_updated)
+    event.listen(counted_model, "before_delete", count_deleted)
+    # the old value of an expired column is loaded before it is replaced, so its counters can be decreased
+    for counted_column in counted_aggregate.columns:
+        event.listen(getattr(counted_model, counted_column), "set", keep_old_value, active_history=True,
+                     retval=True)
+
+
+def write_changes(session: Session):
+    changes = session.info.pop(pending_key, None)
+    changes = {name: delta for name, delta in sorted(changes.items()) if delta} if changes else None
+    if not changes:
+        return
+    table = AggregatesOrm.__table__
+    statement = insert(table).values([{"name": name, "value": delta} for name, delta in changes.items()])
+    # the counter rows are locked in the name order, so the concurrent transactions cannot deadlock on them
+    session.connection().execute(statement.on_duplicate_key_update(value=table.c.value + statement.inserted.value))
+    written = session.info.setdefault(written_key, collections.Counter())
+    for name, delta in changes.items():
+        written[name] += delta
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def write_flushed_changes(session: Session, _):
+    write_changes(session)
+
+
+@event.listens_for(Session, "before_commit")
+def write_pending_changes(session: Session):
+    # the changes of set-based statements, which are not flushed
+    write_changes(session)
+
+
+class Aggregates(dict):
+    """
+    Counter values by name, the counters never changed are 0.
+    """
+
+    def __missing__(self, name: str) -> int:
+        return 0
+
+    def group(self, prefix: str) -> dict[str, int]:
+        # e.g. group("animals.available") -> {"cat": 3, "dog": 5}, the biggest first
+        prefix += "."
+        values = {name[len(prefix):]: value for name, value in self.items() if name.startswith(prefix) and value}
+        return dict(sorted(values.items(), key=lambda item: -item[1]))
+
+
+class AggregatesCache:
+    """
+    In-process copy of the aggregates table, read again after ttl seconds to get the changes of other processes.
+    The commits of this process are applied to it right away.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.values: dict[str, int] | None = None
+        self.loaded_at = 0.0
+        # counts the applied commits, a copy read while a commit was applied is not cached
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self) -> Aggregates | None:
+        with self.lock:
+            if self.values is None or time.monotonic() - self.loaded_at > self.ttl:
+                return None
+            return Aggregates(self.values)
+
+    def set(self, values: dict[str, int], generation: int):
+        with self.lock:
+            if generation == self.generation:
+                self.values = values
+                self.loaded_at = time.monotonic()
+
+    def apply(self, changes: dict[str, int]):
+        with self.lock:
+            self.generation += 1
+            if self.values is not None:
+                for name, delta in changes.items():
+                    self.values[name] = self.values.get(name, 0) + delta
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.values = None
+
+
+aggregates_cache = AggregatesCache(settings.AGGREGATES_CACHE_TTL)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_written_changes(session: Session):
+    changes = session.info.pop(written_key, None)
+    if changes:
+        aggregates_cache.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changes(session: Session):
+    session.info.pop(pending_key, None)
+    session.info.pop(written_key, None)
+
+
+def get_aggregates(db: Session) -> Aggregates:
+    """
+    Returns all the counters, from the process cache or by one read of the small aggregates table.
+    Async handlers call it with AsyncSession.run_sync.
+    """
+    values = aggregates_cache.get()
+    if values is not None:
+        return values
+    generation = aggregates_cache.generation
+    values = dict(db.execute(select(AggregatesOrm.name, AggregatesOrm.value)).all())
+    aggregates_cache.set(values, generation)
+    return Aggregates(values)
+
+
+def reconcile_aggregates(db: Session) -> dict[str, int]:
+    """
+    Recomputes all the counters from the counted tables and fixes the stored ones, returns the corrections.
+    """
+    # the stored counters are locked before the tables are counted, so a transaction committed meanwhile
+    # either is in the counts or changes the counters after the corrections
+    stored = dict(db.execute(select(AggregatesOrm.name, AggregatesOrm.value).with_for_update()).all())
+    actual = collections.Counter()
+    for model, model_aggregate in aggregates.items():
+        columns = [getattr(model, column) for column in model_aggregate.columns]
+        for *values, count in db.execute(select(*columns, func.count()).group_by(*columns)):
+            for name in model_aggregate.names(*values):
+                actual[name] += count
+    corrections = {name: actual[name] - stored.get(name, 0) for name in stored.keys() | actual.keys()
+                   if actual[name] != stored.get(name, 0) and not name.startswith(versions_prefix)}
+    db.info[pending_key] = collections.Counter(corrections)
+    db.commit()
+    aggregate_corrections.inc(len(corrections))
+    return corrections
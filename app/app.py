@@ -1,48 +1,154 @@
-import os
-from contextlib import asynccontextmanager
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager, suppress
+from math import ceil
 
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import false, select
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
-from starlette.status import HTTP_200_OK
+from starlette.responses import RedirectResponse, Response
+from starlette.status import HTTP_200_OK, HTTP_503_SERVICE_UNAVAILABLE
 
+from app.aggregates import get_aggregates, reconcile_aggregates
+from app.assets import asset_manifest, asset_url, asset_response
+from app.catalog import CatalogQuery, search_animals
 from app.config import settings
-from app.database import get_db, db_dependency, UsersOrm, Role, AnimalsOrm, create_all_tables
+from app.database import get_db, async_db_dependency, UsersOrm, Role, AnimalsOrm, AnimalStatus, AggregatesOrm, \
+    prepare_schema, async_engine, sweep_expired_sessions, statement_budget, StatementBudgetMiddleware, \
+    DatabaseErrorMiddleware
+from app.metrics import Gauge, MetricsServer
 from app.password import hash_password
+from app.photos import PhotoSize, photo_pool, photo_storage, photo_response, photo_hash_pattern, immutable_cache_control, \
+    revalidate_cache_control
 from app.routers import *
-from app.utils import session_dependency, templates
+from app.utils import session_dependency, templates, cache_page
+
+
+# Application messages are logged together with the server log
+logger = logging.getLogger("uvicorn.error")
+
+
+def sweep_sessions():
+    db = next(get_db())
+    try:
+        removed, duration = sweep_expired_sessions(db, settings.SESSION_SWEEP_BATCH_SIZE)
+    finally:
+        db.close()
+    logger.info(f"Removed {removed} expired sessions in {duration:.3f}s")
+
+
+def reconcile_aggregates_job():
+    db = next(get_db())
+    try:
+        corrections = reconcile_aggregates(db)
+    finally:
+        db.close()
+    if corrections:
+        logger.warning(f"Reconciliation corrected {len(corrections)} counters: {corrections}")
+
+
+async def reconcile_aggregates_periodically():
+    # the counters drift only if rows are changed by statements which do not count them
+    while True:
+        await asyncio.sleep(settings.AGGREGATES_RECONCILE_INTERVAL)
+        try:
+            await run_in_threadpool(reconcile_aggregates_job)
+        except SQLAlchemyError as exc:
+            logger.warning(f"Aggregates reconciliation failed: {exc}")
+
+
+async def sweep_sessions_periodically():
+    # remove the expired sessions, most of them are never used again to be removed by get_session
+    while True:
+        await asyncio.sleep(settings.SESSION_SWEEP_INTERVAL)
+        try:
+            await run_in_threadpool(sweep_sessions)
+        except SQLAlchemyError as exc:
+            logger.warning(f"Expired sessions sweep failed: {exc}")
+
+
+# Accounts of every role, created on the first start, the password is the username
+default_users = {"admin": Role.admin, "staff": Role.staff, "vet": Role.vet, "volunteer": Role.volunteer,
+                 "registered": Role.registered}
+
+startup_duration = Gauge("startup_duration_seconds", "Duration of the application startup steps", ("step",))
+
+
+class StartupTimer:
+    """
+    Durations of the startup steps, logged and exported as metrics once the application is ready.
+    """
+
+    def __init__(self):
+        self.steps: dict[str, float] = {}
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = time.perf_counter() - start
+
+    def report(self):
+        for name, duration in self.steps.items():
+            startup_duration.set(duration, step=name)
+        steps = ", ".join(f"{name} {duration * 1000:.0f}ms" for name, duration in self.steps.items())
+        logger.info(f"Started in {sum(self.steps.values()) * 1000:.0f}ms ({steps})")
+
+
+def seed_default_users(db: Session):
+    # one query on every start, the passwords are hashed only for the accounts which are missing
+    existing = set(db.scalars(select(UsersOrm.username).where(UsersOrm.username.in_(default_users))))
+    missing = [(username, role) for username, role in default_users.items() if username not in existing]
+    if missing:
+        db.add_all([UsersOrm(username=username, name=username, password=hash_password(username), role=role)
+                    for username, role in missing])
+        db.commit()
 
 
 @asynccontextmanager
 async def lifespan(_):
-    # create all tables if not exists
-    create_all_tables()
-    # create a session to add the admin user if not exists
+    timer = StartupTimer()
+    with timer.step("assets"):
+        # fingerprint and compress the static files changed since the last build
+        asset_manifest.build()
+    with timer.step("schema"):
+        prepare_schema()
     start_db = next(get_db())
-    # add admin user if not exists
-    if not UsersOrm.get_user(start_db, "admin"):
-        # add admin user with password "admin"
-        start_db.add(UsersOrm(username="admin", name="admin", password=hash_password("admin"), role=Role.admin))
-    if not UsersOrm.get_user(start_db, "staff"):
-        # add staff user with password "staff"
-        start_db.add(UsersOrm(username="staff", name="staff", password=hash_password("staff"), role=Role.staff))
-    if not UsersOrm.get_user(start_db, "vet"):
-        # add vet user with password "vet"
-        start_db.add(UsersOrm(username="vet", name="vet", password=hash_password("vet"), role=Role.vet))
-    if not UsersOrm.get_user(start_db, "volunteer"):
-        # add volunteer user with password "volunteer"
-        start_db.add(
-            UsersOrm(username="volunteer", name="volunteer", password=hash_password("volunteer"), role=Role.volunteer))
-    if not UsersOrm.get_user(start_db, "registered"):
-        # add user registered with password "registered"
-        start_db.add(UsersOrm(username="registered", name="registered", password=hash_password("registered"),
-                              role=Role.registered))
-    start_db.commit()
-    start_db.close()
+    try:
+        with timer.step("users"):
+            seed_default_users(start_db)
+        with timer.step("aggregates"):
+            # the counters of an installation upgraded from a version without them
+            if not start_db.scalar(select(AggregatesOrm.name).limit(1)):
+                reconcile_aggregates(start_db)
+    finally:
+        start_db.close()
+    timer.report()
+    metrics_server = MetricsServer(settings.METRICS_HOST, settings.METRICS_PORT) if settings.METRICS_PORT else None
+    if metrics_server:
+        metrics_server.start()
+    sweeper = asyncio.create_task(sweep_sessions_periodically()) if settings.SESSION_SWEEP_INTERVAL > 0 else None
+    reconciler = (asyncio.create_task(reconcile_aggregates_periodically())
+                  if settings.AGGREGATES_RECONCILE_INTERVAL > 0 else None)
     yield
+    for task in (sweeper, reconciler):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    if metrics_server:
+        metrics_server.stop()
+    # stop the photo processing workers
+    photo_pool.shutdown()
+    # close the async database connections
+    await async_engine.dispose()
 
 
 # Create the FastAPI app
@@ -66,21 +172,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+app.add_middleware(StatementBudgetMiddleware)
 
 
-@app.exception_handler(SQLAlchemyError)
-async def sqlalchemy_error_handler(request: Request, exc: SQLAlchemyError):
-    # Make a task to terminate the app after 30 seconds
-    os.system("sleep 30 && kill -9 " + str(os.getpid()) + " &")
-    # Return a response with the error
+def database_error_page(request: Request, exc: SQLAlchemyError) -> Response:
+    # the connections are replaced by the pool, the next request is served as soon as the database is back
     return templates.TemplateResponse("database_error.html",
                                       {
                                           "request": request,
                                           "error": str(exc)
-                                      })
+                                      },
+                                      status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                                      headers={"Retry-After": str(ceil(settings.DB_BREAKER_COOLDOWN))})
+
+
+app.add_middleware(DatabaseErrorMiddleware, error_response=database_error_page)
 
 
 @app.get("/", status_code=HTTP_200_OK)
+@cache_page
 async def index_page(request: Request, session: session_dependency):
     return templates.TemplateResponse("index.html",
                                       {
@@ -90,16 +200,29 @@ async def index_page(request: Request, session: session_dependency):
 
 
 @app.get("/animals", status_code=HTTP_200_OK)
-async def animals_page(request: Request, db: db_dependency, session: session_dependency, page: int = 1):
-    animals_list = db.query(AnimalsOrm).all()
-    # sort animals by hidden status, so hidden animals will be displayed at the end
-    animals_list.sort(key=lambda x: x.hidden)
-    # slice the list to display only the animals on the current page
-    display_animals = animals_list[(page - 1) * settings.PAGE_SIZE:page * settings.PAGE_SIZE]
-    pages = len(animals_list) // settings.PAGE_SIZE + 1
+@statement_budget(3)
+@cache_page
+async def animals_page(request: Request, db: async_db_dependency, session: session_dependency, page: int = 1):
+    animals_filter = []
+    aggregates = await db.run_sync(get_aggregates)
+    # the animals are counted by the maintained counters instead of scanning the table
+    animals_count = aggregates["animals.visible"]
+    if session and session.user.is_staff:
+        animals_count += aggregates["animals.hidden"]
+    else:
+        # hidden animals are displayed only to the staff
+        animals_filter.append(AnimalsOrm.hidden == false())
+    pages = max(1, ceil(animals_count / settings.PAGE_SIZE))
     if page > pages or page < 1:
         # if the page is out of range, redirect to the first page
         return RedirectResponse(url="/animals")
+    # sort animals by hidden status, so hidden animals will be displayed at the end,
+    # and load only the animals on the current page (photo column is deferred)
+    display_animals = (await db.scalars(select(AnimalsOrm)
+                                        .where(*animals_filter)
+                                        .order_by(AnimalsOrm.hidden, AnimalsOrm.id)
+                                        .offset((page - 1) * settings.PAGE_SIZE)
+                                        .limit(settings.PAGE_SIZE))).all()
     return templates.TemplateResponse("animals.html",
                                       {
                                           "request": request,
@@ -110,17 +233,55 @@ async def animals_page(request: Request, db: db_dependency, session: session_dep
                                       })
 
 
+@app.get("/animals/search", status_code=HTTP_200_OK)
+@statement_budget(3)
+@cache_page
+async def animals_search_page(request: Request, db: async_db_dependency, session: session_dependency, q: str = "",
+                              species: str | None = None, status: AnimalStatus | None = None, age: str | None = None,
+                              page: int = 1):
+    query = CatalogQuery(q, species, status, age)
+    result = await search_animals(db, query, page, visible_only=not (session and session.user.is_staff))
+    return templates.TemplateResponse("animals_search.html",
+                                      {
+                                          "request": request,
+                                          "user": session.user,
+                                          "query": query,
+                                          "result": result
+                                      })
+
+
 @app.get("/animals/{animal_id}/photo", status_code=HTTP_200_OK)
-async def animal_photo(animal_id: int, db: db_dependency):
-    animal = db.query(AnimalsOrm).filter(AnimalsOrm.id == animal_id).first()
-    if not animal or not animal.photo:
-        return RedirectResponse(url="/static/no-image-available.jpg")
-    return HTMLResponse(content=animal.photo, media_type="image/jpeg")
+@statement_budget(2)
+async def animal_photo(request: Request, animal_id: int, db: async_db_dependency,
+                       size: PhotoSize = PhotoSize.profile):
+    # load only the photo hash and whether there is a legacy inline photo, not the whole animal row
+    row = (await db.execute(select(AnimalsOrm.photo_hash, AnimalsOrm.photo.is_not(None))
+                            .where(AnimalsOrm.id == animal_id))).first()
+    if not row:
+        return RedirectResponse(url=asset_url("no-image-available.jpg"))
+    photo_hash, has_inline_photo = row
+    if photo_hash and photo_storage.exists(photo_hash):
+        return photo_response(request, photo_hash, size, revalidate_cache_control)
+    if has_inline_photo:
+        # photo was not migrated to the photo storage yet
+        photo = await db.scalar(select(AnimalsOrm.photo).where(AnimalsOrm.id == animal_id))
+        return Response(content=photo, media_type="image/jpeg")
+    return RedirectResponse(url=asset_url("no-image-available.jpg"))
+
+
+@app.get("/photos/{photo_hash}", status_code=HTTP_200_OK)
+async def stored_photo(request: Request, photo_hash: str, size: PhotoSize = PhotoSize.profile):
+    # the url is content-addressed, so the photo can be cached forever
+    if not photo_hash_pattern.match(photo_hash) or not photo_storage.exists(photo_hash):
+        return RedirectResponse(url=asset_url("no-image-available.jpg"))
+    return photo_response(request, photo_hash, size, immutable_cache_control)
 
 
 @app.get("/animals/{animal_id}/profile")
-async def animal_profile(request: Request, animal_id: int, db: db_dependency, session: session_dependency):
-    animal = db.query(AnimalsOrm).filter(AnimalsOrm.id == animal_id).first()
+@statement_budget(2)
+@cache_page
+async def animal_profile(request: Request, animal_id: int, db: async_db_dependency, session: session_dependency):
+    animal = await db.get(AnimalsOrm, animal_id)
     if not animal:
         return RedirectResponse(url="/animals")
     return templates.TemplateResponse("animal/profile.html",
@@ -146,6 +307,12 @@ async def dashboard(session: session_dependency):
     return RedirectResponse(url="/")
 
 
+@app.get("/assets/{name:path}", status_code=HTTP_200_OK)
+async def asset(request: Request, name: str):
+    return asset_response(request, name)
+
+
 @app.get("/favicon.ico")
 async def favicon():
-    return RedirectResponse(url="/static/favicon.ico")
+    # the browsers ask for it on every page, the redirect is cached for a day
+    return RedirectResponse(url=asset_url("favicon.ico"), headers={"Cache-Control": "public, max-age=86400"})
@@ -0,0 +1,4 @@
+__all__ = ['build_assets', 'AssetManifest', 'asset_manifest', 'asset_url', 'asset_response']
+
+from .build import build_assets
+from .files import AssetManifest, asset_manifest, asset_url, asset_response
@@ -0,0 +1,79 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+try:
+    import brotli
+except ImportError:
+    # the brotli variants are not made, the assets are served gzipped
+    brotli = None
+
+logger = logging.getLogger("uvicorn.error")
+
+# files worth compressing, images and fonts are compressed already
+compressible_suffixes = {".css", ".js", ".svg", ".ico", ".json", ".txt", ".html", ".map"}
+# content encodings of the precompressed variants, the preferred first, -> file suffix
+encodings = {"br": ".br", "gzip": ".gz"}
+manifest_name = "manifest.json"
+
+
+def fingerprinted_name(path: Path, digest: str) -> str:
+    # css/base.css -> css/base.1a2b3c4d5e6f.css
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+
+
+def write_file(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first, so a running server never serves a partially written asset
+    with NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+        tmp.write(data)
+    os.replace(tmp.name, path)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # no timestamp in the header, so the same file always compresses to the same bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def build_assets(source: str, output: str) -> dict[str, str]:
+    """
+    Copies every file under source to output under a name with the hash of its content,
+    with gzip and brotli variants of the text files, and writes the manifest of the names.
+    Files built before are kept and not compressed again, so a build with no changes only hashes the files.
+    Returns the manifest, the source path -> the fingerprinted path, relative to the directories.
+    """
+    source_root, output_root = Path(source), Path(output)
+    manifest = {}
+    built = 0
+    for path in sorted(source_root.rglob("*")):
+        if not path.is_file():
+            continue
+        relative = path.relative_to(source_root)
+        data = path.read_bytes()
+        name = fingerprinted_name(relative, hashlib.sha256(data).hexdigest()[:12])
+        manifest[relative.as_posix()] = name
+        target = output_root / name
+        if target.is_file():
+            continue
+        built += 1
+        if path.suffix in compressible_suffixes:
+            for encoding, suffix in encodings.items():
+                if encoding == "br" and brotli is None:
+                    continue
+                compressed = compress(data, encoding)
+                # a variant is kept only if it is smaller than the file itself
+                if len(compressed) < len(data):
+                    write_file(target.with_name(target.name + suffix), compressed)
+        # the file itself last, its presence marks the asset as built
+        write_file(target, data)
+    write_file(output_root / manifest_name, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    if brotli is None:
+        logger.warning("brotli is not installed, the static assets are served without brotli variants")
+    logger.info(f"Built {built} of {len(manifest)} static assets")
+    return manifest
@@ -0,0 +1,86 @@
+import mimetypes
+from pathlib import Path
+
+from fastapi import Request
+from starlette.responses import FileResponse, Response, RedirectResponse
+
+from app.config import settings
+from .build import encodings, build_assets
+
+# Fingerprinted urls never change their content
+immutable_cache_control = "public, max-age=31536000, immutable"
+
+
+class AssetManifest:
+    """
+    Fingerprinted names of the static files, read from the manifest of the last build.
+    """
+
+    def __init__(self, url_path: str, static_path: str, build_path: str):
+        self.url_path = url_path.rstrip("/")
+        self.static_path = static_path
+        self.build_path = Path(build_path)
+        self.names: dict[str, str] = {}
+        self.built: set[str] = set()
+
+    def build(self):
+        self.names = build_assets(self.static_path, str(self.build_path))
+        self.built = set(self.names.values())
+
+    def url(self, path: str) -> str:
+        """
+        Returns the fingerprinted url of the static file, or its plain static url if it is not built.
+        """
+        name = self.names.get(path)
+        if name is None:
+            return f"{settings.APP_STATIC_PATH.rstrip('/')}/{path}"
+        return f"{self.url_path}/{name}"
+
+
+asset_manifest = AssetManifest("/assets", "static", settings.ASSETS_BUILD_PATH)
+
+
+def asset_url(path: str) -> str:
+    return asset_manifest.url(path)
+
+
+def accepted_encodings(request: Request) -> set[str]:
+    # content codings from the Accept-Encoding header, except the explicitly refused ones (q=0)
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = next((param.split("=", 1)[1] for param in params if param.startswith("q=")), "1")
+        try:
+            if float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.lower())
+    return accepted
+
+
+def asset_response(request: Request, name: str) -> Response:
+    """
+    Serves a fingerprinted static file, precompressed in the best encoding the client accepts.
+    Unknown names (e.g. of an older build) are redirected to the current build of the file.
+    """
+    if name not in asset_manifest.built:
+        return RedirectResponse(url=asset_manifest.url(unfingerprinted(name)))
+    path = asset_manifest.build_path / name
+    # the response depends on Accept-Encoding, caches must keep the encodings apart
+    headers = {"Cache-Control": immutable_cache_control, "Vary": "Accept-Encoding"}
+    accepted = accepted_encodings(request)
+    for encoding, suffix in encodings.items():
+        variant = path.with_name(path.name + suffix)
+        if encoding in accepted and variant.is_file():
+            headers["Content-Encoding"] = encoding
+            # the media type is guessed from the name of the file itself, not of the variant
+            return FileResponse(variant, headers=headers, media_type=mimetypes.guess_type(path.name)[0])
+    return FileResponse(path, headers=headers)
+
+
+def unfingerprinted(name: str) -> str:
+    # css/base.1a2b3c4d5e6f.css -> css/base.css
+    path = Path(name)
+    stem, _, _ = path.stem.rpartition(".")
+    return path.with_name(f"{stem or path.stem}{path.suffix}").as_posix()
@@ -0,0 +1,3 @@
+__all__ = ['age_bands', 'CatalogQuery', 'CatalogResult', 'search_animals']
+
+from .search import age_bands, CatalogQuery, CatalogResult, search_animals
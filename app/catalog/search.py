@@ -0,0 +1,120 @@
+import re
+from collections import Counter
+from math import ceil
+from urllib.parse import urlencode
+
+from sqlalchemy import select, func, case, false, ColumnElement
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AnimalsOrm, AnimalStatus
+
+# age bands of the catalog facets, name -> highest age in the band + 1 (None for the last band)
+age_bands = {"young": 3, "adult": 8, "senior": None}
+# shorter words are not in the fulltext index (innodb_ft_min_token_size)
+min_word_length = 3
+word_pattern = re.compile(r"\w+")
+
+age_band = case(*[(AnimalsOrm.age < limit, band) for band, limit in age_bands.items() if limit is not None],
+                else_=list(age_bands)[-1])
+
+
+class CatalogQuery:
+    """
+    Parsed catalog search, the words matched against the name, species and description, and the facet filters.
+    Words naming an age band are taken as the age filter, so "young black cat" finds black cats younger than 3.
+    """
+
+    def __init__(self, text: str = "", species: str | None = None, status: AnimalStatus | None = None,
+                 age: str | None = None):
+        self.text = text
+        self.species = species
+        self.status = status
+        self.age = age if age in age_bands else None
+        self.words = []
+        for word in word_pattern.findall(text.lower()):
+            if word in age_bands and self.age is None:
+                self.age = word
+            elif len(word) >= min_word_length:
+                self.words.append(word)
+
+    def filters(self) -> dict[str, str | None]:
+        return {"species": self.species, "status": self.status.value if self.status else None, "age": self.age}
+
+    def url(self, **changes) -> str:
+        params = {"q": self.text, **self.filters(), **changes}
+        return "/animals/search?" + urlencode({key: value for key, value in params.items() if value})
+
+
+class CatalogResult:
+    """
+    One page of the search results, with the facet counts of the whole result.
+    Every facet counts the animals matching the other filters, so the other values of a filtered facet stay visible.
+    """
+
+    def __init__(self, animals: list[AnimalsOrm], total: int, page: int, facets: dict[str, Counter]):
+        self.animals = animals
+        self.total = total
+        self.page = page
+        self.pages = max(1, ceil(total / settings.PAGE_SIZE))
+        self.facets = facets
+
+
+def text_match(words: list[str]) -> ColumnElement:
+    # every word is required and matched as a prefix, so "cat" finds "cats" too
+    return match(AnimalsOrm.name, AnimalsOrm.species, AnimalsOrm.description,
+                 against=" ".join(f"+{word}*" for word in words)).in_boolean_mode()
+
+
+def count_facets(groups: list, query: CatalogQuery) -> tuple[int, dict[str, Counter]]:
+    filters = query.filters()
+    facets = {facet: Counter() for facet in filters}
+    total = 0
+    for species, status, band, count in groups:
+        values = {"species": species, "status": status.value, "age": band}
+        # species are compared as MySQL compares them, regardless of the case
+        matches = {facet: filters[facet] is None or str(values[facet]).lower() == filters[facet].lower()
+                   for facet in filters}
+        if all(matches.values()):
+            total += count
+        for facet in facets:
+            if all(matched for other, matched in matches.items() if other != facet):
+                facets[facet][values[facet]] += count
+    return total, facets
+
+
+async def search_animals(db: AsyncSession, query: CatalogQuery, page: int, visible_only: bool) -> CatalogResult:
+    """
+    Searches the catalog with two queries: the facet counts of all the matching animals, grouped by
+    (species, status, age band), and the requested page of the animals ordered by relevance.
+    The words are matched by the fulltext index of the animals.
+    """
+    conditions = []
+    if visible_only:
+        conditions.append(AnimalsOrm.hidden == false())
+    if query.words:
+        conditions.append(text_match(query.words))
+
+    groups = (await db.execute(select(AnimalsOrm.species, AnimalsOrm.status, age_band, func.count())
+                               .where(*conditions)
+                               .group_by(AnimalsOrm.species, AnimalsOrm.status, age_band))).all()
+    total, facets = count_facets(groups, query)
+    if not total:
+        return CatalogResult([], 0, 1, facets)
+
+    if query.species:
+        conditions.append(AnimalsOrm.species == query.species)
+    if query.status:
+        conditions.append(AnimalsOrm.status == query.status)
+    if query.age:
+        conditions.append(age_band == query.age)
+    # the same match expression orders by relevance, MySQL computes it once per row
+    order = [text_match(query.words).desc()] if query.words else []
+    page = min(max(page, 1), max(1, ceil(total / settings.PAGE_SIZE)))
+    animals = (await db.scalars(select(AnimalsOrm)
+                                .where(*conditions)
+                                .order_by(*order, AnimalsOrm.hidden, AnimalsOrm.id)
+                                .offset((page - 1) * settings.PAGE_SIZE)
+                                .limit(settings.PAGE_SIZE))).all()
+    return CatalogResult(list(animals), total, page, facets)
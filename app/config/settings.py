@@ -12,15 +12,50 @@ class Settings(BaseSettings):
     APP_STATIC_PATH: str
     APP_TEMPLATES_PATH: str
     SQL_ALCHEMY_DEBUG: bool
+    STATEMENT_BUDGET_STRICT: bool
     SSL_CERT_ENABLED: bool
     SSL_CERT_PATH: str
     SSL_KEY_PATH: str
     PAGE_SIZE: int
+    QUEUE_PAGE_SIZE: int
+    SESSION_CACHE_SIZE: int
+    SESSION_CACHE_TTL: float
+    SESSION_SWEEP_INTERVAL: float
+    SESSION_SWEEP_BATCH_SIZE: int
+    PASSWORD_HASH_ROUNDS: int
+    PASSWORD_HASH_WORKERS: int
+    PASSWORD_HASH_QUEUE_SIZE: int
+    PHOTO_STORAGE_PATH: str
+    PHOTO_WORKERS: int
+    PHOTO_QUEUE_SIZE: int
+    PHOTO_TIMEOUT: float
+    AVAILABILITY_CACHE_SIZE: int
+    AVAILABILITY_CACHE_TTL: float
+    IMPORT_CHUNK_SIZE: int
+    IMPORT_MAX_PHOTO_MB: int
+    EXPORT_BATCH_SIZE: int
+    AGGREGATES_CACHE_TTL: float
+    AGGREGATES_RECONCILE_INTERVAL: float
+    PAGE_CACHE_SIZE: int
+    PAGE_CACHE_TTL: float
+    PAGE_CACHE_STALE: float
+    ASSETS_BUILD_PATH: str
+    DB_POOL_RECYCLE: int
+    DB_RETRY_ATTEMPTS: int
+    DB_RETRY_BACKOFF: float
+    DB_BREAKER_THRESHOLD: int
+    DB_BREAKER_COOLDOWN: float
+    METRICS_HOST: str
+    METRICS_PORT: int
 
     @property
     def database_url(self) -> str:
         return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def async_database_url(self) -> str:
+        return f"mysql+aiomysql://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
     # Get data from .env file, if it is not found, get it from .env.template
     model_config = SettingsConfigDict(env_file=(".env.template", ".env"))
 
@@ -1,11 +1,18 @@
 __all__ = [
-    'Base', 'get_db', 'db_dependency', 'create_all_tables',
+    'Base', 'get_db', 'db_dependency', 'get_async_db', 'async_db_dependency', 'async_engine',
     'Role', 'UsersOrm', 'SessionsOrm', 'AdoptionStatus', 'AdoptionRequestsOrm',
-    'AnimalStatus', 'AnimalsOrm', 'WalksOrm', 'MedicalHistoriesOrm',
-    'TreatmentsOrm', 'VaccinationsOrm', 'WalkStatus', 'VetRequestStatus', 'VetRequestOrm'
+    'AnimalStatus', 'AnimalsOrm', 'WalksOrm', 'WalkSlotsOrm', 'MedicalHistoriesOrm',
+    'TreatmentsOrm', 'VaccinationsOrm', 'WalkStatus', 'VetRequestStatus', 'VetRequestOrm', 'AggregatesOrm',
+    'sweep_expired_sessions', 'prepare_schema', 'SchemaState', 'statement_budget', 'StatementBudgetMiddleware',
+    'database_breaker', 'DatabaseUnavailable', 'DatabaseErrorMiddleware'
 ]
 
-from .database import Base, get_db, db_dependency, create_all_tables
+from .database import Base, get_db, db_dependency, get_async_db, async_db_dependency, \
+    async_engine
 from .models import Role, UsersOrm, SessionsOrm, AdoptionStatus, AdoptionRequestsOrm \
-    , AnimalStatus, AnimalsOrm, WalksOrm, MedicalHistoriesOrm \
-    , TreatmentsOrm, VaccinationsOrm, WalkStatus, VetRequestStatus, VetRequestOrm
+    , AnimalStatus, AnimalsOrm, WalksOrm, WalkSlotsOrm, MedicalHistoriesOrm \
+    , TreatmentsOrm, VaccinationsOrm, WalkStatus, VetRequestStatus, VetRequestOrm, AggregatesOrm
+from .maintenance import sweep_expired_sessions
+from .schema import prepare_schema, SchemaState
+from .budget import statement_budget, StatementBudgetMiddleware
+from .resilience import database_breaker, DatabaseUnavailable, DatabaseErrorMiddleware
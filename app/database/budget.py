@@ -0,0 +1,123 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from sqlalchemy import Connection, event
+from sqlalchemy.engine import ExecutionContext
+from starlette.types import ASGIApp, Scope, Receive, Send
+
+from app.config import settings
+from app.metrics import Counter, Summary
+from .database import engine, async_engine
+
+logger = logging.getLogger("uvicorn.error")
+
+statement_budget_exceeded = Counter("db_statement_budget_exceeded_total",
+                                    "Requests that ran more SQL statements than the budget of their route", ("route",))
+route_statements = Summary("db_route_statements", "SQL statements run by the requests of the route", ("route",))
+route_duration = Summary("db_route_duration_seconds", "Time the requests of the route waited for the SQL statements",
+                         ("route",))
+route_rows = Summary("db_route_rows_fetched", "Rows returned by the SELECTs of the requests of the route", ("route",))
+
+
+class StatementBudgetExceeded(AssertionError):
+    pass
+
+
+class StatementCounter:
+    """
+    SQL statements run while serving one request, with the time they took and the rows they returned.
+    The budget is read from the endpoint, which is known once the request is routed.
+    """
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.rows = 0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", self.scope["path"])
+
+    @property
+    def budget(self) -> int | None:
+        return getattr(self.scope.get("endpoint"), "statement_budget", None)
+
+
+current_counter: ContextVar[StatementCounter | None] = ContextVar("current_counter", default=None)
+
+
+def statement_budget(budget: int) -> Callable:
+    """
+    Declares how many SQL statements the route may run, including the session lookup.
+    Going over the budget is logged, and fails the request if STATEMENT_BUDGET_STRICT is set.
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.statement_budget = budget
+        return endpoint
+
+    return decorator
+
+
+def count_statement(connection: Connection, *_):
+    counter = current_counter.get()
+    if counter is None:
+        return
+    counter.count += 1
+    budget = counter.budget
+    if budget is not None and counter.count > budget and settings.STATEMENT_BUDGET_STRICT:
+        # fail the statement itself, so the test run points at the query over the budget
+        raise StatementBudgetExceeded(f"{counter.route} ran more than {budget} SQL statements")
+    connection.info["statement_start"] = time.perf_counter()
+
+
+def measure_statement(connection: Connection, cursor: Any, _, __, context: ExecutionContext, ___):
+    counter = current_counter.get()
+    start = connection.info.pop("statement_start", None)
+    if counter is None or start is None:
+        return
+    counter.duration += time.perf_counter() - start
+    # the drivers buffer the result, its rowcount is the number of rows, it is -1 for the streamed results
+    if not (context.isinsert or context.isupdate or context.isdelete) and cursor.rowcount > 0:
+        counter.rows += cursor.rowcount
+
+
+# the async engine runs its statements on the sync engine it wraps
+for counted_engine in (engine, async_engine.sync_engine):
+    event.listen(counted_engine, "before_cursor_execute", count_statement)
+    event.listen(counted_engine, "after_cursor_execute", measure_statement)
+
+
+class StatementBudgetMiddleware:
+    """
+    Counts the SQL statements of every request and reports the routes that go over their statement_budget.
+    The statements, their time and rows are also summed by route, for the routes worth optimizing.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # the counter is shared with the thread pool, which runs the handlers in a copy of this context
+        counter = StatementCounter(scope)
+        token = current_counter.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_counter.reset(token)
+            # requests which are not routed (not found) are left out, their paths are unbounded
+            if "route" in scope:
+                route_statements.observe(counter.count, route=counter.route)
+                route_duration.observe(counter.duration, route=counter.route)
+                route_rows.observe(counter.rows, route=counter.route)
+            budget = counter.budget
+            if budget is not None and counter.count > budget:
+                statement_budget_exceeded.inc(route=counter.route)
+                logger.warning(f"{counter.route} ran {counter.count} SQL statements, its budget is {budget}")
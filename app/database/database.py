@@ -1,39 +1,65 @@
-from typing import Annotated as typingAnnotated, Generator
+from typing import Annotated as typingAnnotated, Generator, AsyncGenerator
 
 from fastapi import Depends
 from sqlalchemy import create_engine, String
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
 
 from app.config import settings
+from .instrumentation import InstrumentedQueuePool, InstrumentedAsyncQueuePool, monitor_pool
+from .resilience import database_breaker
 
 # Database engine
 engine = create_engine(
     url=settings.database_url,
     echo=settings.SQL_ALCHEMY_DEBUG,
     pool_size=10,
-    max_overflow=10
+    max_overflow=10,
+    # a connection closed by the server or the network is replaced before use, not failing a request
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    poolclass=InstrumentedQueuePool
 )
 
+database_breaker.watch(engine)
+monitor_pool("sync", engine)
+
 # Session factory for the database
 session_factory = sessionmaker(bind=engine)
 
+# Async database engine, it does not block the event loop while waiting for MySQL
+async_engine = create_async_engine(
+    url=settings.async_database_url,
+    echo=settings.SQL_ALCHEMY_DEBUG,
+    pool_size=10,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    poolclass=InstrumentedAsyncQueuePool
+)
+
+# the async engine runs its statements on the sync engine it wraps
+database_breaker.watch(async_engine.sync_engine)
+monitor_pool("async", async_engine.sync_engine)
+
+# Async session factory for the database
+# objects are not expired on commit, lazy loading them again is not possible in the async mode
+async_session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
 # String annotations for MySQL to use as column types
+Str64 = typingAnnotated[str, String(64)]
 Str256 = typingAnnotated[str, String(256)]
 Str2048 = typingAnnotated[str, String(2048)]
 
 
 class Base(DeclarativeBase):
     type_annotation_map = {
+        Str64: String(64),
         Str256: String(256),
         Str2048: String(2048)
     }
 
 
-# Function to create all tables in the database if they do not exist
-def create_all_tables():
-    Base.metadata.create_all(engine)
-
-
 # Database connection generator
 def get_db() -> Generator[Session, None, None]:
     db = session_factory()
@@ -46,4 +72,17 @@ def get_db() -> Generator[Session, None, None]:
 
 
 # Dependency to get the database session in the routers
+# it is blocking, so the handlers using it have to be declared with `def` to run in the thread pool
 db_dependency = typingAnnotated[Session, Depends(get_db)]
+
+
+# Async database connection generator
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_factory() as db:
+        # yield the async database session, it is closed on exit
+        yield db
+
+
+# Dependency to get the async database session in the async handlers
+# relationships are not loaded lazily in the async mode, they have to be loaded in the query
+async_db_dependency = typingAnnotated[AsyncSession, Depends(get_async_db)]
@@ -0,0 +1,75 @@
+import time
+
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from app.metrics import Gauge, Histogram
+
+pool_checkout_wait = Histogram("db_pool_checkout_wait_seconds",
+                               "Time a session waited for a pooled connection, including opening a new one",
+                               ("engine",), buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    Queue pool timing the checkouts, a full pool makes them wait up to its timeout.
+    """
+    engine_name = "sync"
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start, engine=self.engine_name)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool, InstrumentedQueuePool):
+    engine_name = "async"
+
+
+class PoolMonitor:
+    """
+    Open connections of the pool of an engine, by when they were connected.
+    The listeners are set on the engine, so they are kept by the new pool when the engine is disposed.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        # id of the connection record -> when it was connected
+        self.connected_at: dict[int, float] = {}
+        event.listen(engine, "connect", self.track_connection)
+        event.listen(engine, "close", self.forget_connection)
+        event.listen(engine, "detach", self.forget_connection)
+
+    def track_connection(self, _, connection_record: ConnectionPoolEntry):
+        self.connected_at[id(connection_record)] = time.monotonic()
+
+    def forget_connection(self, _, connection_record: ConnectionPoolEntry):
+        self.connected_at.pop(id(connection_record), None)
+
+    @property
+    def oldest_connection_age(self) -> float:
+        return time.monotonic() - min(self.connected_at.values(), default=time.monotonic())
+
+
+# engine name -> monitor of its pool, the gauges read them when the metrics are rendered
+pool_monitors: dict[str, PoolMonitor] = {}
+
+
+def monitor_pool(name: str, engine: Engine):
+    pool_monitors[name] = PoolMonitor(engine)
+
+
+def pool_gauge(name: str, description: str, function):
+    Gauge(name, description, ("engine",),
+          function=lambda: {(engine_name,): function(monitor) for engine_name, monitor in pool_monitors.items()})
+
+
+pool_gauge("db_pool_size", "Connections the pool keeps open", lambda monitor: monitor.engine.pool.size())
+pool_gauge("db_pool_checked_out", "Connections in use by the sessions", lambda monitor: monitor.engine.pool.checkedout())
+# the overflow counts from -pool_size, it is negative until the pool is full
+pool_gauge("db_pool_overflow", "Connections open over the pool size",
+           lambda monitor: max(0, monitor.engine.pool.overflow()))
+pool_gauge("db_pool_connection_age_seconds", "Age of the oldest open connection",
+           lambda monitor: monitor.oldest_connection_age)
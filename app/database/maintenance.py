@@ -0,0 +1,33 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from app.metrics import Counter, Summary
+from .models import SessionsOrm
+
+expired_sessions_removed = Counter("expired_sessions_removed_total", "Expired sessions removed by the sweeper")
+session_sweep_duration = Summary("session_sweep_duration_seconds", "Duration of the expired sessions sweeps")
+
+
+def sweep_expired_sessions(db: Session, batch_size: int = 1000) -> tuple[int, float]:
+    """
+    Deletes expired sessions in batches of batch_size rows, so the table is never locked for long.
+    Returns the number of deleted sessions and the duration of the sweep in seconds.
+    """
+    start = time.perf_counter()
+    now = datetime.now()
+    removed = 0
+    while True:
+        # the batch is found with the expiration index and deleted by the primary key
+        ids = db.scalars(select(SessionsOrm.id).where(SessionsOrm.expiration < now).limit(batch_size)).all()
+        if not ids:
+            break
+        db.execute(delete(SessionsOrm).where(SessionsOrm.id.in_(ids)))
+        db.commit()
+        removed += len(ids)
+    duration = time.perf_counter() - start
+    expired_sessions_removed.inc(removed)
+    session_sweep_duration.observe(duration)
+    return removed, duration
@@ -3,11 +3,11 @@ from datetime import datetime
 from typing import Self
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, LargeBinary, DateTime
+from sqlalchemy import ForeignKey, LargeBinary, DateTime, Index, BigInteger
 from sqlalchemy.orm import Mapped, Session, relationship
 from sqlalchemy.testing.schema import mapped_column
 
-from .database import Base, Str256, Str2048
+from .database import Base, Str64, Str256, Str2048
 
 
 class Role(enum.Enum):
@@ -22,7 +22,32 @@ class Role(enum.Enum):
         return [role for role in cls]
 
 
-class UsersOrm(Base):
+# Role checks shared by the users and the cached session users
+class UserRolesMixin:
+    role: Role
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == Role.admin
+
+    @property
+    def is_staff(self) -> bool:
+        return self.role == Role.staff or self.is_admin
+
+    @property
+    def is_vet(self) -> bool:
+        return self.role == Role.vet or self.is_admin
+
+    @property
+    def is_volunteer(self) -> bool:
+        return self.role == Role.volunteer or self.is_admin
+
+    @property
+    def is_registered(self) -> bool:
+        return self.role == Role.registered or self.is_admin
+
+
+class UsersOrm(UserRolesMixin, Base):
     __tablename__ = 'users'
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -45,26 +70,6 @@ class UsersOrm(Base):
     def get_user(cls, db: Session, username: str) -> Self | None:
         return db.query(UsersOrm).filter(UsersOrm.username == username).first()
 
-    @property
-    def is_admin(self) -> bool:
-        return self.role == Role.admin
-
-    @property
-    def is_staff(self) -> bool:
-        return self.role == Role.staff or self.is_admin
-
-    @property
-    def is_vet(self) -> bool:
-        return self.role == Role.vet or self.is_admin
-
-    @property
-    def is_volunteer(self) -> bool:
-        return self.role == Role.volunteer or self.is_admin
-
-    @property
-    def is_registered(self) -> bool:
-        return self.role == Role.registered or self.is_admin
-
     def add_session(self, db: Session, session_id: UUID, expiration: datetime) -> UUID:
         session = SessionsOrm(user_id=self.id, token=session_id, expiration=expiration)
         db.add(session)
@@ -84,6 +89,8 @@ class ApplicationStatus(enum.Enum):
 
 class VolunteerApplicationsOrm(Base):
     __tablename__ = 'volunteer_applications'
+    # the staff queue reads the rows of one status in (date, id) order, see app.utils.StatusQueue
+    __table_args__ = (Index('ix_volunteer_applications_status_date_id', 'status', 'date', 'id'),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
@@ -100,7 +107,8 @@ class SessionsOrm(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
     token: Mapped[UUID] = mapped_column(unique=True, nullable=False)
-    expiration: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # indexed, so the expired sessions can be found without scanning the table
+    expiration: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
 
     user: Mapped["UsersOrm"] = relationship("UsersOrm", back_populates="sessions")
 
@@ -117,6 +125,8 @@ class AdoptionStatus(enum.Enum):
 
 class AdoptionRequestsOrm(Base):
     __tablename__ = 'adoption_requests'
+    # the staff queue reads the rows of one status in (date, id) order, see app.utils.StatusQueue
+    __table_args__ = (Index('ix_adoption_requests_status_date_id', 'status', 'date', 'id'),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
@@ -142,15 +152,26 @@ class AnimalStatus(enum.Enum):
 
 class AnimalsOrm(Base):
     __tablename__ = 'animals'
+    # the catalog search matches the words of these columns (see app.catalog)
+    __table_args__ = (Index('ix_animals_fulltext', 'name', 'species', 'description', mysql_prefix='FULLTEXT'),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[Str256] = mapped_column(nullable=False)
     age: Mapped[int] = mapped_column()
     species: Mapped[Str256] = mapped_column()
-    photo: Mapped[bytes] = mapped_column(LargeBinary(length=2 ** 24 - 1), nullable=True)
+    # legacy inline photo, kept only until it is moved to the photo storage (see app.photos.migrate_photos)
+    # it is deferred, so list views never pull the blob unless it is accessed explicitly
+    photo: Mapped[bytes] = mapped_column(LargeBinary(length=2 ** 24 - 1), nullable=True, deferred=True)
+    # sha256 hash of the photo in the photo storage
+    photo_hash: Mapped[Str64] = mapped_column(nullable=True)
     description: Mapped[Str2048] = mapped_column()
     status: Mapped[AnimalStatus] = mapped_column(default=AnimalStatus.available)
-    hidden: Mapped[bool] = mapped_column(default=False)
+    # indexed, so the catalog can be ordered by (hidden, id) and paginated in SQL
+    hidden: Mapped[bool] = mapped_column(default=False, index=True)
+    # incremented by every update of the row, the edits are applied only to the version they were made on
+    version: Mapped[int] = mapped_column(nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     medical_history: Mapped["MedicalHistoriesOrm"] = (
         relationship("MedicalHistoriesOrm", back_populates="animal", cascade="all, delete"))
@@ -173,6 +194,10 @@ class WalkStatus(enum.Enum):
 
 class WalksOrm(Base):
     __tablename__ = 'walks'
+    # the staff queue reads the rows of one status in (date, id) order, see app.utils.StatusQueue,
+    # and the calendars read the walks of one animal in a date range
+    __table_args__ = (Index('ix_walks_status_date_id', 'status', 'date', 'id'),
+                      Index('ix_walks_animal_id_date', 'animal_id', 'date'))
 
     id: Mapped[int] = mapped_column(primary_key=True)
     animal_id: Mapped[int] = mapped_column(ForeignKey('animals.id'), nullable=False)
@@ -186,6 +211,15 @@ class WalksOrm(Base):
     user: Mapped["UsersOrm"] = relationship("UsersOrm", back_populates="walks")
 
 
+class WalkSlotsOrm(Base):
+    __tablename__ = 'walk_slots'
+
+    # one row for every hour taken by a walk, the primary key prevents booking an animal twice in the same hour
+    animal_id: Mapped[int] = mapped_column(ForeignKey('animals.id', ondelete='CASCADE'), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    walk_id: Mapped[int] = mapped_column(ForeignKey('walks.id', ondelete='CASCADE'), nullable=False, index=True)
+
+
 class MedicalHistoriesOrm(Base):
     __tablename__ = 'medical_histories'
 
@@ -262,3 +296,11 @@ class VetRequestOrm(Base):
 
     animal: Mapped["AnimalsOrm"] = relationship("AnimalsOrm", back_populates="vet_requests")
     user: Mapped["UsersOrm"] = relationship("UsersOrm")
+
+
+class AggregatesOrm(Base):
+    __tablename__ = 'aggregates'
+
+    # counter name, e.g. walks.pending or animals.available.cat (see app.aggregates)
+    name: Mapped[Str256] = mapped_column(primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
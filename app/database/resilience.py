@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.exc import SQLAlchemyError, DBAPIError, OperationalError
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from app.config import settings
+from app.metrics import Counter, Gauge
+
+logger = logging.getLogger("uvicorn.error")
+
+database_retries = Counter("db_request_retries_total", "GET requests run again after a lost database connection",
+                           ("route",))
+database_breaker_opened = Counter("db_breaker_opened_total", "Times the database circuit breaker was opened")
+
+
+class DatabaseUnavailable(SQLAlchemyError):
+    """
+    Raised instead of connecting while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Counts the connection failures in a row of the watched engines.
+
+    After threshold failures the breaker opens for cooldown seconds, the new connections are refused at once then,
+    instead of every request waiting for the connection timeout. Once the cooldown is over the requests try
+    the database again, the first statement which succeeds closes the breaker, a failure opens it again.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+
+    def check(self):
+        if self.is_open:
+            raise DatabaseUnavailable("The database is unavailable, the circuit breaker is open")
+
+    def success(self):
+        # read without the lock, every statement passes here
+        if not self.failures:
+            return
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info("The database is available again, the circuit breaker is closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and not self.is_open:
+                self.opened_at = time.monotonic()
+                database_breaker_opened.inc()
+                logger.warning(f"The database failed {self.failures} times in a row, "
+                               f"the circuit breaker is open for {self.cooldown}s")
+
+    def watch(self, engine: Engine):
+        # the check is made when connecting, the sessions which are not used do not fail, e.g. of the cached pages
+        event.listen(engine, "do_connect", lambda *_: self.check())
+        event.listen(engine, "after_cursor_execute", lambda *_: self.success())
+        event.listen(engine, "handle_error", self.handle_error)
+
+    def handle_error(self, context: ExceptionContext):
+        # a failed ping is followed by a new connection, only that one tells whether the database is down
+        if context.is_pre_ping:
+            return
+        # lost connections and failed connects, not the errors of the statements themselves
+        if not isinstance(context.original_exception, DatabaseUnavailable) and \
+                (context.is_disconnect or context.connection is None):
+            self.failure()
+
+
+database_breaker = CircuitBreaker(settings.DB_BREAKER_THRESHOLD, settings.DB_BREAKER_COOLDOWN)
+
+Gauge("db_breaker_open", "Whether the database circuit breaker is open", function=lambda: int(database_breaker.is_open))
+
+
+# MySQL errors after which the statement did not change anything and may succeed when run again:
+# lock wait timeout, deadlock, server has gone away, lost connection during the query
+retryable_mysql_errors = {1205, 1213, 2006, 2013}
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    # the drivers raise OperationalError for the other server errors too, e.g. an unknown column, those fail again
+    return (isinstance(exc, OperationalError) and bool(exc.orig.args)
+            and exc.orig.args[0] in retryable_mysql_errors)
+
+
+class DatabaseErrorMiddleware:
+    """
+    Runs the GET and HEAD requests failing on a lost database connection again, with a growing backoff.
+    A request which still fails, or any other request failing on the database, gets the error_response.
+    The pool pings the connections before using them, so the retry gets a working connection if there is one.
+    """
+
+    def __init__(self, app: ASGIApp, error_response: Callable[[Request, SQLAlchemyError], Response]):
+        self.app = app
+        self.error_response = error_response
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = False
+
+        async def send_started(message: Message):
+            nonlocal started
+            started = True
+            await send(message)
+
+        idempotent = scope["method"] in ("GET", "HEAD")
+        attempt = 1
+        while True:
+            try:
+                await self.app(scope, receive, send_started)
+                return
+            except SQLAlchemyError as exc:
+                if started:
+                    raise
+                if (not idempotent or attempt >= settings.DB_RETRY_ATTEMPTS or not is_retryable(exc)
+                        or database_breaker.is_open):
+                    logger.warning(f"{scope['method']} {scope['path']} failed on the database: {exc}")
+                    response = self.error_response(Request(scope), exc)
+                    await response(scope, receive, send)
+                    return
+            database_retries.inc(route=getattr(scope.get("route"), "path", scope["path"]))
+            # full jitter, the requests failing together do not come back together
+            await asyncio.sleep(random.uniform(0, settings.DB_RETRY_BACKOFF * 2 ** (attempt - 1)))
+            attempt += 1
@@ -0,0 +1,47 @@
+import enum
+import logging
+
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+
+from .database import Base, engine
+from .models import UsersOrm
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class SchemaState(enum.Enum):
+    current = 'current'
+    created = 'created'
+    outdated = 'outdated'
+
+
+def migrations() -> ScriptDirectory:
+    return ScriptDirectory.from_config(Config("alembic.ini"))
+
+
+def prepare_schema() -> SchemaState:
+    """
+    Checks the revision stored in alembic_version instead of reflecting every table.
+    An up-to-date database costs one query, an empty one gets all the tables and is stamped with the head revision.
+    """
+    script = migrations()
+    # the revision of the newest migration, which the models match
+    head = script.get_current_head()
+    with engine.begin() as connection:
+        context = MigrationContext.configure(connection)
+        current = context.get_current_revision()
+        if current == head:
+            return SchemaState.current
+        if current is None and not inspect(connection).has_table(UsersOrm.__tablename__):
+            Base.metadata.create_all(connection)
+            context.stamp(script, head)
+            return SchemaState.created
+        # created by an older version of the application, the missing tables are added as before,
+        # the changes of the existing ones need the migrations
+        Base.metadata.create_all(connection)
+    logger.warning(f"The database schema is at revision {current}, the application needs {head}, "
+                   f"run `alembic upgrade head`")
+    return SchemaState.outdated
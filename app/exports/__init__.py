@@ -0,0 +1,5 @@
+__all__ = ['ExportFormat', 'export_response', 'walks_export', 'adoption_requests_export', 'vet_requests_export',
+           'medical_histories_export']
+
+from .streaming import ExportFormat, export_response
+from .queries import walks_export, adoption_requests_export, vet_requests_export, medical_histories_export
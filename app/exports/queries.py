@@ -0,0 +1,64 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import Select, select, literal
+
+from app.database import WalksOrm, AdoptionRequestsOrm, VetRequestOrm, AnimalsOrm, UsersOrm, MedicalHistoriesOrm, \
+    TreatmentsOrm, VaccinationsOrm
+
+
+def filter_range(query: Select, model, since: datetime | None, until: datetime | None,
+                 status: Enum | None = None) -> Select:
+    if since is not None:
+        query = query.where(model.date >= since)
+    if until is not None:
+        query = query.where(model.date < until)
+    if status is not None:
+        query = query.where(model.status == status)
+    # rows are streamed in the primary key order, which needs no sorting on the server
+    return query.order_by(model.id)
+
+
+def walks_export(since: datetime | None, until: datetime | None, status: Enum | None) -> list[Select]:
+    query = (select(WalksOrm.id, WalksOrm.date, WalksOrm.duration, WalksOrm.location, WalksOrm.status,
+                    WalksOrm.animal_id, AnimalsOrm.name.label("animal_name"),
+                    WalksOrm.user_id, UsersOrm.username.label("username"))
+             .join(AnimalsOrm, AnimalsOrm.id == WalksOrm.animal_id)
+             .join(UsersOrm, UsersOrm.id == WalksOrm.user_id))
+    return [filter_range(query, WalksOrm, since, until, status)]
+
+
+def adoption_requests_export(since: datetime | None, until: datetime | None, status: Enum | None) -> list[Select]:
+    query = (select(AdoptionRequestsOrm.id, AdoptionRequestsOrm.date, AdoptionRequestsOrm.status,
+                    AdoptionRequestsOrm.message, AdoptionRequestsOrm.animal_id, AnimalsOrm.name.label("animal_name"),
+                    AdoptionRequestsOrm.user_id, UsersOrm.username.label("username"))
+             .join(AnimalsOrm, AnimalsOrm.id == AdoptionRequestsOrm.animal_id)
+             .join(UsersOrm, UsersOrm.id == AdoptionRequestsOrm.user_id))
+    return [filter_range(query, AdoptionRequestsOrm, since, until, status)]
+
+
+def vet_requests_export(since: datetime | None, until: datetime | None, status: Enum | None) -> list[Select]:
+    query = (select(VetRequestOrm.id, VetRequestOrm.date, VetRequestOrm.status, VetRequestOrm.description,
+                    VetRequestOrm.animal_id, AnimalsOrm.name.label("animal_name"),
+                    VetRequestOrm.user_id, UsersOrm.username.label("username"))
+             .join(AnimalsOrm, AnimalsOrm.id == VetRequestOrm.animal_id)
+             .join(UsersOrm, UsersOrm.id == VetRequestOrm.user_id))
+    return [filter_range(query, VetRequestOrm, since, until, status)]
+
+
+def medical_histories_export(since: datetime | None, until: datetime | None,
+                             animal_id: int | None) -> list[Select]:
+    """
+    Treatments, then vaccinations, of all the medical histories, one record per row.
+    """
+    queries = []
+    for kind, model in (("treatment", TreatmentsOrm), ("vaccination", VaccinationsOrm)):
+        query = (select(literal(kind).label("kind"), model.id, model.date, model.description,
+                        MedicalHistoriesOrm.id.label("medical_history_id"),
+                        MedicalHistoriesOrm.animal_id, AnimalsOrm.name.label("animal_name"))
+                 .join(MedicalHistoriesOrm, MedicalHistoriesOrm.id == model.medical_history_id)
+                 .join(AnimalsOrm, AnimalsOrm.id == MedicalHistoriesOrm.animal_id))
+        if animal_id is not None:
+            query = query.where(MedicalHistoriesOrm.animal_id == animal_id)
+        queries.append(filter_range(query, model, since, until))
+    return queries
@@ -0,0 +1,73 @@
+import csv
+import enum
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Sequence
+
+from sqlalchemy import Select, Row
+from starlette.responses import StreamingResponse
+
+from app.config import settings
+from app.database import get_db
+
+
+class ExportFormat(enum.Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+media_types = {ExportFormat.csv: "text/csv", ExportFormat.ndjson: "application/x-ndjson"}
+
+
+def export_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def stream_rows(queries: Sequence[Select]) -> Iterator[Sequence[Row]]:
+    """
+    Yields the rows of the queries one batch of EXPORT_BATCH_SIZE rows at a time.
+    The rows are read by a server-side cursor, so only the current batch is ever held in memory.
+    """
+    # the request session is closed before the response is streamed, the export has its own
+    db = next(get_db())
+    try:
+        for query in queries:
+            result = db.execute(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+            yield from result.partitions()
+    finally:
+        db.close()
+
+
+def csv_lines(columns: Sequence[str], batches: Iterator[Sequence[Row]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # the header goes out before the first query finishes
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([export_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+
+
+def ndjson_lines(columns: Sequence[str], batches: Iterator[Sequence[Row]]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(json.dumps(dict(zip(columns, map(export_value, row)))) + "\n" for row in batch)
+
+
+def export_response(name: str, queries: Sequence[Select], export_format: ExportFormat) -> StreamingResponse:
+    """
+    Streams the rows of the queries, which select the same columns, as a CSV or NDJSON download.
+    The sync generator is run in the thread pool by the response, one batch per iteration.
+    """
+    columns = [column.name for column in queries[0].selected_columns]
+    lines = csv_lines if export_format == ExportFormat.csv else ndjson_lines
+    return StreamingResponse(lines(columns, stream_rows(queries)),
+                             media_type=media_types[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{export_format.value}"'})
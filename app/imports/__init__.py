@@ -0,0 +1,5 @@
+__all__ = ['AnimalRow', 'ImportJob', 'manifest_formats', 'create_import_job', 'get_import_job',
+           'run_import_job']
+
+from .animals import AnimalRow, ImportJob, manifest_formats, create_import_job, get_import_job, \
+    run_import_job
@@ -0,0 +1,263 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Optional
+from uuid import uuid4
+
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.aggregates import count_rows
+from app.config import settings
+from app.database import AnimalsOrm, AnimalStatus, get_db
+from app.photos import photo_pool, InvalidPhoto
+from app.utils import bump_catalog_version
+
+manifest_formats = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+# errors kept for the report, the further ones are only counted
+max_errors = 1000
+# finished jobs kept for the progress requests
+max_jobs = 20
+
+
+class AnimalRow(BaseModel):
+    name: str = Field(min_length=1, max_length=256)
+    species: str = Field(min_length=1, max_length=256)
+    age: int = Field(ge=0)
+    description: str = Field(default="", max_length=2048)
+    status: AnimalStatus = AnimalStatus.available
+    hidden: bool = False
+    # name of the photo in the photos archive
+    photo: Optional[str] = None
+
+
+class PhotoError(Exception):
+    pass
+
+
+def read_manifest(file: BinaryIO, manifest_format: str) -> Iterator[tuple[int, dict | None]]:
+    """
+    Yields the line number and the record of every manifest row, one row at a time, None for unparsable rows.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if manifest_format == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            # empty cells are missing values
+            yield reader.line_num, {key: value for key, value in record.items() if key and value not in ("", None)}
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in exc.errors())
+
+
+class ImportJob:
+    """
+    Import of animals from a CSV or JSONL manifest and an optional ZIP archive of their photos.
+
+    The manifest is parsed row by row and the photos are read from the archive one by one, so the memory
+    does not depend on the size of the import. Valid rows are inserted in chunks of chunk_size rows by one
+    multi-row INSERT per chunk, their photos are processed in the photo pool in parallel before.
+    """
+
+    def __init__(self, manifest_path: Path, manifest_format: str, photos_path: Path | None, chunk_size: int,
+                 temporary: bool = False):
+        self.id = uuid4().hex
+        self.manifest_path = manifest_path
+        self.manifest_format = manifest_format
+        self.photos_path = photos_path
+        self.chunk_size = chunk_size
+        # the files are removed when the job ends
+        self.temporary = temporary
+        self.state = "queued"
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def progress(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "state": self.state,
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "seconds": round(end - self.started_at, 3) if self.started_at else 0,
+        }
+
+    def read_photo(self, archive: zipfile.ZipFile | None, name: str) -> bytes:
+        if archive is None:
+            raise PhotoError(f"Photo {name} given without a photos archive")
+        try:
+            info = archive.getinfo(name)
+        except KeyError:
+            raise PhotoError(f"Photo {name} not found in the archive")
+        # the size is checked before reading, the archive may claim anything
+        if info.file_size > settings.IMPORT_MAX_PHOTO_MB * 2 ** 20:
+            raise PhotoError(f"Photo {name} is larger than {settings.IMPORT_MAX_PHOTO_MB} MB")
+        return archive.read(info)
+
+    def process_photos(self, archive: zipfile.ZipFile | None, chunk: list[tuple[int, AnimalRow]]) -> dict[int, str]:
+        """
+        Stores the photos of the chunk rows, returns the photo hashes by line, failed rows are left out.
+        """
+        hashes = {}
+        # at most two photos per worker are in flight, the rest of the chunk waits in the archive
+        window = settings.PHOTO_WORKERS * 2
+        in_flight: deque[tuple[int, ProcessPoolExecutor, Future]] = deque()
+
+        def collect():
+            line, executor, future = in_flight.popleft()
+            try:
+                hashes[line] = future.result(timeout=settings.PHOTO_TIMEOUT)
+            except FutureTimeoutError:
+                future.cancel()
+                self.error(line, "Photo processing timed out")
+            except BrokenProcessPool:
+                # a worker process died, the next photos start a new pool
+                photo_pool.reset_executor(executor)
+                self.error(line, "Photo processing failed")
+            except InvalidPhoto:
+                self.error(line, "Invalid photo")
+
+        try:
+            for line, row in chunk:
+                if not row.photo:
+                    continue
+                try:
+                    photo = self.read_photo(archive, row.photo)
+                except (PhotoError, zipfile.BadZipFile) as exc:
+                    self.error(line, str(exc))
+                    continue
+                if len(in_flight) >= window:
+                    collect()
+                in_flight.append((line, *photo_pool.submit(photo)))
+            while in_flight:
+                collect()
+        finally:
+            # the photos still waiting when the import stops are not processed for nothing
+            for _, _, future in in_flight:
+                future.cancel()
+        return hashes
+
+    def insert_chunk(self, db: Session, archive: zipfile.ZipFile | None, chunk: list[tuple[int, AnimalRow]]):
+        hashes = self.process_photos(archive, chunk)
+        values = [{**row.model_dump(exclude={"photo"}), "photo_hash": hashes.get(line)}
+                  for line, row in chunk if not row.photo or line in hashes]
+        if values:
+            db.execute(insert(AnimalsOrm), values)
+            count_rows(db, AnimalsOrm, values)
+            bump_catalog_version(db)
+            db.commit()
+        self.imported += len(values)
+
+    def run(self, db: Session, report: Callable[["ImportJob"], None] | None = None):
+        self.state = "running"
+        self.started_at = time.time()
+        try:
+            with (open(self.manifest_path, "rb") as manifest,
+                  zipfile.ZipFile(self.photos_path) if self.photos_path else nullcontext() as archive):
+                chunk = []
+                for line, record in read_manifest(manifest, self.manifest_format):
+                    self.rows += 1
+                    if record is None:
+                        self.error(line, "Invalid row")
+                        continue
+                    try:
+                        chunk.append((line, AnimalRow.model_validate(record)))
+                    except ValidationError as exc:
+                        self.error(line, validation_message(exc))
+                    if len(chunk) >= self.chunk_size:
+                        self.insert_chunk(db, archive, chunk)
+                        chunk = []
+                        if report:
+                            report(self)
+                if chunk:
+                    self.insert_chunk(db, archive, chunk)
+            self.state = "finished"
+        except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile) as exc:
+            db.rollback()
+            self.state = "failed"
+            self.error(self.rows, f"Import stopped: {exc}")
+        except Exception:
+            db.rollback()
+            self.state = "failed"
+            raise
+        finally:
+            self.finished_at = time.time()
+            if self.temporary:
+                self.manifest_path.unlink(missing_ok=True)
+                if self.photos_path:
+                    self.photos_path.unlink(missing_ok=True)
+            if report:
+                report(self)
+
+
+jobs: OrderedDict[str, ImportJob] = OrderedDict()
+jobs_lock = threading.Lock()
+
+
+def spool(file: BinaryIO, suffix: str) -> Path:
+    # the uploads are copied in chunks, they are closed before the import runs
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as spooled:
+        shutil.copyfileobj(file, spooled, 2 ** 20)
+    return Path(spooled.name)
+
+
+def create_import_job(manifest: BinaryIO, manifest_format: str, photos: BinaryIO | None) -> ImportJob:
+    """
+    Copies the uploaded files to temporary files and registers a new import job.
+    """
+    job = ImportJob(spool(manifest, ".manifest"), manifest_format, spool(photos, ".zip") if photos else None,
+                    settings.IMPORT_CHUNK_SIZE, temporary=True)
+    with jobs_lock:
+        jobs[job.id] = job
+        while len(jobs) > max_jobs:
+            oldest = next(iter(jobs.values()))
+            if oldest.state in ("queued", "running"):
+                break
+            jobs.popitem(last=False)
+    return job
+
+
+def get_import_job(job_id: str) -> ImportJob | None:
+    with jobs_lock:
+        return jobs.get(job_id)
+
+
+def run_import_job(job: ImportJob):
+    # runs as a background task, after the response, with its own database session
+    db = next(get_db())
+    try:
+        job.run(db)
+    finally:
+        db.close()
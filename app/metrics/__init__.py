@@ -0,0 +1,11 @@
+__all__ = [
+    'Counter',
+    'Gauge',
+    'Summary',
+    'Histogram',
+    'render_metrics',
+    'MetricsServer'
+]
+
+from .metrics import Counter, Gauge, Summary, Histogram, render_metrics
+from .server import MetricsServer
@@ -0,0 +1,145 @@
+import bisect
+import threading
+from typing import Callable, Iterator
+
+
+class Metric:
+    """
+    Base of the application metrics, rendered in the Prometheus text format.
+    The value is either updated explicitly, or read from the function when the metrics are rendered.
+    The function of a metric with labels returns the values by the tuple of label values.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 function: Callable[[], float | dict[tuple[str, ...], float]] | None = None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.function = function
+        self.values: dict[tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def label_values(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def samples(self) -> Iterator[tuple[str, tuple[str, ...], float]]:
+        # (name suffix, label values, value) of every sample
+        if self.function:
+            value = self.function()
+            if isinstance(value, dict):
+                for label_values, label_value in value.items():
+                    yield "", label_values, label_value
+            else:
+                yield "", (), value
+            return
+        with self.lock:
+            values = list(self.values.items())
+        for label_values, value in values:
+            yield "", label_values, value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        for suffix, label_values, value in self.samples():
+            labels = ",".join(f'{label}="{label_value}"'
+                              for label, label_value in zip(self.sample_labels(suffix), label_values))
+            lines.append(f"{self.name}{suffix}{{{labels}}} {value}" if labels else f"{self.name}{suffix} {value}")
+        return "\n".join(lines)
+
+    def sample_labels(self, suffix: str) -> tuple[str, ...]:
+        return self.labels
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, value: float = 1, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str):
+        with self.lock:
+            self.values[self.label_values(labels)] = value
+
+    def inc(self, value: float = 1, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def dec(self, value: float = 1, **labels: str):
+        self.inc(-value, **labels)
+
+
+class Summary(Metric):
+    """
+    Sum and count of observed values, e.g. durations in seconds.
+    """
+    type = "summary"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self.counts: dict[tuple[str, ...], int] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def samples(self) -> Iterator[tuple[str, tuple[str, ...], float]]:
+        with self.lock:
+            values = list(self.values.items())
+            counts = dict(self.counts)
+        for label_values, value in values:
+            yield "_sum", label_values, value
+            yield "_count", label_values, counts[label_values]
+
+
+class Histogram(Metric):
+    """
+    Observed values counted in cumulative buckets by their upper bounds, with their sum and count.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        # label values -> observations in every bucket, the last one is +Inf
+        self.counts: dict[tuple[str, ...], list[int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self.label_values(labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+            self.counts.setdefault(key, [0] * (len(self.buckets) + 1))[bucket] += 1
+
+    def samples(self) -> Iterator[tuple[str, tuple[str, ...], float]]:
+        with self.lock:
+            values = list(self.values.items())
+            counts = {key: list(bucket_counts) for key, bucket_counts in self.counts.items()}
+        for label_values, value in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts[label_values]):
+                cumulative += count
+                yield "_bucket", (*label_values, str(bound)), cumulative
+            yield "_sum", label_values, value
+            yield "_count", label_values, cumulative
+
+    def sample_labels(self, suffix: str) -> tuple[str, ...]:
+        return (*self.labels, "le") if suffix == "_bucket" else self.labels
+
+
+# All metrics of the application, in the order of creation
+registry: list[Metric] = []
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in registry) + "\n"
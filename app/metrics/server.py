@@ -0,0 +1,40 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .metrics import render_metrics
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        # scraped every few seconds, the requests are not logged
+        pass
+
+
+class MetricsServer:
+    """
+    Serves /metrics on its own port, for a Prometheus which can not sign in as the admin.
+    It runs in a daemon thread, so the scrapes do not wait for the event loop of the application.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,3 +1,3 @@
-__all__ = ['hash_password', 'verify_password']
+__all__ = ['hash_password', 'verify_password', 'needs_rehash', 'calibrate_rounds']
 
-from .password import hash_password, verify_password
+from .password import hash_password, verify_password, needs_rehash, calibrate_rounds
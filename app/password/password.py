@@ -1,14 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
 import bcrypt
+from fastapi import HTTPException
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
+
+from app.config import settings
+from app.metrics import Counter, Gauge, Summary
+
+T = TypeVar("T")
+
+# Number of rounds (bcrypt cost) to use for hashing, pick it with `python manage.py calibrate-passwords`
+rounds = settings.PASSWORD_HASH_ROUNDS
+
+# Seconds the client is asked to wait before retrying a rejected request
+retry_after = 1
+
+password_hash_queue_depth = Gauge("password_hash_queue_depth", "Password hashes waiting for a hashing thread")
+password_hash_in_progress = Gauge("password_hash_in_progress", "Password hashes being computed")
+password_hash_duration = Summary("password_hash_duration_seconds", "Duration of the password hashing",
+                                 labels=("operation",))
+password_hash_rejected = Counter("password_hash_rejected_total", "Password hashes rejected, the queue was full",
+                                 labels=("operation",))
+
+
+class PasswordHasher:
+    """
+    Bounded thread pool for bcrypt, so a burst of logins can not take all the CPU and threads of the app.
+    At most workers hashes run at once and at most queue_size hashes wait, further requests are rejected with 503.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        # running and waiting hashes
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
 
-# Number of rounds to use for hashing
-rounds = 5
+    def run(self, operation: str, function: Callable[[], T]) -> T:
+        # blocks the calling thread until the hash is computed, it is meant for the `def` handlers
+        if not self.slots.acquire(blocking=False):
+            password_hash_rejected.inc(operation=operation)
+            raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Server is busy, try again later",
+                                headers={"Retry-After": str(retry_after)})
+        password_hash_queue_depth.inc()
+        try:
+            return self.executor.submit(self.timed, operation, function).result()
+        finally:
+            self.slots.release()
+
+    @staticmethod
+    def timed(operation: str, function: Callable[[], T]) -> T:
+        password_hash_queue_depth.dec()
+        password_hash_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            return function()
+        finally:
+            password_hash_in_progress.dec()
+            password_hash_duration.observe(time.perf_counter() - start, operation=operation)
+
+
+# Hasher instance to be used in the app
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
 
 
 def hash_password(password: str) -> bytes:
     # Hash a password for the first time, with a randomly-generated salt
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds))
+    return password_hasher.run("hash", lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)))
 
 
 def verify_password(password: str, hashed_password: bytes) -> bool:
     # Check hashed password. It should be the same as hashed
-    return bcrypt.checkpw(password.encode(), hashed_password)
+    return password_hasher.run("verify", lambda: bcrypt.checkpw(password.encode(), hashed_password))
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    # Check whether the hash was made with fewer rounds than the current one, "$2b$05$..." has 5 rounds,
+    # stronger hashes are kept when the rounds are lowered
+    return int(hashed_password.split(b"$")[2]) < rounds
+
+
+def calibrate_rounds(target_seconds: float, min_rounds: int = 4, max_rounds: int = 20) -> tuple[int, float]:
+    """
+    Finds the highest number of rounds whose password check takes at most target_seconds on this host.
+    Every round doubles the time, so the benchmark takes about twice the target. Returns the rounds and their time.
+    """
+    chosen = (min_rounds, 0.0)
+    for benchmark_rounds in range(min_rounds, max_rounds + 1):
+        hashed_password = bcrypt.hashpw(b"calibration", bcrypt.gensalt(benchmark_rounds))
+        # take the best of three checks, the others may be slowed down by the rest of the host
+        duration = min(timed_check(hashed_password) for _ in range(3))
+        if duration > target_seconds and benchmark_rounds > min_rounds:
+            break
+        chosen = (benchmark_rounds, duration)
+    return chosen
+
+
+def timed_check(hashed_password: bytes) -> float:
+    start = time.perf_counter()
+    bcrypt.checkpw(b"calibration", hashed_password)
+    return time.perf_counter() - start
@@ -0,0 +1,25 @@
+__all__ = [
+    'PhotoSize',
+    'PhotoFormat',
+    'compress_photo',
+    'InvalidPhoto',
+    'PhotoStorage',
+    'photo_storage',
+    'store_photo',
+    'PhotoPool',
+    'photo_pool',
+    'photo_url',
+    'photo_hash_pattern',
+    'photo_response',
+    'immutable_cache_control',
+    'revalidate_cache_control',
+    'migrate_photos',
+    'collect_garbage'
+]
+
+from .processing import PhotoSize, PhotoFormat, compress_photo, InvalidPhoto
+from .storage import PhotoStorage, photo_storage, store_photo
+from .pool import PhotoPool, photo_pool
+from .responses import photo_url, photo_hash_pattern, photo_response, immutable_cache_control, \
+    revalidate_cache_control
+from .migration import migrate_photos, collect_garbage
@@ -0,0 +1,53 @@
+from sqlalchemy.orm import Session
+
+from app.database import AnimalsOrm
+from .processing import compress_photo
+from .storage import photo_storage, store_photo
+
+
+def migrate_photos(db: Session, batch_size: int = 50) -> int:
+    """
+    Moves photos stored inline in the animals table to the photo storage, then makes the variants
+    of the photos stored as a single JPEG file. Works in batches, so only batch_size blobs are held in memory at once.
+    Returns the number of migrated photos.
+    """
+    moved = 0
+    while True:
+        rows = (db.query(AnimalsOrm.id, AnimalsOrm.photo)
+                .filter(AnimalsOrm.photo.is_not(None))
+                .order_by(AnimalsOrm.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+        for animal_id, photo in rows:
+            (db.query(AnimalsOrm)
+             .filter(AnimalsOrm.id == animal_id)
+             .update({AnimalsOrm.photo_hash: store_photo(photo), AnimalsOrm.photo: None},
+                     synchronize_session=False))
+        db.commit()
+        moved += len(rows)
+
+    for photo_hash in photo_storage.legacy_hashes():
+        # keep the hash, the animals already reference it
+        legacy_path = photo_storage.legacy_path(photo_hash)
+        photo_storage.save(photo_hash, compress_photo(legacy_path.read_bytes()))
+        legacy_path.unlink()
+        moved += 1
+    return moved
+
+
+def collect_garbage(db: Session, min_age: float = 3600) -> int:
+    """
+    Deletes stored photos which are not referenced by any animal.
+    Photos younger than min_age seconds are kept, they may belong to a not yet committed upload.
+    Returns the number of deleted photos.
+    """
+    referenced = {photo_hash for photo_hash, in
+                  db.query(AnimalsOrm.photo_hash).filter(AnimalsOrm.photo_hash.is_not(None)).distinct()}
+    deleted = 0
+    for photo_hash in photo_storage.stored_hashes(min_age):
+        if photo_hash not in referenced:
+            photo_storage.delete(photo_hash)
+            deleted += 1
+    return deleted
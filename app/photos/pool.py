@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE, HTTP_400_BAD_REQUEST
+
+from app.config import settings
+from .processing import InvalidPhoto
+from .storage import store_photo
+
+# Seconds the client is asked to wait before retrying a rejected upload
+retry_after = 5
+
+
+class PhotoPool:
+    """
+    Bounded process pool for photo decoding, resizing and encoding, so the event loop never runs Pillow.
+    At most workers jobs run at once and at most queue_size jobs wait, further uploads are rejected with 503.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        # running and waiting jobs, a job is counted until its worker process is done with it
+        self.jobs = 0
+        self.executor: ProcessPoolExecutor | None = None
+        # the executor is used by the event loop and by the import threads
+        self.executor_lock = threading.Lock()
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        # start the worker processes on the first upload, not at import
+        with self.executor_lock:
+            if not self.executor:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+            return self.executor
+
+    def reset_executor(self, broken: ProcessPoolExecutor | None):
+        """
+        Drops the executor after one of its worker processes died, the next job starts a new one.
+        The broken executor is shut down, so its management thread and remaining workers do not leak.
+        """
+        with self.executor_lock:
+            # another job may have replaced it already
+            if broken is None or self.executor is not broken:
+                return
+            self.executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def job_done(self, _: Future):
+        self.jobs -= 1
+
+    async def store_photo(self, photo: bytes) -> str:
+        """
+        Makes and stores the photo variants in a worker process, returns the photo hash.
+        """
+        if self.jobs >= self.workers + self.queue_size:
+            raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many photos are being processed, try again later",
+                                headers={"Retry-After": str(retry_after)})
+        self.jobs += 1
+        executor = self.get_executor()
+        try:
+            future = executor.submit(store_photo, photo)
+        except BrokenProcessPool:
+            self.jobs -= 1
+            self.reset_executor(executor)
+            raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Photo processing failed, try again later",
+                                headers={"Retry-After": str(retry_after)})
+        # release the slot from the event loop thread once the worker is done
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda done: loop.call_soon_threadsafe(self.job_done, done))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # a job that has not started yet is dropped, a running one keeps its slot until it ends
+            future.cancel()
+            raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Photo processing timed out, try again later",
+                                headers={"Retry-After": str(retry_after)})
+        except BrokenProcessPool:
+            # a worker process died, start a new pool for the next upload
+            self.reset_executor(executor)
+            raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Photo processing failed, try again later",
+                                headers={"Retry-After": str(retry_after)})
+        except InvalidPhoto:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid photo")
+
+    def submit(self, photo: bytes) -> tuple[ProcessPoolExecutor, Future]:
+        """
+        Queues the photo for a worker process without the admission limit, for batch jobs running in a thread,
+        which bound the number of their photos in flight themselves.
+        Returns the executor with the future, for reset_executor if the future fails with BrokenProcessPool.
+        """
+        executor = self.get_executor()
+        try:
+            return executor, executor.submit(store_photo, photo)
+        except BrokenProcessPool:
+            self.reset_executor(executor)
+            executor = self.get_executor()
+            return executor, executor.submit(store_photo, photo)
+
+    def shutdown(self):
+        with self.executor_lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+
+# Pool instance to be used in the app
+photo_pool = PhotoPool(settings.PHOTO_WORKERS, settings.PHOTO_QUEUE_SIZE, settings.PHOTO_TIMEOUT)
@@ -0,0 +1,76 @@
+import enum
+import io
+from typing import Self
+
+
+class PhotoSize(enum.Enum):
+    thumb = 'thumb'
+    profile = 'profile'
+    original = 'original'
+
+    @property
+    def pixels(self) -> int:
+        # longest side of the variant, thumbnails are displayed 100px wide, so they are stored for 2x screens
+        return {PhotoSize.thumb: 200, PhotoSize.profile: 600, PhotoSize.original: 1600}[self]
+
+
+class PhotoFormat(enum.Enum):
+    avif = 'avif'
+    webp = 'webp'
+    jpeg = 'jpeg'
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.value}"
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self == PhotoFormat.jpeg else self.value
+
+    @classmethod
+    def get_supported_formats(cls) -> list[Self]:
+        # formats in the order of preference, AVIF only if this Pillow build can encode it
+        from PIL import Image
+        Image.init()
+        return [photo_format for photo_format in cls if photo_format.value.upper() in Image.SAVE]
+
+
+class InvalidPhoto(ValueError):
+    """
+    The photo can not be decoded: it is not an image, it is truncated, or it is a decompression bomb.
+    """
+
+
+# Encoder options of each format
+save_options = {
+    PhotoFormat.avif: {"quality": 50},
+    PhotoFormat.webp: {"quality": 70, "method": 4},
+    PhotoFormat.jpeg: {"quality": 75, "optimize": True, "progressive": True},
+}
+
+# Photo variants, keyed by size and format
+PhotoVariants = dict[tuple[PhotoSize, PhotoFormat], bytes]
+
+
+def compress_photo(photo: bytes) -> PhotoVariants:
+    """
+    Makes the set of photo variants, every size encoded in every supported format.
+    """
+    # Pillow is imported by the photo workers only, not by the application start
+    from PIL import Image, ImageOps
+    try:
+        image = Image.open(io.BytesIO(photo))
+        # apply the camera orientation, it is lost with the EXIF data
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, Image.DecompressionBombError) as exc:
+        # UnidentifiedImageError is an OSError, the decompression bomb error is not
+        raise InvalidPhoto(str(exc)) from None
+    variants: PhotoVariants = {}
+    # resize from the largest to the smallest variant, so every step works on a smaller image
+    for size in sorted(PhotoSize, key=lambda x: x.pixels, reverse=True):
+        image.thumbnail((size.pixels, size.pixels), Image.Resampling.LANCZOS)
+        for photo_format in PhotoFormat.get_supported_formats():
+            image_bytes = io.BytesIO()
+            image.save(image_bytes, format=photo_format.value.upper(), **save_options[photo_format])
+            variants[(size, photo_format)] = image_bytes.getvalue()
+    return variants
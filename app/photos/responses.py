@@ -0,0 +1,85 @@
+import re
+
+from fastapi import Request
+from starlette.responses import FileResponse, Response
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from app.database import AnimalsOrm
+from .processing import PhotoSize, PhotoFormat
+from .storage import photo_storage
+
+# Photos are addressed by sha256 hex digest
+photo_hash_pattern = re.compile(r"^[0-9a-f]{64}$")
+
+# Content-addressed urls never change their content
+immutable_cache_control = "public, max-age=31536000, immutable"
+# Urls bound to an animal must be revalidated, the animal photo may be replaced
+revalidate_cache_control = "no-cache"
+
+
+def photo_url(animal: AnimalsOrm, size: str = PhotoSize.profile.value) -> str:
+    """
+    Returns the url of the animal photo variant, content-addressed if the photo is in the photo storage.
+    """
+    if animal.photo_hash:
+        return f"/photos/{animal.photo_hash}?size={size}"
+    return f"/animals/{animal.id}/photo?size={size}"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # compare ignoring the weak validator prefix
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def accepted_media_types(request: Request) -> set[str]:
+    # media types from the Accept header, except the explicitly refused ones (q=0)
+    media_types = set()
+    for item in request.headers.get("accept", "").split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = next((param.split("=", 1)[1] for param in params if param.startswith("q=")), "1")
+        try:
+            if float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        media_types.add(media_type.lower())
+    return media_types
+
+
+def negotiate_format(request: Request, formats: list[PhotoFormat]) -> PhotoFormat:
+    """
+    Picks the preferred stored format the client accepts, JPEG is the fallback every browser supports.
+    """
+    accepted = accepted_media_types(request)
+    for photo_format in formats:
+        if photo_format.media_type in accepted:
+            return photo_format
+    return PhotoFormat.jpeg
+
+
+def photo_response(request: Request, photo_hash: str, size: PhotoSize, cache_control: str) -> Response:
+    """
+    Serves a stored photo variant from the disk in the format negotiated with the Accept header.
+    Responses have a strong ETag, 304 is returned if the client has the variant already.
+    """
+    if photo_storage.directory(photo_hash).is_dir():
+        photo_format = negotiate_format(request, photo_storage.formats(photo_hash, size))
+        path = photo_storage.path(photo_hash, size, photo_format)
+        etag = f'"{photo_hash}-{size.value}.{photo_format.extension}"'
+        # the response depends on the Accept header, caches must keep the formats apart
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept"}
+    else:
+        # photo stored before the variants were introduced, there is only one JPEG
+        photo_format = PhotoFormat.jpeg
+        path = photo_storage.legacy_path(photo_hash)
+        etag = f'"{photo_hash}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(request, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type=photo_format.media_type, headers=headers)
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+from tempfile import mkdtemp
+
+from app.config import settings
+from .processing import PhotoSize, PhotoFormat, PhotoVariants, compress_photo
+
+
+class PhotoStorage:
+    """
+    Content-addressed photo storage on the local disk.
+    Each uploaded photo is stored once under the sha256 hash of its bytes, as a directory of resized variants.
+    The database keeps only the hash.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    @staticmethod
+    def hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def directory(self, photo_hash: str) -> Path:
+        # shard the photos by the first two hash characters to keep the directories small
+        return self.root / photo_hash[:2] / photo_hash
+
+    def legacy_path(self, photo_hash: str) -> Path:
+        # single JPEG file, stored before the photos had variants
+        return self.root / photo_hash[:2] / f"{photo_hash}.jpg"
+
+    def path(self, photo_hash: str, size: PhotoSize, photo_format: PhotoFormat) -> Path:
+        return self.directory(photo_hash) / f"{size.value}.{photo_format.extension}"
+
+    def exists(self, photo_hash: str) -> bool:
+        # the responses negotiate between the stored formats, JPEG of every size is enough to serve the photo
+        return (all(self.path(photo_hash, size, PhotoFormat.jpeg).is_file() for size in PhotoSize)
+                or self.legacy_path(photo_hash).is_file())
+
+    def is_complete(self, photo_hash: str, formats: list[PhotoFormat]) -> bool:
+        # every variant is stored, not only the ones written before a worker crashed in an older version
+        return all(self.path(photo_hash, size, photo_format).is_file()
+                   for size in PhotoSize for photo_format in formats)
+
+    def formats(self, photo_hash: str, size: PhotoSize) -> list[PhotoFormat]:
+        # stored formats of the variant, in the order of preference
+        return [photo_format for photo_format in PhotoFormat if self.path(photo_hash, size, photo_format).is_file()]
+
+    def save(self, photo_hash: str, variants: PhotoVariants):
+        directory = self.directory(photo_hash)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        # the variants are written to a temporary sibling directory, which is renamed into place when complete,
+        # so a worker dying midway never leaves a photo with a part of its variants
+        tmp = Path(mkdtemp(dir=directory.parent, prefix=f".{photo_hash}."))
+        try:
+            for (size, photo_format), data in variants.items():
+                (tmp / self.path(photo_hash, size, photo_format).name).write_bytes(data)
+            # an incomplete directory of an older version is replaced
+            if directory.is_dir() and not self.is_complete(photo_hash, list({key[1] for key in variants})):
+                shutil.rmtree(directory, ignore_errors=True)
+            try:
+                os.replace(tmp, directory)
+            except OSError:
+                # stored meanwhile by another worker, with the same variants
+                if not directory.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def delete(self, photo_hash: str):
+        shutil.rmtree(self.directory(photo_hash), ignore_errors=True)
+        self.legacy_path(photo_hash).unlink(missing_ok=True)
+
+    def stored_hashes(self, min_age: float = 0) -> list[str]:
+        # hashes of stored photos older than min_age seconds
+        now = time.time()
+        # the temporary directories of the photos being saved are left out
+        return [path.stem for path in self.root.glob("*/*")
+                if not path.name.startswith(".") and now - path.stat().st_mtime >= min_age]
+
+    def legacy_hashes(self) -> list[str]:
+        return [path.stem for path in self.root.glob("*/*.jpg")]
+
+
+# Storage instance to be used in the app
+photo_storage = PhotoStorage(settings.PHOTO_STORAGE_PATH)
+
+
+def store_photo(photo: bytes) -> str:
+    """
+    Makes the photo variants and stores them, returns the photo hash.
+    """
+    photo_hash = photo_storage.hash(photo)
+    if not photo_storage.is_complete(photo_hash, PhotoFormat.get_supported_formats()):
+        # the same photo was not uploaded before, or not all its variants were stored
+        photo_storage.save(photo_hash, compress_photo(photo))
+    return photo_hash
@@ -1,9 +1,14 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
+from starlette.responses import PlainTextResponse
 from starlette.status import HTTP_403_FORBIDDEN, HTTP_200_OK, \
     HTTP_404_NOT_FOUND, HTTP_202_ACCEPTED
 
-from app.database import db_dependency, UsersOrm, Role, SessionsOrm
-from app.utils import admin_dependency, templates, get_admin, session_dependency
+from app.aggregates import get_aggregates
+from app.database import db_dependency, async_db_dependency, UsersOrm, Role, SessionsOrm, statement_budget
+from app.metrics import render_metrics
+from app.walks import invalidate_occupancy
+from app.utils import admin_dependency, templates, get_admin, session_dependency, SessionUser, \
+    invalidate_user_sessions, invalidate_all_sessions
 
 admin_router = APIRouter(prefix="/admin",
                          tags=["admin"],
@@ -11,27 +16,30 @@ admin_router = APIRouter(prefix="/admin",
 
 
 # Validation function to check if the user can be modified
-def validate_user_operation(user: UsersOrm, admin: UsersOrm):
+def validate_user_operation(user: UsersOrm, admin: SessionUser):
     if not user:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="User not found")
-    if user == admin:
+    if user.id == admin.id:
         raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="You can't change your own state")
     if user.username == "admin":
         raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="You can't change the root admin state")
 
 
 @admin_router.get("/dashboard", status_code=HTTP_200_OK)
-async def admin_page(request: Request, admin: admin_dependency):
+@statement_budget(2)
+async def admin_page(request: Request, admin: admin_dependency, db: async_db_dependency):
     return templates.TemplateResponse("admin/dashboard.html",
                                       {
                                           "request": request,
                                           "admin": admin,
-                                          "user": admin
+                                          "user": admin,
+                                          "aggregates": await db.run_sync(get_aggregates)
                                       })
 
 
 @admin_router.get("/users", status_code=HTTP_200_OK)
-async def users_page(request: Request, db: db_dependency, admin: admin_dependency):
+@statement_budget(2)
+def users_page(request: Request, db: db_dependency, admin: admin_dependency):
     users = db.query(UsersOrm).all()
     return templates.TemplateResponse("admin/users.html",
                                       {
@@ -44,39 +52,46 @@ async def users_page(request: Request, db: db_dependency, admin: admin_dependenc
 
 
 @admin_router.patch("/users/{user_id}/state", status_code=HTTP_202_ACCEPTED)
-async def user_state(user_id: int, active: bool, db: db_dependency, admin: admin_dependency):
+def user_state(user_id: int, active: bool, db: db_dependency, admin: admin_dependency):
     user = db.query(UsersOrm).filter(UsersOrm.id == user_id).first()
     validate_user_operation(user, admin)
     # Update the user state
     user.disabled = active
     db.commit()
+    invalidate_user_sessions(user_id)
 
 
 @admin_router.patch("/users/{user_id}/role", status_code=HTTP_202_ACCEPTED)
-async def user_role(user_id: int, role: Role, db: db_dependency, admin: admin_dependency):
+def user_role(user_id: int, role: Role, db: db_dependency, admin: admin_dependency):
     user = db.query(UsersOrm).filter(UsersOrm.id == user_id).first()
     validate_user_operation(user, admin)
     # Update the user role
     user.role = role
     db.commit()
+    invalidate_user_sessions(user_id)
 
 
 @admin_router.delete("/users/{user_id}", status_code=HTTP_202_ACCEPTED)
-async def delete_user(user_id: int, db: db_dependency, admin: admin_dependency):
+def delete_user(user_id: int, db: db_dependency, admin: admin_dependency):
     user = db.query(UsersOrm).filter(UsersOrm.id == user_id).first()
     validate_user_operation(user, admin)
     db.delete(user)
     db.commit()
+    invalidate_user_sessions(user_id)
+    # the walks of the user were deleted with them
+    invalidate_occupancy()
 
 
 @admin_router.delete("/sessions", status_code=HTTP_202_ACCEPTED)
-async def delete_sessions(db: db_dependency, cur_session: session_dependency):
-    sessions = db.query(SessionsOrm).all()
-    sessions_count = len(sessions)
+def delete_sessions(db: db_dependency, cur_session: session_dependency):
     # terminate all users' sessions except the current admin session
-    for session in sessions:
-        if session.id == cur_session.id:
-            continue
-        db.delete(session)
+    sessions_count = db.query(SessionsOrm).filter(SessionsOrm.id != cur_session.id).delete(synchronize_session=False)
     db.commit()
-    return {"message": f"Deleted {sessions_count - 1} sessions"}
+    invalidate_all_sessions()
+    return {"message": f"Deleted {sessions_count} sessions"}
+
+
+@admin_router.get("/metrics", status_code=HTTP_200_OK)
+async def metrics():
+    # application metrics in the Prometheus text format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,34 +1,72 @@
-import io
 from datetime import datetime, timezone
+from pathlib import Path
 from typing import Annotated, Optional
 
-from PIL import Image
-from fastapi import APIRouter, Request, Form, UploadFile, Depends, HTTPException
+from fastapi import APIRouter, Request, Form, UploadFile, Depends, HTTPException, Body, File, BackgroundTasks, \
+    Header, Response
 from fastapi.params import Query
-from pydantic import BaseModel
-from starlette.responses import RedirectResponse
-from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_404_NOT_FOUND, HTTP_400_BAD_REQUEST
-
-from app.database import db_dependency, AnimalsOrm, AdoptionStatus, AnimalStatus
+from pydantic import BaseModel, Field
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload, Session
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_202_ACCEPTED, HTTP_404_NOT_FOUND, \
+    HTTP_400_BAD_REQUEST
+
+from app.aggregates import count_rows, get_aggregates
+from app.config import settings
+from app.database import db_dependency, async_db_dependency, AnimalsOrm, AdoptionStatus, AnimalStatus, UsersOrm, \
+    statement_budget
 from app.database.models import VolunteerApplicationsOrm, ApplicationStatus, Role, VetRequestStatus, VetRequestOrm, \
     WalkStatus, WalksOrm, AdoptionRequestsOrm
-from app.utils import staff_dependency, templates, get_staff, application_status_to_int, animal_dependency, \
-    session_dependency, walk_dependency
+from app.exports import ExportFormat, export_response, walks_export, adoption_requests_export
+from app.imports import manifest_formats, create_import_job, get_import_job, run_import_job
+from app.photos import photo_pool
+from app.walks import set_walk_status, released_statuses, release_slots
+from app.utils import staff_dependency, templates, get_staff, animal_dependency, \
+    session_dependency, walk_dependency, invalidate_user_sessions, StatusQueue, BulkTransition, max_bulk_ids, \
+    bump_catalog_version, check_version, entity_tag, precondition_failed_exception
 
 staff_router = APIRouter(prefix="/staff",
                          tags=["staff"],
                          dependencies=[Depends(get_staff)])
 
-
-def compress_photo(photo: bytes):
-    """
-    Compresses a photo to a smaller size.
-    """
-    image = Image.open(io.BytesIO(photo))
-    image.thumbnail((500, 500))
-    image_bytes = io.BytesIO()
-    image.save(image_bytes, format="JPEG", quality=70)
-    return image_bytes.getvalue()
+# Staff work queues, the most urgent statuses first
+walk_queue = StatusQueue(WalksOrm, [[WalkStatus.started], [WalkStatus.accepted], [WalkStatus.pending],
+                                    [WalkStatus.rejected, WalkStatus.finished, WalkStatus.cancelled]])
+adoption_queue = StatusQueue(AdoptionRequestsOrm, [[AdoptionStatus.pending], [AdoptionStatus.accepted],
+                                                   [AdoptionStatus.rejected]])
+application_queue = StatusQueue(VolunteerApplicationsOrm, [[ApplicationStatus.pending], [ApplicationStatus.accepted],
+                                                           [ApplicationStatus.rejected]])
+
+# Status changes of the bulk endpoints, target status -> statuses it may be reached from
+walk_transitions = {
+    WalkStatus.accepted: [WalkStatus.pending],
+    WalkStatus.rejected: [WalkStatus.pending],
+    WalkStatus.started: [WalkStatus.accepted],
+    WalkStatus.finished: [WalkStatus.started],
+    WalkStatus.cancelled: [WalkStatus.accepted],
+}
+adoption_transitions = {
+    AdoptionStatus.accepted: [AdoptionStatus.pending],
+    AdoptionStatus.rejected: [AdoptionStatus.pending],
+}
+application_transitions = {
+    ApplicationStatus.accepted: [ApplicationStatus.pending],
+    ApplicationStatus.rejected: [ApplicationStatus.pending],
+}
+
+# Ids of the rows changed by a bulk endpoint
+bulk_ids = Annotated[list[int], Body(min_length=1, max_length=max_bulk_ids)]
+
+
+# Changes of an animal, the fields which are not sent are kept
+class AnimalChanges(BaseModel):
+    name: str | None = Field(None, min_length=1, max_length=256)
+    species: str | None = Field(None, min_length=1, max_length=256)
+    age: int | None = Field(None, ge=0)
+    description: str | None = Field(None, max_length=2048)
+    hidden: bool | None = None
 
 
 # Form to add a new animal
@@ -45,37 +83,74 @@ class AnimalForm(BaseModel):
             "name": self.name,
             "species": self.species,
             "age": self.age,
-            "description": self.description,
-            "photo": compress_photo(self.photo.file.read()) if self.photo else None
+            "description": self.description
         }
 
 
 @staff_router.get("/dashboard", status_code=HTTP_200_OK)
-async def staff_dashboard(request: Request, staff: staff_dependency, session: session_dependency):
+@statement_budget(2)
+async def staff_dashboard(request: Request, staff: staff_dependency, session: session_dependency,
+                          db: async_db_dependency):
     return templates.TemplateResponse("staff/dashboard.html",
                                       {
                                           "request": request,
                                           "staff": staff,
-                                          "user": session.user
+                                          "user": session.user,
+                                          "aggregates": await db.run_sync(get_aggregates)
                                       })
 
 
 @staff_router.post("/animals/new", status_code=HTTP_201_CREATED)
 async def add_animal(db: db_dependency, animal: Annotated[AnimalForm, Form()]):
-    new_animal = AnimalsOrm(**animal.get_dict)
+    # the photo is processed in the photo pool, not on the event loop
+    photo_hash = await photo_pool.store_photo(await animal.photo.read()) if animal.photo else None
+    new_animal = AnimalsOrm(**animal.get_dict, photo_hash=photo_hash)
     db.add(new_animal)
-    db.commit()
+    # the database session is blocking, commit in the thread pool
+    await run_in_threadpool(db.commit)
     return {"message": "Animal added successfully"}
 
 
+@staff_router.get("/animals/import", status_code=HTTP_200_OK)
+async def import_animals_page(request: Request, session: session_dependency):
+    return templates.TemplateResponse("staff/import_animals.html",
+                                      {
+                                          "request": request,
+                                          "user": session.user,
+                                          "manifest_formats": list(manifest_formats)
+                                      })
+
+
+@staff_router.post("/animals/import", status_code=HTTP_202_ACCEPTED)
+async def import_animals(background_tasks: BackgroundTasks, manifest: UploadFile = File(...),
+                         photos: UploadFile | None = File(None)):
+    manifest_format = manifest_formats.get(Path(manifest.filename or "").suffix.lower())
+    if manifest_format is None:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail=f"The manifest must be one of {', '.join(manifest_formats)}")
+    # the uploads are closed with the response, they are copied for the import running after it
+    job = await run_in_threadpool(create_import_job, manifest.file, manifest_format, photos.file if photos else None)
+    background_tasks.add_task(run_import_job, job)
+    return job.progress()
+
+
+@staff_router.get("/animals/import/{job_id}", status_code=HTTP_200_OK)
+async def import_animals_progress(job_id: str):
+    job = get_import_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Import not found")
+    return job.progress()
+
+
 @staff_router.delete("/animals/{animal_id}", status_code=HTTP_200_OK)
-async def delete_animal(db: db_dependency, animal: animal_dependency):
+def delete_animal(db: db_dependency, animal: animal_dependency):
     db.delete(animal)
     db.commit()
     return {"message": "Animal deleted successfully"}
 
 
 @staff_router.get("/animals/{animal_id}/edit", status_code=HTTP_200_OK)
+@statement_budget(2)
 async def edit_animal_page(request: Request, animal: animal_dependency, session: session_dependency):
     return templates.TemplateResponse("animal/edit_page.html",
                                       {
@@ -85,77 +160,109 @@ async def edit_animal_page(request: Request, animal: animal_dependency, session:
                                       })
 
 
-@staff_router.patch("/animals/{animal_id}/name", status_code=HTTP_200_OK)
-async def edit_animal_name(db: db_dependency, animal: animal_dependency, new_name: str = Query(...)):
-    animal.name = new_name
-    db.commit()
-    return {"message": "Name updated successfully", "name": new_name}
-
-
-@staff_router.patch("/animals/{animal_id}/species", status_code=HTTP_200_OK)
-async def edit_animal_species(db: db_dependency, animal: animal_dependency, new_species: str = Query(...)):
-    animal.species = new_species
-    db.commit()
-    return {"message": "Species updated successfully", "species": new_species}
-
-
-@staff_router.patch("/animals/{animal_id}/age", status_code=HTTP_200_OK)
-async def edit_animal_age(db: db_dependency, animal: animal_dependency, new_age: int = Query(...)):
-    animal.age = new_age
-    db.commit()
-    return {"message": "Age updated successfully", "age": new_age}
-
-
-@staff_router.patch("/animals/{animal_id}/description", status_code=HTTP_200_OK)
-async def edit_animal_description(db: db_dependency, animal: animal_dependency, new_description: str = Query(...)):
-    animal.description = new_description
-    db.commit()
-    return {"message": "Description updated successfully", "description": new_description}
+def commit_animal_version(db: Session, animal: AnimalsOrm) -> int:
+    """
+    Commits the changes of the animal, the UPDATE checks and increments its version, returns the new version.
+    """
+    try:
+        db.flush()
+        version = animal.version
+        db.commit()
+    except StaleDataError:
+        # changed by another request since the animal was read
+        db.rollback()
+        raise precondition_failed_exception
+    return version
+
+
+@staff_router.patch("/animals/{animal_id}", status_code=HTTP_200_OK)
+def edit_animal(db: db_dependency, animal: animal_dependency, changes: AnimalChanges, response: Response,
+                if_match: Annotated[str | None, Header()] = None):
+    check_version(animal.version, if_match)
+    for name, value in changes.model_dump(exclude_none=True).items():
+        setattr(animal, name, value)
+    edited = {column: getattr(animal, column) for column in AnimalChanges.model_fields}
+    # one UPDATE of the changed columns
+    version = commit_animal_version(db, animal)
+    response.headers["ETag"] = entity_tag(version)
+    return {"message": "Animal updated successfully", "version": version, **edited}
 
 
 @staff_router.patch("/animals/{animal_id}/photo", status_code=HTTP_200_OK)
-async def edit_animal_photo(db: db_dependency, animal: animal_dependency, photo: UploadFile = Form(None)):
-    animal.photo = compress_photo(photo.file.read()) if photo else None
-    db.commit()
-    return {"message": "Photo updated successfully"}
+async def edit_animal_photo(db: db_dependency, animal: animal_dependency, response: Response,
+                            photo: UploadFile = Form(None), if_match: Annotated[str | None, Header()] = None):
+    # checked before the photo is processed, and again by the UPDATE
+    check_version(animal.version, if_match)
+    animal.photo_hash = await photo_pool.store_photo(await photo.read()) if photo else None
+    animal.photo = None
+    # the database session is blocking, commit in the thread pool
+    version = await run_in_threadpool(commit_animal_version, db, animal)
+    response.headers["ETag"] = entity_tag(version)
+    return {"message": "Photo updated successfully", "version": version}
 
 
 @staff_router.delete("/animals/{animal_id}/photo", status_code=HTTP_200_OK)
-async def delete_animal_photo(db: db_dependency, animal: animal_dependency):
+def delete_animal_photo(db: db_dependency, animal: animal_dependency, response: Response,
+                        if_match: Annotated[str | None, Header()] = None):
+    check_version(animal.version, if_match)
+    animal.photo_hash = None
     animal.photo = None
-    db.commit()
-    return {"message": "Photo deleted successfully"}
-
-
-@staff_router.patch("/animals/{animal_id}/hide", status_code=HTTP_200_OK)
-async def hide_animal(db: db_dependency, animal: animal_dependency, hidden: bool):
-    animal.hidden = hidden
-    db.commit()
-    return {"message": "Animal hidden successfully"}
+    version = commit_animal_version(db, animal)
+    response.headers["ETag"] = entity_tag(version)
+    return {"message": "Photo deleted successfully", "version": version}
 
 
 @staff_router.get("/volunteer_applications")
-async def volunteer_applications(request: Request, session: session_dependency, db: db_dependency,
-                                 limit: int = Query(10), page: int = Query(1)):
-    applications_list = db.query(VolunteerApplicationsOrm).all()
-    # sort by status, then by date, then by id
-    applications_list.sort(key=lambda x: (application_status_to_int(x.status), x.date, x.id))
-    display_applications = applications_list[(page - 1) * limit:page * limit]
-    pages = len(applications_list) // limit + 1
-    if page > pages or page < 1:
-        return RedirectResponse(url="/volunteer_applications")
+@statement_budget(4)
+async def volunteer_applications(request: Request, session: session_dependency, db: async_db_dependency,
+                                 after: Optional[str] = Query(default=None), before: Optional[str] = Query(default=None)):
+    queue_page = await application_queue.page_async(db, settings.QUEUE_PAGE_SIZE, after, before,
+                                                    options=[joinedload(VolunteerApplicationsOrm.user)])
     return templates.TemplateResponse("staff/volunteer_applications.html",
                                       {
                                           "request": request,
-                                          "applications": display_applications,
-                                          "pages": pages,
-                                          "page": page,
+                                          "applications": queue_page.items,
+                                          "queue_page": queue_page,
                                           "user": session.user
                                       })
 
 
+@staff_router.patch("/volunteer_applications/status", status_code=HTTP_200_OK)
+def update_application_statuses(db: db_dependency, ids: bulk_ids, status: Annotated[ApplicationStatus, Body()]):
+    """
+    Updates the status of many volunteer applications in one transaction, reporting the outcome of every id.
+    """
+    transition = BulkTransition(db, VolunteerApplicationsOrm, ids, status, application_transitions)
+    rows = transition.plan(VolunteerApplicationsOrm.user_id)
+
+    promoted_ids = set()
+    if status == ApplicationStatus.accepted:
+        roles = dict(db.execute(select(UsersOrm.id, UsersOrm.role)
+                                .where(UsersOrm.id.in_({row.user_id for row in rows}))
+                                .with_for_update()).all())
+        for row in rows:
+            if roles[row.user_id] == Role.registered:
+                promoted_ids.add(row.user_id)
+            elif roles[row.user_id] not in (Role.volunteer, Role.admin):
+                transition.fail(row.id, "User already has a role")
+
+    transition.apply()
+    if promoted_ids:
+        db.execute(update(UsersOrm)
+                   .where(UsersOrm.id.in_(promoted_ids))
+                   .values(role=Role.volunteer)
+                   .execution_options(synchronize_session=False))
+        count_rows(db, UsersOrm, [{"role": Role.registered}] * len(promoted_ids), -1)
+        count_rows(db, UsersOrm, [{"role": Role.volunteer}] * len(promoted_ids), 1)
+    db.commit()
+    # the user roles may have changed
+    for user_id in {row.user_id for row in transition.rows}:
+        invalidate_user_sessions(user_id)
+    return transition.results()
+
+
 @staff_router.patch("/volunteer_applications/{application_id}", status_code=HTTP_200_OK)
-async def update_application_status(db: db_dependency, application_id: int, status: ApplicationStatus = Query(...)):
+def update_application_status(db: db_dependency, application_id: int, status: ApplicationStatus = Query(...)):
     application = db.query(VolunteerApplicationsOrm).filter(VolunteerApplicationsOrm.id == application_id).first()
 
     if not application:
@@ -177,6 +284,8 @@ async def update_application_status(db: db_dependency, application_id: int, stat
             raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="User already has a role")
 
     db.commit()
+    # the user role may have changed
+    invalidate_user_sessions(application.user_id)
     return {"message": "Application status updated successfully", "status": status.value}
 
 
@@ -191,8 +300,8 @@ async def vet_request_page(request: Request, animal: animal_dependency, session:
 
 
 @staff_router.post("/new_request/{animal_id}", status_code=HTTP_201_CREATED)
-async def create_vet_request(db: db_dependency, animal: animal_dependency, staff: staff_dependency,
-                             description: str = Form(...)):
+def create_vet_request(db: db_dependency, animal: animal_dependency, staff: staff_dependency,
+                       description: str = Form(...)):
     new_request = VetRequestOrm(
         animal_id=animal.id,
         user_id=staff.id,
@@ -206,37 +315,48 @@ async def create_vet_request(db: db_dependency, animal: animal_dependency, staff
 
 
 @staff_router.get("/walk_requests", status_code=HTTP_200_OK)
+@statement_budget(7)
 async def walk_requests_page(
         request: Request,
-        db: db_dependency,
+        db: async_db_dependency,
         session: session_dependency,
         status_filter: Optional[WalkStatus] = Query(default=None),
+        after: Optional[str] = Query(default=None),
+        before: Optional[str] = Query(default=None),
 ):
     """
     Displays the walk requests page with filtering.
     """
 
-    walks = db.query(WalksOrm).all()
-
-    if status_filter:
-        walks = list(filter(lambda walk: walk.status == status_filter, walks))
-
-    status_to_int = lambda status: {WalkStatus.started: 0, WalkStatus.accepted: 1, WalkStatus.pending: 2}.get(status, 4)
-    walk_sort = lambda walk: (status_to_int(walk.status), walk.date, walk.id)
-
-    walks.sort(key=walk_sort)
+    queue_page = await walk_queue.page_async(db, settings.QUEUE_PAGE_SIZE, after, before, status_filter,
+                                             options=[joinedload(WalksOrm.animal), joinedload(WalksOrm.user)])
 
     return templates.TemplateResponse("staff/walk_requests.html",
                                       {
                                           "request": request,
                                           "user": session.user,
-                                          "walks": walks,
+                                          "walks": queue_page.items,
+                                          "queue_page": queue_page,
                                           "status_filter": status_filter.value if status_filter else None
                                       })
 
 
+@staff_router.patch("/walk_requests/status", status_code=HTTP_200_OK)
+def update_walk_statuses(db: db_dependency, ids: bulk_ids, status: Annotated[WalkStatus, Body()]):
+    """
+    Updates the status of many walk requests in one transaction, reporting the outcome of every id.
+    """
+    transition = BulkTransition(db, WalksOrm, ids, status, walk_transitions)
+    transition.plan()
+    transition.apply()
+    if status in released_statuses:
+        release_slots(db, transition.updated_ids)
+    db.commit()
+    return transition.results()
+
+
 @staff_router.patch("/walk_requests/{walk_id}/status", status_code=HTTP_200_OK)
-async def update_walk_status(
+def update_walk_status(
         walk: walk_dependency,
         db: db_dependency,
         status: WalkStatus = Query(...),
@@ -245,45 +365,93 @@ async def update_walk_status(
     Updates the status of a walk request.
     """
 
-    walk.status = status
+    set_walk_status(db, walk, status)
     db.commit()
 
     return {"message": "Walk request status updated successfully."}
 
 
 @staff_router.get("/adoption_requests", status_code=HTTP_200_OK)
+@statement_budget(4)
 async def adoption_requests_page(
         request: Request,
-        db: db_dependency,
+        db: async_db_dependency,
         session: session_dependency,
-        status_filter: Optional[ApplicationStatus] = Query(default=None),
+        status_filter: Optional[AdoptionStatus] = Query(default=None),
+        after: Optional[str] = Query(default=None),
+        before: Optional[str] = Query(default=None),
 ):
     """
     Displays the adoption requests page with filtering.
     """
 
-    adoption_requests = db.query(AdoptionRequestsOrm).all()
-
-    if status_filter:
-        adoption_requests = list(filter(lambda request: request.status == status_filter, adoption_requests))
-
-    status_to_int = lambda status: {ApplicationStatus.pending: 0, ApplicationStatus.accepted: 1,
-                                    ApplicationStatus.rejected: 2}.get(status, 4)
-    request_sort = lambda request: (status_to_int(request.status), request.date, request.id)
-
-    adoption_requests.sort(key=request_sort)
+    queue_page = await adoption_queue.page_async(db, settings.QUEUE_PAGE_SIZE, after, before, status_filter,
+                                                 options=[joinedload(AdoptionRequestsOrm.animal),
+                                                          joinedload(AdoptionRequestsOrm.user)])
 
     return templates.TemplateResponse("staff/adoption_requests.html",
                                       {
                                           "request": request,
                                           "user": session.user,
-                                          "adoption_requests": adoption_requests,
+                                          "adoption_requests": queue_page.items,
+                                          "queue_page": queue_page,
                                           "status_filter": status_filter.value if status_filter else None
                                       })
 
 
+@staff_router.patch("/adoption_requests/status", status_code=HTTP_200_OK)
+def update_adoption_request_statuses(db: db_dependency, ids: bulk_ids, status: Annotated[AdoptionStatus, Body()]):
+    """
+    Updates the status of many adoption requests in one transaction, reporting the outcome of every id.
+    Only one request can be accepted for an animal, the other requests for it are rejected.
+    """
+    transition = BulkTransition(db, AdoptionRequestsOrm, ids, status, adoption_transitions)
+    rows = transition.plan(AdoptionRequestsOrm.animal_id)
+
+    # animal id -> id of the accepted request
+    adoptions = {}
+    if status == AdoptionStatus.accepted:
+        animals = {animal.id: animal for animal in db.execute(select(AnimalsOrm.id, AnimalsOrm.status,
+                                                                     AnimalsOrm.hidden, AnimalsOrm.species)
+                                                              .where(AnimalsOrm.id.in_({row.animal_id
+                                                                                        for row in rows}))
+                                                              .with_for_update())}
+        for row in rows:
+            if animals[row.animal_id].status == AnimalStatus.adopted:
+                transition.fail(row.id, "Animal already adopted")
+            elif animals[row.animal_id].status != AnimalStatus.available:
+                transition.fail(row.id, "Animal is not available")
+            elif row.animal_id in adoptions:
+                transition.fail(row.id, "Another request for the animal is accepted")
+            else:
+                adoptions[row.animal_id] = row.id
+
+    transition.apply()
+    if adoptions:
+        db.execute(update(AnimalsOrm)
+                   .where(AnimalsOrm.id.in_(adoptions))
+                   .values(hidden=True, status=AnimalStatus.adopted, version=AnimalsOrm.version + 1)
+                   .execution_options(synchronize_session=False))
+        adopted = [animals[animal_id] for animal_id in adoptions]
+        count_rows(db, AnimalsOrm, adopted, -1)
+        count_rows(db, AnimalsOrm, [{"status": AnimalStatus.adopted, "hidden": True, "species": animal.species}
+                                    for animal in adopted], 1)
+        bump_catalog_version(db)
+        # reject all other requests for the adopted animals, the others are already rejected
+        rejected = db.execute(update(AdoptionRequestsOrm)
+                              .where(AdoptionRequestsOrm.animal_id.in_(adoptions),
+                                     AdoptionRequestsOrm.id.not_in(adoptions.values()),
+                                     AdoptionRequestsOrm.status == AdoptionStatus.pending)
+                              .values(status=AdoptionStatus.rejected)
+                              .execution_options(synchronize_session=False)).rowcount
+        count_rows(db, AdoptionRequestsOrm, [{"status": AdoptionStatus.pending}] * rejected, -1)
+        count_rows(db, AdoptionRequestsOrm, [{"status": AdoptionStatus.rejected}] * rejected, 1)
+    db.commit()
+    return transition.results()
+
+
 @staff_router.patch("/adoption_requests/{request_id}/status", status_code=HTTP_200_OK)
-async def update_adoption_request_status(
+def update_adoption_request_status(
         request_id: int,
         db: db_dependency,
         status: AdoptionStatus = Query(...),
@@ -305,3 +473,22 @@ async def update_adoption_request_status(
     db.commit()
 
     return {"message": "Adoption request status updated successfully."}
+
+
+@staff_router.get("/exports/walks", status_code=HTTP_200_OK)
+async def export_walks(since: datetime | None = None, until: datetime | None = None, status: WalkStatus | None = None,
+                       export_format: ExportFormat = Query(ExportFormat.csv, alias="format")):
+    """
+    Streams the walks with their date in [since, until) as CSV or NDJSON.
+    """
+    return export_response("walks", walks_export(since, until, status), export_format)
+
+
+@staff_router.get("/exports/adoption_requests", status_code=HTTP_200_OK)
+async def export_adoption_requests(since: datetime | None = None, until: datetime | None = None,
+                                   status: AdoptionStatus | None = None,
+                                   export_format: ExportFormat = Query(ExportFormat.csv, alias="format")):
+    """
+    Streams the adoption requests with their date in [since, until) as CSV or NDJSON.
+    """
+    return export_response("adoption_requests", adoption_requests_export(since, until, status), export_format)
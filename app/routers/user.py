@@ -2,19 +2,25 @@ from datetime import timezone, datetime
 
 from fastapi import APIRouter, Request, HTTPException, Form
 from pydantic import BaseModel
+from sqlalchemy.orm import joinedload
 from starlette import status
 from starlette.responses import JSONResponse, RedirectResponse
 
-from app.database import db_dependency, UsersOrm
+from app.database import db_dependency, UsersOrm, SessionsOrm, statement_budget
 from app.database.models import VolunteerApplicationsOrm, AdoptionRequestsOrm
-from app.password import hash_password, verify_password
+from app.password import hash_password, verify_password, needs_rehash
 from app.utils import session_dependency, session_id_cookie, create_session, templates, animal_dependency, \
-    user_animal_adoption_dependency
+    user_animal_adoption_dependency, delete_session, invalidate_user_sessions
 
 user_router = APIRouter(prefix="/user",
                         tags=["user"])
 
 
+# Function to get the volunteer application of the user
+def get_volunteer_application(db: db_dependency, user_id: int) -> VolunteerApplicationsOrm | None:
+    return db.query(VolunteerApplicationsOrm).filter(VolunteerApplicationsOrm.user_id == user_id).first()
+
+
 # Form to register a new user
 class RegisterFormIn(BaseModel):
     name: str = Form(...)
@@ -41,7 +47,7 @@ async def register_page(request: Request, session: session_dependency):
 
 
 @user_router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def register_user(db: db_dependency, form: RegisterFormIn, session: session_dependency):
+def register_user(db: db_dependency, form: RegisterFormIn, session: session_dependency):
     if session:
         return {"message": "Already logged in"}
     try:
@@ -67,7 +73,7 @@ async def login_page(request: Request, session: session_dependency):
 
 
 @user_router.post("/signin", status_code=status.HTTP_200_OK)
-async def login_user(db: db_dependency, form: LoginFormIn, session: session_dependency):
+def login_user(db: db_dependency, form: LoginFormIn, session: session_dependency):
     if session:
         return {"message": "Already logged in"}
     user = UsersOrm.get_user(db, form.username)
@@ -80,6 +86,15 @@ async def login_user(db: db_dependency, form: LoginFormIn, session: session_depe
     if user.disabled:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is disabled")
 
+    if needs_rehash(user.password):
+        # the password is known only now, upgrade its hash to the current number of rounds
+        try:
+            user.password = hash_password(form.password)
+            db.commit()
+        except HTTPException:
+            # the password hasher is busy, the hash will be upgraded on the next login
+            pass
+
     session_id, expiration = create_session(form.username, db)
     response = JSONResponse(content={session_id_cookie: session_id.hex})
     utc_expiration = expiration.astimezone(timezone.utc)
@@ -94,11 +109,10 @@ async def login_user(db: db_dependency, form: LoginFormIn, session: session_depe
 
 
 @user_router.delete("/logout", status_code=status.HTTP_200_OK)
-async def logout_user(db: db_dependency, session: session_dependency):
+def logout_user(db: db_dependency, session: session_dependency):
     if not session:
         return {"message": "Not logged in"}
-    db.delete(session)
-    db.commit()
+    delete_session(db, session)
     response = JSONResponse(content={"message": "Logged out"})
     # Delete the session_id cookie
     response.delete_cookie(key=session_id_cookie)
@@ -106,17 +120,18 @@ async def logout_user(db: db_dependency, session: session_dependency):
 
 
 @user_router.delete("/logout/all", status_code=status.HTTP_200_OK)
-async def logout_all(db: db_dependency, session: session_dependency, keep_current: bool = False):
+def logout_all(db: db_dependency, session: session_dependency, keep_current: bool = False):
     if not session:
         return {"message": "Not logged in"}
     # Delete all user's sessions except the current session if keep_current is True
-    for other_session in session.user.sessions:
-        if keep_current and session.id == other_session.id:
-            continue
-        db.delete(other_session)
+    sessions_query = db.query(SessionsOrm).filter(SessionsOrm.user_id == session.user.id)
+    if keep_current:
+        sessions_query = sessions_query.filter(SessionsOrm.id != session.id)
+    sessions_query.delete(synchronize_session=False)
     db.commit()
+    invalidate_user_sessions(session.user.id, keep_token=session.token if keep_current else None)
     response = JSONResponse(
-        content={"message": f"Logged out from all devices{" except current." if keep_current else "."}"})
+        content={"message": f"Logged out from all devices{' except current.' if keep_current else '.'}"})
     if not keep_current:
         response.delete_cookie(key=session_id_cookie)
     return response
@@ -134,12 +149,12 @@ async def profile_page(request: Request, session: session_dependency):
 
 
 @user_router.get("/volunteer_application", status_code=status.HTTP_200_OK)
-async def volunteer_application_page(request: Request, session: session_dependency):
+def volunteer_application_page(request: Request, session: session_dependency, db: db_dependency):
     if not session:
         return RedirectResponse(url="/user/signin")
     if not session.user.is_registered:
         return RedirectResponse(url="/user/profile")
-    application = session.user.volunteer_application
+    application = get_volunteer_application(db, session.user.id)
     return templates.TemplateResponse("user/volunteer_application.html",
                                       {
                                           "request": request,
@@ -149,15 +164,15 @@ async def volunteer_application_page(request: Request, session: session_dependen
 
 
 @user_router.post("/volunteer_application", status_code=status.HTTP_201_CREATED)
-async def volunteer_application(db: db_dependency, session: session_dependency, description: str = Form(...)):
+def volunteer_application(db: db_dependency, session: session_dependency, description: str = Form(...)):
     if not session:
         return RedirectResponse(url="/user/signin")
     if not session.user.is_registered:
         return RedirectResponse(url="/user/profile")
-    application = session.user.volunteer_application
+    application = get_volunteer_application(db, session.user.id)
     if application:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Application already submitted")
-    application = VolunteerApplicationsOrm(user=session.user, date=datetime.now(), message=description)
+    application = VolunteerApplicationsOrm(user_id=session.user.id, date=datetime.now(), message=description)
     db.add(application)
     db.commit()
 
@@ -174,26 +189,30 @@ async def change_password_page(request: Request, session: session_dependency):
 
 
 @user_router.post("/change_password", status_code=status.HTTP_200_OK)
-async def change_password(db: db_dependency, session: session_dependency, old_password: str = Form(...),
-                          new_password: str = Form(...), confirm_password: str = Form(...)):
+def change_password(db: db_dependency, session: session_dependency, old_password: str = Form(...),
+                    new_password: str = Form(...), confirm_password: str = Form(...)):
     if not session:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not logged in")
-    if not verify_password(old_password, session.user.password):
+    user = db.get(UsersOrm, session.user.id)
+    if not verify_password(old_password, user.password):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect password")
     if new_password != confirm_password:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Passwords do not match")
-    session.user.password = hash_password(new_password)
+    user.password = hash_password(new_password)
     db.commit()
     return {"message": "Password changed"}
 
 
 @user_router.get("/adoptions", status_code=status.HTTP_200_OK)
-async def adoptions_page(request: Request, session: session_dependency):
+@statement_budget(2)
+def adoptions_page(request: Request, session: session_dependency, db: db_dependency):
     if not session:
         return RedirectResponse(url="/user/signin")
 
-    user = session.user
-    adoption_requests = user.adoption_requests
+    adoption_requests = (db.query(AdoptionRequestsOrm)
+                         .options(joinedload(AdoptionRequestsOrm.animal))
+                         .filter(AdoptionRequestsOrm.user_id == session.user.id)
+                         .all())
 
     return templates.TemplateResponse("user/adoptions.html",
                                       {
@@ -204,10 +223,11 @@ async def adoptions_page(request: Request, session: session_dependency):
 
 
 @user_router.get("/adopt/{animal_id}", status_code=status.HTTP_200_OK)
-async def adopt_animal_page(request: Request,
-                            adopt_request: user_animal_adoption_dependency,
-                            session: session_dependency,
-                            animal: animal_dependency):
+@statement_budget(3)
+def adopt_animal_page(request: Request,
+                      adopt_request: user_animal_adoption_dependency,
+                      session: session_dependency,
+                      animal: animal_dependency):
     if not session:
         return RedirectResponse(url="/user/signin")
     return templates.TemplateResponse("animal/adoption_form.html",
@@ -225,11 +245,14 @@ class AdoptionRequestForm(BaseModel):
 
 
 @user_router.post("/adoptions/request", status_code=status.HTTP_201_CREATED)
-async def adoption_request(db: db_dependency, session: session_dependency, form: AdoptionRequestForm):
+def adoption_request(db: db_dependency, session: session_dependency, form: AdoptionRequestForm):
     if not session:
         return RedirectResponse(url="/user/signin")
 
-    existed_request = next(filter(lambda x: x.animal_id == form.animal_id, session.user.adoption_requests), None)
+    existed_request = (db.query(AdoptionRequestsOrm.id)
+                       .filter(AdoptionRequestsOrm.user_id == session.user.id,
+                               AdoptionRequestsOrm.animal_id == form.animal_id)
+                       .first())
 
     if existed_request:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request already submitted")
@@ -1,31 +1,46 @@
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Request, Form, HTTPException
+from typing import Annotated
+
+from fastapi import APIRouter, Request, Form, HTTPException, Body, Query
 from fastapi.params import Depends
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_404_NOT_FOUND, HTTP_400_BAD_REQUEST
 
-from app.database import db_dependency, VetRequestOrm, VetRequestStatus, MedicalHistoriesOrm, TreatmentsOrm, \
-    VaccinationsOrm
-from app.utils import animal_dependency, vet_request_dependency
+from app.aggregates import get_aggregates
+from app.database import db_dependency, async_db_dependency, VetRequestOrm, VetRequestStatus, MedicalHistoriesOrm, \
+    TreatmentsOrm, VaccinationsOrm, statement_budget
+from app.exports import ExportFormat, export_response, vet_requests_export, medical_histories_export
+from app.utils import animal_dependency, vet_request_dependency, BulkTransition, max_bulk_ids
 from app.utils import get_vet, vet_dependency, templates, session_dependency
 
 vet_router = APIRouter(prefix="/vet",
                        tags=["vet"],
                        dependencies=[Depends(get_vet)])
 
+# Status changes of the bulk endpoint, target status -> statuses it may be reached from
+vet_request_transitions = {
+    VetRequestStatus.accepted: [VetRequestStatus.pending],
+    VetRequestStatus.rejected: [VetRequestStatus.pending, VetRequestStatus.accepted],
+}
+
 
 @vet_router.get("/dashboard", status_code=HTTP_200_OK)
-async def vet_dashboard(request: Request, session: session_dependency):
-    return templates.TemplateResponse("vet/dashboard.html", {"request": request, "user": session.user})
+@statement_budget(2)
+async def vet_dashboard(request: Request, session: session_dependency, db: async_db_dependency):
+    return templates.TemplateResponse("vet/dashboard.html", {"request": request, "user": session.user,
+                                                             "aggregates": await db.run_sync(get_aggregates)})
 
 
 @vet_router.get("/requests", status_code=HTTP_200_OK)
-async def get_vet_requests(request: Request, db: db_dependency, vet: vet_dependency,
+@statement_budget(2)
+async def get_vet_requests(request: Request, db: async_db_dependency, vet: vet_dependency,
                            status: VetRequestStatus = Form(None)):
+    query = select(VetRequestOrm).options(joinedload(VetRequestOrm.animal), joinedload(VetRequestOrm.user))
     if status:
-        vet_requests = db.query(VetRequestOrm).filter(VetRequestOrm.status == status).all()
-    else:
-        vet_requests = db.query(VetRequestOrm).all()
+        query = query.where(VetRequestOrm.status == status)
+    vet_requests = (await db.scalars(query)).all()
 
     return templates.TemplateResponse("vet/vet_requests.html", {
         "request": request,
@@ -37,7 +52,8 @@ async def get_vet_requests(request: Request, db: db_dependency, vet: vet_depende
 
 
 @vet_router.get("/request/{request_id}", status_code=HTTP_200_OK)
-async def view_vet_request(request: Request, vet_request: vet_request_dependency, vet: vet_dependency):
+@statement_budget(2)
+def view_vet_request(request: Request, vet_request: vet_request_dependency, vet: vet_dependency):
     return templates.TemplateResponse("vet/vet_request_details.html", {
         "request": request,
         "vet": vet,
@@ -46,8 +62,22 @@ async def view_vet_request(request: Request, vet_request: vet_request_dependency
     })
 
 
+@vet_router.patch("/requests/status", status_code=HTTP_200_OK)
+def update_vet_request_statuses(db: db_dependency,
+                                ids: Annotated[list[int], Body(min_length=1, max_length=max_bulk_ids)],
+                                status: Annotated[VetRequestStatus, Body()]):
+    """
+    Accepts or completes many vet requests in one transaction, reporting the outcome of every id.
+    """
+    transition = BulkTransition(db, VetRequestOrm, ids, status, vet_request_transitions)
+    transition.plan()
+    transition.apply()
+    db.commit()
+    return transition.results()
+
+
 @vet_router.post("/request/{request_id}/accept", status_code=HTTP_200_OK)
-async def accept_vet_request(vet_request: vet_request_dependency, db: db_dependency):
+def accept_vet_request(vet_request: vet_request_dependency, db: db_dependency):
     if vet_request.status != VetRequestStatus.pending:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Request is not in a pending state")
     vet_request.status = VetRequestStatus.accepted
@@ -56,7 +86,7 @@ async def accept_vet_request(vet_request: vet_request_dependency, db: db_depende
 
 
 @vet_router.post("/request/{request_id}/complete", status_code=HTTP_200_OK)
-async def complete_vet_request(vet_request: vet_request_dependency, db: db_dependency):
+def complete_vet_request(vet_request: vet_request_dependency, db: db_dependency):
     if vet_request.status != VetRequestStatus.accepted and vet_request.status != VetRequestStatus.pending:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Request is not in an accepted or pending state")
     vet_request.status = VetRequestStatus.rejected
@@ -75,8 +105,8 @@ async def treatment(request: Request, animal: animal_dependency, vet: vet_depend
 
 
 @vet_router.post("/new_treatment/{animal_id}", status_code=HTTP_201_CREATED)
-async def create_treatment(db: db_dependency, animal: animal_dependency, date: datetime = Form(...),
-                           description: str = Form(...)):
+def create_treatment(db: db_dependency, animal: animal_dependency, date: datetime = Form(...),
+                     description: str = Form(...)):
     med_history = animal.medical_history
     if not med_history:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Please create medical history first.")
@@ -102,8 +132,8 @@ async def vaccination(request: Request, animal: animal_dependency, vet: vet_depe
 
 
 @vet_router.post("/new_vaccination/{animal_id}", status_code=HTTP_201_CREATED)
-async def create_vaccination(db: db_dependency, animal: animal_dependency, date: datetime = Form(...),
-                             description: str = Form(...)):
+def create_vaccination(db: db_dependency, animal: animal_dependency, date: datetime = Form(...),
+                       description: str = Form(...)):
     med_history = animal.medical_history
     if not med_history:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Please create medical history first.")
@@ -129,7 +159,7 @@ async def medical_history(request: Request, animal: animal_dependency, vet: vet_
 
 
 @vet_router.post("/new_medical_history/{animal_id}", status_code=HTTP_201_CREATED)
-async def create_medical_history(db: db_dependency, animal: animal_dependency, description: str = Form(...)):
+def create_medical_history(db: db_dependency, animal: animal_dependency, description: str = Form(...)):
     med_history = animal.medical_history
     if med_history:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Medical history already exists for this animal.")
@@ -146,21 +176,32 @@ async def create_medical_history(db: db_dependency, animal: animal_dependency, d
 
 
 @vet_router.get("/medical_history_profile/{animal_id}", status_code=HTTP_200_OK)
-async def get_medical_history(request: Request, animal: animal_dependency, vet: vet_dependency):
+@statement_budget(5)
+def get_medical_history(request: Request, db: db_dependency, animal: animal_dependency, vet: vet_dependency):
+    medical_history = (db.query(MedicalHistoriesOrm)
+                       .options(selectinload(MedicalHistoriesOrm.treatments),
+                                selectinload(MedicalHistoriesOrm.vaccinations))
+                       .filter(MedicalHistoriesOrm.animal_id == animal.id)
+                       .first())
     return templates.TemplateResponse("vet/medical_history_profile.html", {
         "request": request,
         "animal": animal,
         "user": vet,
-        "medical_history": animal.medical_history
+        "medical_history": medical_history
     })
 
 
 @vet_router.get("/requests/{animal_id}", status_code=HTTP_200_OK)
-async def get_vet_requests(request: Request, animal: animal_dependency, vet: vet_dependency,
-                           status: VetRequestStatus = Form(None)):
-    vet_requests = animal.vet_requests
+@statement_budget(3)
+async def get_vet_requests(request: Request, db: async_db_dependency, animal: animal_dependency,
+                           vet: vet_dependency, status: VetRequestStatus = Form(None)):
+    # the animal of the dependency is in the other session, the template reads it from the requests
+    query = (select(VetRequestOrm)
+             .options(joinedload(VetRequestOrm.animal), joinedload(VetRequestOrm.user))
+             .where(VetRequestOrm.animal_id == animal.id))
     if status:
-        vet_requests = list(filter(lambda x: x.status == status, vet_requests))
+        query = query.where(VetRequestOrm.status == status)
+    vet_requests = (await db.scalars(query)).all()
 
     return templates.TemplateResponse("vet/vet_requests.html", {
         "request": request,
@@ -170,3 +211,23 @@ async def get_vet_requests(request: Request, animal: animal_dependency, vet: vet
         "status": status,
         "animal_name": animal.name
     })
+
+
+@vet_router.get("/exports/requests", status_code=HTTP_200_OK)
+async def export_vet_requests(since: datetime | None = None, until: datetime | None = None,
+                              status: VetRequestStatus | None = None,
+                              export_format: ExportFormat = Query(ExportFormat.csv, alias="format")):
+    """
+    Streams the vet requests with their date in [since, until) as CSV or NDJSON.
+    """
+    return export_response("vet_requests", vet_requests_export(since, until, status), export_format)
+
+
+@vet_router.get("/exports/medical_histories", status_code=HTTP_200_OK)
+async def export_medical_histories(since: datetime | None = None, until: datetime | None = None,
+                                   animal_id: int | None = None,
+                                   export_format: ExportFormat = Query(ExportFormat.csv, alias="format")):
+    """
+    Streams the treatments and vaccinations with their date in [since, until) as CSV or NDJSON.
+    """
+    return export_response("medical_histories", medical_histories_export(since, until, animal_id), export_format)
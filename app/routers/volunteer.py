@@ -1,11 +1,19 @@
-from datetime import datetime, timedelta
-from typing import List
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
 
 from fastapi import APIRouter, Request, HTTPException, Depends, Query
 from pydantic import BaseModel
-from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN
-
-from app.database import db_dependency, WalksOrm, WalkStatus, AnimalStatus
+from sqlalchemy import false, select
+from sqlalchemy.orm import joinedload
+from starlette.responses import JSONResponse
+from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, \
+    HTTP_404_NOT_FOUND
+
+from app.aggregates import get_aggregates
+from app.database import db_dependency, async_db_dependency, WalksOrm, WalkStatus, AnimalStatus, AnimalsOrm, \
+    statement_budget
+from app.photos import photo_url
+from app.walks import book_walks, set_walk_status, get_occupancy, find_walkable_animals
 from app.utils import get_volunteer, volunteer_dependency, templates, animal_dependency, session_dependency, \
     walk_dependency
 
@@ -21,7 +29,9 @@ volunteer_router = APIRouter(prefix="/volunteer",
 
 
 @volunteer_router.get("/dashboard", status_code=HTTP_200_OK)
-async def staff_dashboard(request: Request, volunteer: volunteer_dependency, session: session_dependency):
+@statement_budget(2)
+async def staff_dashboard(request: Request, volunteer: volunteer_dependency, session: session_dependency,
+                          db: async_db_dependency):
     """
     Render the template with volunteer dashboard
     """
@@ -29,22 +39,26 @@ async def staff_dashboard(request: Request, volunteer: volunteer_dependency, ses
         "volunteer/dashboard.html", {
             "request": request,
             "staff": volunteer,
-            "user": session.user
+            "user": session.user,
+            "aggregates": await db.run_sync(get_aggregates)
         }
     )
 
 
 @volunteer_router.get("/history", status_code=HTTP_200_OK)
+@statement_budget(2)
 async def volunteer_history(
         request: Request,
-        volunteer: volunteer_dependency
+        volunteer: volunteer_dependency,
+        db: async_db_dependency
 ):
     """
     Returns the history of the walks for the current volunteer
     """
-    walks = volunteer.walks
-
-    walks.sort(key=lambda walk: walk.date, reverse=True)
+    walks = (await db.scalars(select(WalksOrm)
+                              .options(joinedload(WalksOrm.animal))
+                              .where(WalksOrm.user_id == volunteer.id)
+                              .order_by(WalksOrm.date.desc()))).all()
 
     return templates.TemplateResponse(
         "volunteer/history.html",
@@ -58,7 +72,7 @@ async def volunteer_history(
 
 
 @volunteer_router.delete("/walks/{walk_id}/cancel", status_code=HTTP_200_OK)
-async def cancel_walk(
+def cancel_walk(
         walk: walk_dependency,
         db: db_dependency,
         volunteer: volunteer_dependency,
@@ -77,8 +91,8 @@ async def cancel_walk(
     if walk.date.date() <= today.date():
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Cannot cancel past walks.")
 
-    # Update walk status to 'canceled'
-    walk.status = WalkStatus.cancelled
+    # Update walk status to 'canceled', its hours are free again
+    set_walk_status(db, walk, WalkStatus.cancelled)
     db.commit()
 
     return {"message": "Walk canceled successfully."}
@@ -108,7 +122,7 @@ async def reserve_calendar(
 
 
 @volunteer_router.post("/animals/{animal_id}/reserve", status_code=HTTP_201_CREATED)
-async def reserve_walks(
+def reserve_walks(
         animal: animal_dependency,
         request: ReserveWalksRequest,
         db: db_dependency,
@@ -147,84 +161,105 @@ async def reserve_walks(
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="No slots selected.")
 
     # Sort slots to ensure chronological order
-    slots.sort()
+    slots = sorted(set(slots))
 
     sessions = group_continuous_slots()
 
-    # Create walk records in the database
-    for session in sessions:
-        start_time = session[0]
-        end_time = session[-1] + timedelta(hours=1)  # Each slot represents one hour
-        duration = int((end_time - start_time).total_seconds() / 60)  # Duration in minutes
-
-        # Check for existing walks at the same date
-
-        overlapping_walks = list(filter(
-            lambda s_walk:
-            s_walk.status not in [WalkStatus.rejected, WalkStatus.cancelled] and
-            s_walk.date < end_time and
-            (s_walk.date + timedelta(minutes=s_walk.duration)) > start_time,
-            animal.scheduled_walks
-        ))
-
-        if overlapping_walks:
-            overlapping_details = [
-                f"Walk on {walk.date.strftime('%Y-%m-%d %H:%M')} for {walk.duration} minutes (status: {walk.status})"
-                for walk in overlapping_walks
-            ]
-            raise HTTPException(
-                status_code=HTTP_400_BAD_REQUEST,
-                detail=f"Requested time slots overlap with existing walks: {', '.join(overlapping_details)}"
-            )
-
-        new_walk = WalksOrm(
-            animal_id=animal.id,
-            user_id=volunteer.id,
-            date=start_time,
-            duration=duration,
-            location=location,
-        )
-        db.add(new_walk)
+    # Each slot represents one hour
+    sessions = [(session[0], session[-1] + timedelta(hours=1)) for session in sessions]
 
+    # Create walk records in the database, booking fails if any of their hours is already taken
+    book_walks(db, animal.id, volunteer.id, sessions, location)
     db.commit()
 
     return {"message": "Walks reserved successfully."}
 
 
-@volunteer_router.get("/animals/{animal_id}/scheduled-walks", status_code=HTTP_200_OK)
-async def get_scheduled_walks(
+@volunteer_router.get("/availability", status_code=HTTP_200_OK)
+@statement_budget(3)
+def walk_availability(
+        db: db_dependency,
+        start: date = Query(...),
+        days: int = Query(default=7, ge=1, le=62),
+        animal_ids: List[int] = Query(default=[]),
+):
+    """
+    Returns the taken hours of the animals available for walks, as one 24-bit mask per day from the start date,
+    where the bit h is set when the hour h is taken. Without animal_ids, all the available animals are returned.
+    Asking for an animal which does not exist, or which cannot be walked, fails instead of leaving it out.
+    """
+    if animal_ids:
+        animals = db.execute(select(AnimalsOrm.id, AnimalsOrm.status, AnimalsOrm.hidden)
+                             .where(AnimalsOrm.id.in_(animal_ids))).all()
+        if len(animals) < len(set(animal_ids)):
+            raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Animal not found")
+        if any(animal.status != AnimalStatus.available or animal.hidden for animal in animals):
+            raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Animal is not available.")
+        walkable_ids = [animal.id for animal in animals]
+    else:
+        walkable_ids = db.scalars(select(AnimalsOrm.id).where(AnimalsOrm.status == AnimalStatus.available,
+                                                              AnimalsOrm.hidden == false())).all()
+    occupancy = get_occupancy(db, walkable_ids, start, days)
+
+    return {"start": start, "days": days, "occupancy": occupancy}
+
+
+@volunteer_router.get("/animals/{animal_id}/scheduled-walks", status_code=HTTP_200_OK, deprecated=True)
+@statement_budget(3)
+def get_scheduled_walks(
+        db: db_dependency,
         animal: animal_dependency,
         start_date: datetime = Query(...),
         end_date: datetime = Query(...),
 ):
     """
-    Fetches all scheduled walks for a specific animal within a given date range.
+    Fetches the taken hours of a specific animal within a given date range.
+    Deprecated: kept for the existing clients, the calendar reads /volunteer/availability, which answers
+    for many animals at once. The hours are read from the same occupancy masks.
     """
-
     if animal.status not in [AnimalStatus.available] or animal.hidden:
         raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Animal is not available.")
+    if end_date <= start_date:
+        return {"scheduled_slots": []}
 
-    scheduled_walks = list(filter(
-        lambda s_walk:
-        s_walk.status not in [WalkStatus.rejected, WalkStatus.cancelled] and
-        start_date <= s_walk.date < end_date, animal.scheduled_walks
-    ))
-    # Generate scheduled slots
+    start = start_date.date()
+    days = (end_date.date() - start).days + 1
+    masks = get_occupancy(db, [animal.id], start, days)[animal.id]
     scheduled_slots = []
+    for offset, mask in enumerate(masks):
+        day = start + timedelta(days=offset)
+        for hour in range(24):
+            if mask >> hour & 1 and start_date <= datetime.combine(day, time(hour)) < end_date:
+                scheduled_slots.append({"hour": f"{hour:02}:00", "date": day.isoformat()})
 
-    for walk in scheduled_walks:
-        start_time = walk.date
-        end_time = start_time + timedelta(minutes=walk.duration)
+    return {"scheduled_slots": scheduled_slots}
 
-        # Calculate the number of full hours
-        num_slots = int((end_time - start_time).total_seconds() // 3600)
 
-        # Generate slots for each hour
-        for hour_offset in range(num_slots):
-            slot_time = start_time + timedelta(hours=hour_offset)
-            scheduled_slots.append({
-                "hour": slot_time.strftime("%H:00"),
-                "date": slot_time.strftime("%Y-%m-%d"),
-            })
+@volunteer_router.get("/animals/free", status_code=HTTP_200_OK)
+@statement_budget(2)
+def free_animals(
+        db: db_dependency,
+        start: datetime = Query(...),
+        end: datetime = Query(...),
+        species: Optional[str] = Query(default=None),
+):
+    """
+    Returns the animals available for walks which have no walk between start and end.
+    """
+    if end <= start:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="The end must be after the start.")
 
-    return {"scheduled_slots": scheduled_slots}
+    animals = find_walkable_animals(db, start, end, species)
+
+    # the results are plain values, returned without the generic response encoding
+    return JSONResponse(content={"animals": [
+        {
+            "id": animal.id,
+            "name": animal.name,
+            "species": animal.species,
+            "age": animal.age,
+            "photo": photo_url(animal, "thumb"),
+            "calendar": f"/volunteer/animals/{animal.id}/calendar",
+        }
+        for animal in animals
+    ]})
@@ -2,6 +2,12 @@ __all__ = [
     'session_duration',
     'session_id_cookie',
     'create_session',
+    'delete_session',
+    'invalidate_session',
+    'invalidate_user_sessions',
+    'invalidate_all_sessions',
+    'SessionUser',
+    'CachedSession',
     'user_dependency',
     'session_dependency',
     'admin_dependency',
@@ -14,17 +20,30 @@ __all__ = [
     'get_staff',
     'get_admin',
     'get_user',
-    'application_status_to_int',
     'get_animal',
     'animal_dependency',
+    'precondition_failed_exception',
+    'entity_tag',
+    'check_version',
     'walk_dependency',
     'vet_request_dependency',
-    'user_animal_adoption_dependency'
+    'user_animal_adoption_dependency',
+    'StatusQueue',
+    'QueuePage',
+    'BulkTransition',
+    'max_bulk_ids',
+    'cache_page',
+    'page_cache',
+    'bump_catalog_version'
 ]
 
 from .utils import session_duration, session_id_cookie, create_session, user_dependency, session_dependency, \
+    delete_session, invalidate_session, invalidate_user_sessions, invalidate_all_sessions, SessionUser, CachedSession, \
     admin_dependency, \
     staff_dependency, templates, vet_dependency, volunteer_dependency, get_vet, get_volunteer, get_staff, get_admin, \
     get_user, \
-    application_status_to_int, get_animal, animal_dependency, walk_dependency, vet_request_dependency, \
+    get_animal, animal_dependency, precondition_failed_exception, entity_tag, check_version, walk_dependency, vet_request_dependency, \
     user_animal_adoption_dependency
+from .listing import StatusQueue, QueuePage
+from .transitions import BulkTransition, max_bulk_ids
+from .page_cache import cache_page, page_cache, bump_catalog_version
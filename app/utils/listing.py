@@ -0,0 +1,142 @@
+import base64
+import heapq
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.status import HTTP_400_BAD_REQUEST
+
+invalid_cursor_exception = HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+class QueuePage:
+    """
+    One page of a status queue, with the cursors of the neighbouring pages (None if there is no such page).
+    """
+
+    def __init__(self, items: list, next_cursor: str | None, prev_cursor: str | None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+class StatusQueue:
+    """
+    Work queue over a model with status, date and id columns, ordered by the status priority, then by date and id.
+
+    priorities is the list of status groups, the most urgent first; statuses in one group share the priority.
+    The model needs an index on (status, date, id): every page is read by index range seeks, one per status,
+    starting right after the cursor, so a page costs the same on the first page and deep in the history.
+    """
+
+    def __init__(self, model: Any, priorities: Sequence[Sequence[Enum]]):
+        self.model = model
+        self.priorities = [tuple(group) for group in priorities]
+
+    def priority(self, status: Enum) -> int:
+        for priority, group in enumerate(self.priorities):
+            if status in group:
+                return priority
+        return len(self.priorities)
+
+    def groups(self, status: Enum | None) -> list[tuple[int, tuple[Enum, ...]]]:
+        # the status filter leaves only its own group, with its position in the queue
+        if status is None:
+            return list(enumerate(self.priorities))
+        return [(self.priority(status), (status,))]
+
+    def key(self, item: Any) -> tuple[int, datetime, int]:
+        return self.priority(item.status), item.date, item.id
+
+    @staticmethod
+    def encode_cursor(key: tuple[int, datetime, int]) -> str:
+        priority, date, item_id = key
+        data = json.dumps([priority, date.isoformat(), item_id]).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[int, datetime, int]:
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            priority, date, item_id = json.loads(data)
+            return int(priority), datetime.fromisoformat(date), int(item_id)
+        except (ValueError, TypeError):
+            raise invalid_cursor_exception
+
+    def seek(self, db: Session, status: Enum, after: tuple[datetime, int] | None, limit: int,
+             backward: bool, options: Sequence) -> list:
+        model = self.model
+        query = select(model).where(model.status == status).options(*options)
+        if after is not None:
+            date, item_id = after
+            if backward:
+                query = query.where(or_(model.date < date, and_(model.date == date, model.id < item_id)))
+            else:
+                query = query.where(or_(model.date > date, and_(model.date == date, model.id > item_id)))
+        if backward:
+            query = query.order_by(model.date.desc(), model.id.desc())
+        else:
+            query = query.order_by(model.date, model.id)
+        return list(db.scalars(query.limit(limit)))
+
+    def scan(self, db: Session, cursor: tuple[int, datetime, int] | None, limit: int, status: Enum | None,
+             backward: bool, options: Sequence) -> list:
+        """
+        Collects up to limit items strictly after (or before, if backward) the cursor, in the scan order.
+        """
+        groups = self.groups(status)
+        if backward:
+            groups.reverse()
+        items = []
+        for priority, statuses in groups:
+            after = None
+            if cursor is not None:
+                # the groups on the other side of the cursor are skipped, its own group continues after it
+                if priority > cursor[0] if backward else priority < cursor[0]:
+                    continue
+                if priority == cursor[0]:
+                    after = cursor[1:]
+            needed = limit - len(items)
+            # every status of the group is read in order by its own seek, and the results are merged
+            seeks = [self.seek(db, group_status, after, needed, backward, options) for group_status in statuses]
+            merged = heapq.merge(*seeks, key=lambda item: (item.date, item.id), reverse=backward)
+            items.extend(item for _, item in zip(range(needed), merged))
+            if len(items) >= limit:
+                break
+        return items
+
+    def page(self, db: Session, limit: int, after: str | None = None, before: str | None = None,
+             status: Enum | None = None, options: Sequence = ()) -> QueuePage:
+        """
+        Reads the page right after the after cursor, or right before the before cursor, or the first page.
+        options are the loader options of the items, e.g. the relationships the page renders.
+        """
+        if before is not None:
+            # one extra item tells whether there is a page before this one
+            items = self.scan(db, self.decode_cursor(before), limit + 1, status, True, options)
+            has_prev = len(items) > limit
+            items = items[:limit][::-1]
+            has_next = True
+        else:
+            cursor = self.decode_cursor(after) if after is not None else None
+            items = self.scan(db, cursor, limit + 1, status, False, options)
+            has_next = len(items) > limit
+            items = items[:limit]
+            has_prev = cursor is not None
+        return QueuePage(
+            items,
+            self.encode_cursor(self.key(items[-1])) if items and has_next else None,
+            self.encode_cursor(self.key(items[0])) if items and has_prev else None,
+        )
+
+    async def page_async(self, db: AsyncSession, limit: int, after: str | None = None, before: str | None = None,
+                         status: Enum | None = None, options: Sequence = ()) -> QueuePage:
+        """
+        The page for the async handlers, the seeks run on the connection of the async session.
+        """
+        return await db.run_sync(lambda session: self.page(session, limit, after, before, status, options))
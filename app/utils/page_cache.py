@@ -0,0 +1,173 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import object_session
+from starlette.responses import Response
+from starlette.status import HTTP_200_OK
+
+from app.aggregates import bump_version, get_aggregates, aggregates_cache
+from app.config import settings
+from app.database import AnimalsOrm, database_breaker
+from app.database.budget import current_counter
+from app.database.database import async_session_factory
+from app.metrics import Counter
+
+logger = logging.getLogger("uvicorn.error")
+
+# version of the content of the public pages, bumped by every change of an animal
+catalog_version_name = "catalog"
+
+page_cache_requests = Counter("page_cache_requests_total", "Anonymous page requests by the page cache result",
+                              ("result",))
+
+
+class CachedPage:
+    def __init__(self, version: int, response: Response):
+        self.version = version
+        self.body = response.body
+        self.media_type = response.media_type
+        self.created = time.monotonic()
+
+    def response(self, result: str) -> Response:
+        return Response(content=self.body, media_type=self.media_type, headers={"X-Cache": result})
+
+
+class PageCache:
+    """
+    LRU cache of the pages rendered for anonymous visitors, keyed by the url.
+
+    A page is fresh while the catalog version it was rendered with is current and it is younger than ttl seconds.
+    A page that is not fresh but younger than ttl + stale seconds is still served, and rendered again in the
+    background, so a visitor waits for the database only when the page is not cached at all.
+    While the database is unavailable, a cached page is served whatever its age.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, stale: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale = stale
+        self.pages: OrderedDict[str, CachedPage] = OrderedDict()
+        # url -> task rendering the page again in the background
+        self.refreshing: dict[str, asyncio.Task] = {}
+
+    def get(self, key: str, degraded: bool = False) -> CachedPage | None:
+        page = self.pages.get(key)
+        if page is None:
+            return None
+        if not degraded and time.monotonic() - page.created > self.ttl + self.stale:
+            del self.pages[key]
+            return None
+        self.pages.move_to_end(key)
+        return page
+
+    def set(self, key: str, page: CachedPage):
+        self.pages[key] = page
+        self.pages.move_to_end(key)
+        while len(self.pages) > self.maxsize:
+            self.pages.popitem(last=False)
+
+    def is_fresh(self, page: CachedPage, version: int) -> bool:
+        return page.version == version and time.monotonic() - page.created <= self.ttl
+
+    async def render(self, key: str, version: int, render: Callable[[], Awaitable[Response]]) -> Response:
+        response = await render()
+        # only complete anonymous pages are cached, never redirects or responses setting cookies
+        if response.status_code == HTTP_200_OK and "set-cookie" not in response.headers:
+            self.set(key, CachedPage(version, response))
+        else:
+            # the page is gone, e.g. the animal was deleted, its old copy must not be served
+            self.pages.pop(key, None)
+        return response
+
+    async def refresh(self, key: str, version: int, render: Callable[[], Awaitable[Response]]):
+        # the request is over, its statements are not counted to its budget
+        current_counter.set(None)
+        try:
+            await self.render(key, version, render)
+        except Exception as exc:
+            # nobody awaits the task, the page is dropped and rendered by the next request which misses it
+            logger.warning(f"Rendering {key} again for the page cache failed: {exc!r}")
+            self.pages.pop(key, None)
+        finally:
+            self.refreshing.pop(key, None)
+
+    def clear(self):
+        self.pages.clear()
+
+
+page_cache = PageCache(settings.PAGE_CACHE_SIZE, settings.PAGE_CACHE_TTL, settings.PAGE_CACHE_STALE)
+
+
+async def catalog_version() -> int:
+    # the version is read from the aggregates, which are cached in memory most of the time
+    aggregates = aggregates_cache.get()
+    if aggregates is None:
+        async with async_session_factory() as db:
+            aggregates = await db.run_sync(get_aggregates)
+    return aggregates[f"version.{catalog_version_name}"]
+
+
+def cache_page(endpoint: Callable[..., Awaitable[Response]]) -> Callable[..., Awaitable[Response]]:
+    """
+    Serves the page from the page cache to anonymous visitors.
+    The endpoint needs the request and session parameters, and a db parameter with an async session if it queries.
+    """
+
+    @functools.wraps(endpoint)
+    async def cached_endpoint(**kwargs: Any) -> Response:
+        request: Request = kwargs["request"]
+        if kwargs["session"]:
+            return await endpoint(**kwargs)
+        key = request.url.path + ("?" + str(request.query_params) if request.query_params else "")
+        try:
+            database_breaker.check()
+            version = await catalog_version()
+        except SQLAlchemyError:
+            page = page_cache.get(key, degraded=True)
+            if page is None:
+                raise
+            page_cache_requests.inc(result="degraded")
+            return page.response("STALE")
+        page = page_cache.get(key)
+        if page is not None and page_cache.is_fresh(page, version):
+            page_cache_requests.inc(result="hit")
+            return page.response("HIT")
+        if page is not None:
+            if key not in page_cache.refreshing:
+                page_cache.refreshing[key] = asyncio.create_task(
+                    page_cache.refresh(key, version, functools.partial(render_again, kwargs)))
+            page_cache_requests.inc(result="stale")
+            return page.response("STALE")
+        page_cache_requests.inc(result="miss")
+        response = await page_cache.render(key, version, functools.partial(endpoint, **kwargs))
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    async def render_again(kwargs: dict) -> Response:
+        # the session of the request is closed with it, the page is rendered with a new one
+        if "db" not in kwargs:
+            return await endpoint(**kwargs)
+        async with async_session_factory() as db:
+            return await endpoint(**{**kwargs, "db": db})
+
+    return cached_endpoint
+
+
+def bump_catalog_version(db):
+    # for the set-based statements changing animals, the ORM changes are caught by the events below
+    bump_version(db, catalog_version_name)
+
+
+def bump_changed_catalog(_, __, target: AnimalsOrm):
+    bump_catalog_version(object_session(target))
+
+
+for catalog_event in ("after_insert", "after_update", "after_delete"):
+    event.listen(AnimalsOrm, catalog_event, bump_changed_catalog)
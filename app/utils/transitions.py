@@ -0,0 +1,77 @@
+from enum import Enum
+from typing import Any, Iterable
+
+from sqlalchemy import select, update, Row
+from sqlalchemy.orm import Session
+
+from app.aggregates import count_rows
+
+# most ids changed by one bulk request
+max_bulk_ids = 500
+
+
+class BulkTransition:
+    """
+    Status change of many rows of a model with id and status columns, in one transaction.
+
+    The rows are read and locked by one query, the rows whose status may not change to the target status
+    (allowed maps the target status to the statuses it may be reached from) are reported as failed,
+    and the others are updated by one set-based UPDATE. The caller adds the side effects and commits.
+    """
+
+    def __init__(self, db: Session, model: Any, ids: Iterable[int], status: Enum,
+                 allowed: dict[Enum, Iterable[Enum]]):
+        self.db = db
+        self.model = model
+        self.ids = list(dict.fromkeys(ids))
+        self.status = status
+        self.allowed = allowed
+        # id -> reason of the rows which are not changed
+        self.failures: dict[int, str] = {}
+        self.rows: list[Row] = []
+
+    def plan(self, *columns) -> list[Row]:
+        """
+        Locks the rows and returns the ones allowed to change, with their id, status and the extra columns.
+        """
+        model = self.model
+        found = {row.id: row for row in self.db.execute(select(model.id, model.status, *columns)
+                                                        .where(model.id.in_(self.ids))
+                                                        .with_for_update())}
+        sources = self.allowed.get(self.status, ())
+        for row_id in self.ids:
+            row = found.get(row_id)
+            if row is None:
+                self.failures[row_id] = "Not found"
+            elif row.status not in sources:
+                self.failures[row_id] = f"Cannot change the status from {row.status.value} to {self.status.value}"
+            else:
+                self.rows.append(row)
+        return self.rows
+
+    def fail(self, row_id: int, reason: str):
+        self.failures[row_id] = reason
+        self.rows = [row for row in self.rows if row.id != row_id]
+
+    @property
+    def updated_ids(self) -> list[int]:
+        return [row.id for row in self.rows]
+
+    def apply(self):
+        if self.rows:
+            self.db.execute(update(self.model)
+                            .where(self.model.id.in_(self.updated_ids))
+                            .values(status=self.status)
+                            .execution_options(synchronize_session=False))
+            # the status counters, the ORM events do not see set-based updates
+            count_rows(self.db, self.model, self.rows, -1)
+            count_rows(self.db, self.model, [{"status": self.status}] * len(self.rows), 1)
+
+    def results(self) -> dict:
+        return {
+            "status": self.status.value,
+            "updated": len(self.rows),
+            "results": [{"id": row_id, "updated": False, "detail": self.failures[row_id]}
+                        if row_id in self.failures else {"id": row_id, "updated": True}
+                        for row_id in self.ids],
+        }
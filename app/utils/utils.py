@@ -5,12 +5,18 @@ from uuid import UUID, uuid4
 from fastapi import Depends, HTTPException
 from fastapi.params import Cookie
 from pydantic import BaseModel
-from starlette.status import HTTP_403_FORBIDDEN, HTTP_303_SEE_OTHER, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+from sqlalchemy.orm import joinedload
+from starlette.status import HTTP_403_FORBIDDEN, HTTP_303_SEE_OTHER, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, \
+    HTTP_412_PRECONDITION_FAILED, HTTP_428_PRECONDITION_REQUIRED
 from starlette.templating import Jinja2Templates
 
+from app.assets import asset_url
 from app.config import settings
 from app.database import UsersOrm, db_dependency, SessionsOrm, AdoptionRequestsOrm
-from app.database.models import ApplicationStatus, AnimalsOrm, WalksOrm, VetRequestOrm
+from app.database.models import AnimalsOrm, WalksOrm, VetRequestOrm, UserRolesMixin
+from app.metrics import Counter, Gauge
+from app.photos import photo_url
+from .cache import TTLCache
 
 # This is default session duration
 session_duration = timedelta(hours=1)
@@ -19,15 +25,28 @@ session_duration = timedelta(hours=1)
 session_id_cookie = "session_id"
 
 
-# This is a class that will be used when there is no session gotten from the database / cookies
-class NoneSession(SessionsOrm):
+# This is the user data kept with the cached session, enough to check the user role without the database
+class SessionUser(UserRolesMixin):
 
-    @property
-    def user(self):
-        return None
+    def __init__(self, user: UsersOrm):
+        self.id = user.id
+        self.name = user.name
+        self.username = user.username
+        self.role = user.role
+        self.disabled = user.disabled
+
+
+# This is the request session, cached in the process memory, so authenticated requests do not query the sessions
+class CachedSession:
+
+    def __init__(self, session: SessionsOrm | None = None):
+        self.id = session.id if session else None
+        self.token = session.token if session else None
+        self.expiration = session.expiration if session else None
+        self.user = SessionUser(session.user) if session else None
 
     def __bool__(self):
-        return False
+        return self.user is not None
 
 
 # Cookies structure to be used in the app
@@ -35,8 +54,32 @@ class Cookies(BaseModel):
     session_id: UUID | None = None
 
 
-# This is the instance of the NoneSession class
-none_session = NoneSession()
+# This is the session that will be used when there is no session gotten from the database / cookies
+none_session = CachedSession()
+
+# This is the cache of the sessions by token
+session_cache = TTLCache(maxsize=settings.SESSION_CACHE_SIZE, ttl=settings.SESSION_CACHE_TTL)
+
+Counter("session_cache_hits_total", "Sessions found in the session cache", function=lambda: session_cache.hits)
+Counter("session_cache_misses_total", "Sessions loaded from the database", function=lambda: session_cache.misses)
+Gauge("session_cache_hit_ratio", "Ratio of the sessions found in the session cache",
+      function=lambda: session_cache.hit_ratio)
+Gauge("session_cache_size", "Sessions in the session cache", function=lambda: len(session_cache))
+
+
+# This function removes the cached session with the token, it has to be called when the session is deleted
+def invalidate_session(token: UUID):
+    session_cache.pop(token)
+
+
+# This function removes the cached sessions of the user, it has to be called when the user or its sessions change
+def invalidate_user_sessions(user_id: int, keep_token: UUID | None = None):
+    session_cache.pop_where(lambda token, session: session.user.id == user_id and token != keep_token)
+
+
+# This function removes all cached sessions
+def invalidate_all_sessions():
+    session_cache.clear()
 
 
 # This function creates a new session for a user
@@ -50,27 +93,33 @@ def create_session(username: str, db: db_dependency) -> (UUID, datetime):
     return user.add_session(db, session_id, expiration_date), expiration_date
 
 
-def get_session(cookies: typingAnnotated[Cookies, Cookie()], db: db_dependency) -> SessionsOrm:
+def get_session(cookies: typingAnnotated[Cookies, Cookie()], db: db_dependency) -> CachedSession:
     if not cookies.session_id:
         return none_session
 
-    session: SessionsOrm | None = db.query(SessionsOrm).filter(SessionsOrm.token == cookies.session_id).first()
+    session: CachedSession | None = session_cache.get(cookies.session_id)
 
-    # If there is no session, return the instance of the NoneSession class
     if not session:
-        return none_session
-
-    # If the session has expired, delete the session from the database and return the instance of the NoneSession class
+        # Load the session together with its user in one query and cache it
+        session_orm = (db.query(SessionsOrm)
+                       .options(joinedload(SessionsOrm.user))
+                       .filter(SessionsOrm.token == cookies.session_id)
+                       .first())
+        # If there is no session, return the none session
+        if not session_orm:
+            return none_session
+        session = CachedSession(session_orm)
+        session_cache.set(session.token, session)
+
+    # If the session has expired, delete the session from the database and return the none session
     if session.expiration < datetime.now():
-        db.delete(session)
-        db.commit()
+        delete_session(db, session)
         return none_session
 
-    # If the user is disabled, delete the session from the database and return the instance of the NoneSession class
+    # If the user is disabled, delete the session from the database and return the none session
     # Also, redirect the user to the signin page
     if session.user.disabled:
-        db.delete(session)
-        db.commit()
+        delete_session(db, session)
         raise HTTPException(
             status_code=HTTP_303_SEE_OTHER,  # 303 See Other is suitable for redirects after a forbidden access
             detail="User is disabled",
@@ -79,8 +128,15 @@ def get_session(cookies: typingAnnotated[Cookies, Cookie()], db: db_dependency)
     return session
 
 
+# This function deletes the session from the database and from the session cache
+def delete_session(db: db_dependency, session: CachedSession):
+    db.query(SessionsOrm).filter(SessionsOrm.id == session.id).delete(synchronize_session=False)
+    db.commit()
+    invalidate_session(session.token)
+
+
 # This is a dependency that will be used to get the request session
-session_dependency = typingAnnotated[SessionsOrm | None, Depends(get_session)]
+session_dependency = typingAnnotated[CachedSession, Depends(get_session)]
 
 # This is an exception that will be raised when a user needs to log in
 need_login_exception = HTTPException(
@@ -97,55 +153,44 @@ forbidden_exception = HTTPException(
 
 
 # This is a dependency that will be used to get the user from the session
-def get_user(session: session_dependency) -> UsersOrm:
+def get_user(session: session_dependency) -> SessionUser:
     if not session:
         raise need_login_exception
     return session.user
 
 
 # This is a dependency that will be used to get the user from the session
-user_dependency = typingAnnotated[UsersOrm, Depends(get_user)]
+user_dependency = typingAnnotated[SessionUser, Depends(get_user)]
 
 
 # This is a dependency that will be used to get the admin user from the session
-def get_admin(user: user_dependency) -> UsersOrm:
+def get_admin(user: user_dependency) -> SessionUser:
     if not user.is_admin:
         raise forbidden_exception
     return user
 
 
 # This is a dependency that will be used to get the staff user from the session
-def get_staff(user: user_dependency) -> UsersOrm:
+def get_staff(user: user_dependency) -> SessionUser:
     if not user.is_staff:
         raise forbidden_exception
     return user
 
 
 # This is a dependency that will be used to get the vet user from the session
-def get_vet(user: user_dependency) -> UsersOrm:
+def get_vet(user: user_dependency) -> SessionUser:
     if not user.is_vet:
         raise forbidden_exception
     return user
 
 
 # This is a dependency that will be used to get the volunteer user from the session
-def get_volunteer(user: user_dependency) -> UsersOrm:
+def get_volunteer(user: user_dependency) -> SessionUser:
     if not user.is_volunteer:
         raise forbidden_exception
     return user
 
 
-# This function converts the application status to an integer
-def application_status_to_int(status: ApplicationStatus) -> int:
-    # pending = 0, accepted = 1, rejected = 2
-    if status == ApplicationStatus.pending:
-        return 0
-    elif status == ApplicationStatus.accepted:
-        return 1
-    elif status == ApplicationStatus.rejected:
-        return 2
-
-
 # Dependency to get an animal by id
 def get_animal(animal_id: int, db: db_dependency) -> AnimalsOrm:
     animal = db.query(AnimalsOrm).filter(AnimalsOrm.id == animal_id).first()
@@ -154,6 +199,25 @@ def get_animal(animal_id: int, db: db_dependency) -> AnimalsOrm:
     return animal
 
 
+# The edits of a row carry the version they were made on in If-Match, the response tells the new one in ETag
+precondition_failed_exception = HTTPException(status_code=HTTP_412_PRECONDITION_FAILED,
+                                              detail="The record was changed by someone else, reload it")
+precondition_required_exception = HTTPException(status_code=HTTP_428_PRECONDITION_REQUIRED,
+                                                detail="If-Match header with the record version is required")
+
+
+def entity_tag(version: int) -> str:
+    return f'"{version}"'
+
+
+def check_version(version: int, if_match: str | None):
+    if if_match is None:
+        raise precondition_required_exception
+    tags = {tag.strip().removeprefix("W/") for tag in if_match.split(",")}
+    if "*" not in tags and entity_tag(version) not in tags:
+        raise precondition_failed_exception
+
+
 def get_walk(walk_id: int, db: db_dependency) -> WalksOrm:
     walk = db.query(WalksOrm).filter(WalksOrm.id == walk_id).first()
     if not walk:
@@ -162,7 +226,10 @@ def get_walk(walk_id: int, db: db_dependency) -> WalksOrm:
 
 
 def get_vet_request(request_id: int, db: db_dependency) -> VetRequestOrm:
-    vet_request = db.query(VetRequestOrm).filter(VetRequestOrm.id == request_id).first()
+    vet_request = (db.query(VetRequestOrm)
+                   .options(joinedload(VetRequestOrm.animal), joinedload(VetRequestOrm.user))
+                   .filter(VetRequestOrm.id == request_id)
+                   .first())
     if not vet_request:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Request not found")
     return vet_request
@@ -172,20 +239,23 @@ def get_vet_request(request_id: int, db: db_dependency) -> VetRequestOrm:
 animal_dependency = typingAnnotated[AnimalsOrm, Depends(get_animal)]
 
 
-def get_adoption_request(session: session_dependency, animal: animal_dependency) -> AdoptionRequestsOrm | None:
+def get_adoption_request(session: session_dependency, animal: animal_dependency,
+                         db: db_dependency) -> AdoptionRequestsOrm | None:
     if not session:
         raise need_login_exception
-    return next(filter(lambda x: x.animal_id == animal.id, session.user.adoption_requests), None)
+    return (db.query(AdoptionRequestsOrm)
+            .filter(AdoptionRequestsOrm.user_id == session.user.id, AdoptionRequestsOrm.animal_id == animal.id)
+            .first())
 
 
 # This is a dependency that will be used to get the admin user from the session
-admin_dependency = typingAnnotated[UsersOrm, Depends(get_admin)]
+admin_dependency = typingAnnotated[SessionUser, Depends(get_admin)]
 # This is a dependency that will be used to get the staff user from the session
-staff_dependency = typingAnnotated[UsersOrm, Depends(get_staff)]
+staff_dependency = typingAnnotated[SessionUser, Depends(get_staff)]
 # This is a dependency that will be used to get the vet user from the session
-vet_dependency = typingAnnotated[UsersOrm, Depends(get_vet)]
+vet_dependency = typingAnnotated[SessionUser, Depends(get_vet)]
 # This is a dependency that will be used to get the volunteer user from the session
-volunteer_dependency = typingAnnotated[UsersOrm, Depends(get_volunteer)]
+volunteer_dependency = typingAnnotated[SessionUser, Depends(get_volunteer)]
 # This is a dependency that will be used to get the walk by id
 walk_dependency = typingAnnotated[WalksOrm, Depends(get_walk)]
 # This is a dependency that will be used to get the vet request by id
@@ -195,3 +265,7 @@ user_animal_adoption_dependency = typingAnnotated[AdoptionRequestsOrm | None, De
 
 # This is the instance of the Jinja2Templates class that will be used to render html templates
 templates = Jinja2Templates(directory=settings.APP_TEMPLATES_PATH)
+# Helper to build animal photo urls in the templates
+templates.env.globals["photo_url"] = photo_url
+# Helper to build the fingerprinted static file urls in the templates
+templates.env.globals["asset_url"] = asset_url
@@ -0,0 +1,6 @@
+__all__ = ['released_statuses', 'walk_hours', 'conflicting_walks', 'book_walks', 'set_walk_status', 'release_slots',
+           'get_occupancy', 'invalidate_occupancy', 'find_walkable_animals']
+
+from .availability import get_occupancy, invalidate_occupancy
+from .search import find_walkable_animals
+from .slots import released_statuses, walk_hours, conflicting_walks, book_walks, set_walk_status, release_slots
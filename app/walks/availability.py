@@ -0,0 +1,120 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import WalkSlotsOrm
+from app.metrics import Gauge
+from app.utils.cache import TTLCache
+
+# pending occupancy changes of a database session, applied to the cache when the session commits
+changes_key = "occupancy_changes"
+
+
+class AnimalOccupancy:
+    """
+    Cached occupancy of one animal, one 24-bit mask per loaded day, the bit h is set when the hour h is taken.
+    """
+
+    def __init__(self):
+        self.days: dict[date, int] = {}
+
+
+occupancy_cache = TTLCache(maxsize=settings.AVAILABILITY_CACHE_SIZE, ttl=settings.AVAILABILITY_CACHE_TTL)
+# guards the cached masks and the generations, which count the committed changes of every animal,
+# the epoch counts the invalidations of the whole cache
+occupancy_lock = threading.Lock()
+generations: dict[int, int] = {}
+epoch = 0
+
+Gauge("availability_cache_hit_ratio", "Hit ratio of the walk availability cache",
+      function=lambda: occupancy_cache.hit_ratio)
+
+
+def day_range(start: date, days: int) -> list[date]:
+    return [start + timedelta(days=day) for day in range(days)]
+
+
+def get_occupancy(db: Session, animal_ids: Iterable[int], start: date, days: int) -> dict[int, list[int]]:
+    """
+    Returns the daily occupancy masks of the animals from start, for the given number of days.
+    Cached animals cost no query, the others are loaded together by one range read of the slots.
+    """
+    dates = day_range(start, days)
+    occupancy = {}
+    missing = []
+    with occupancy_lock:
+        for animal_id in animal_ids:
+            animal = occupancy_cache.get(animal_id)
+            if animal and all(day in animal.days for day in dates):
+                occupancy[animal_id] = [animal.days[day] for day in dates]
+            else:
+                missing.append(animal_id)
+        loaded_generations = {animal_id: (epoch, generations.get(animal_id, 0)) for animal_id in missing}
+    if not missing:
+        return occupancy
+
+    loaded = {animal_id: dict.fromkeys(dates, 0) for animal_id in missing}
+    start_time = datetime.combine(start, datetime.min.time())
+    for animal_id, hour in db.execute(select(WalkSlotsOrm.animal_id, WalkSlotsOrm.hour)
+                                      .where(WalkSlotsOrm.animal_id.in_(missing),
+                                             WalkSlotsOrm.hour >= start_time,
+                                             WalkSlotsOrm.hour < start_time + timedelta(days=days))):
+        loaded[animal_id][hour.date()] |= 1 << hour.hour
+
+    with occupancy_lock:
+        for animal_id, masks in loaded.items():
+            occupancy[animal_id] = list(masks.values())
+            # a change committed while the masks were read may be missing in them, they are not cached then
+            if (epoch, generations.get(animal_id, 0)) != loaded_generations[animal_id]:
+                continue
+            animal = occupancy_cache.get(animal_id) or AnimalOccupancy()
+            animal.days.update(masks)
+            occupancy_cache.set(animal_id, animal)
+    return occupancy
+
+
+def record_occupancy_change(db: Session, animal_id: int, hours: Iterable[datetime], taken: bool):
+    """
+    Remembers that the hours of the animal were taken or released in the session.
+    The cached masks are updated only when the session commits.
+    """
+    db.info.setdefault(changes_key, []).append((animal_id, list(hours), taken))
+
+
+@event.listens_for(Session, "after_commit")
+def apply_occupancy_changes(session: Session):
+    changes = session.info.pop(changes_key, None)
+    if not changes:
+        return
+    with occupancy_lock:
+        for animal_id, hours, taken in changes:
+            generations[animal_id] = generations.get(animal_id, 0) + 1
+            animal = occupancy_cache.get(animal_id)
+            if not animal:
+                continue
+            for hour in hours:
+                day = hour.date()
+                # days which are not cached are loaded with the change already in place
+                if day not in animal.days:
+                    continue
+                if taken:
+                    animal.days[day] |= 1 << hour.hour
+                else:
+                    animal.days[day] &= ~(1 << hour.hour)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_occupancy_changes(session: Session):
+    session.info.pop(changes_key, None)
+
+
+def invalidate_occupancy():
+    # used when walks are removed without going through app.walks, e.g. with their user
+    global epoch
+    with occupancy_lock:
+        epoch += 1
+        occupancy_cache.clear()
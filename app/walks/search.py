@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from sqlalchemy import select, false, exists, Row
+from sqlalchemy.orm import Session
+
+from app.database import AnimalsOrm, AnimalStatus, WalkSlotsOrm
+
+
+def find_walkable_animals(db: Session, start: datetime, end: datetime, species: str | None = None) -> list[Row]:
+    """
+    Returns the available, not hidden animals with no walk between start and end, in one query.
+    Every animal is checked by a range probe of the walk slots primary key (animal_id, hour),
+    so the cost depends on the number of animals, not on their walk history.
+    Only the columns of the search results are loaded, as rows instead of ORM objects.
+    """
+    start = start.replace(minute=0, second=0, microsecond=0)
+    taken = exists().where(WalkSlotsOrm.animal_id == AnimalsOrm.id,
+                           WalkSlotsOrm.hour >= start,
+                           WalkSlotsOrm.hour < end)
+    query = (select(AnimalsOrm.id, AnimalsOrm.name, AnimalsOrm.species, AnimalsOrm.age, AnimalsOrm.photo_hash)
+             .where(AnimalsOrm.status == AnimalStatus.available, AnimalsOrm.hidden == false(), ~taken)
+             .order_by(AnimalsOrm.name, AnimalsOrm.id))
+    if species:
+        query = query.where(AnimalsOrm.species == species)
+    return list(db.execute(query))
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.status import HTTP_409_CONFLICT
+
+from app.database import WalksOrm, WalkSlotsOrm, WalkStatus
+from .availability import record_occupancy_change
+
+# walks in these statuses do not take their hours anymore
+released_statuses = (WalkStatus.rejected, WalkStatus.cancelled)
+slot_length = timedelta(hours=1)
+
+
+def walk_hours(date: datetime, duration: int) -> list[datetime]:
+    """
+    Returns the starts of the hours a walk of duration minutes takes.
+    """
+    hour = date.replace(minute=0, second=0, microsecond=0)
+    end = date + timedelta(minutes=duration)
+    hours = []
+    while hour < end:
+        hours.append(hour)
+        hour += slot_length
+    return hours
+
+
+def conflicting_walks(db: Session, animal_id: int, start: datetime, end: datetime) -> list[WalksOrm]:
+    """
+    Returns the walks taking any hour of the animal between start and end.
+    Only the slots in the window are read, with the (animal_id, hour) primary key.
+    """
+    start = start.replace(minute=0, second=0, microsecond=0)
+    return list(db.scalars(select(WalksOrm)
+                           .join(WalkSlotsOrm, WalkSlotsOrm.walk_id == WalksOrm.id)
+                           .where(WalkSlotsOrm.animal_id == animal_id,
+                                  WalkSlotsOrm.hour >= start,
+                                  WalkSlotsOrm.hour < end)
+                           .distinct()
+                           .order_by(WalksOrm.date)))
+
+
+def overlap_exception(conflicts: list[WalksOrm]) -> HTTPException:
+    if not conflicts:
+        # the walk holding the hours was removed since, the booking can be tried again
+        return HTTPException(status_code=HTTP_409_CONFLICT, detail="Requested time slots are already taken")
+    overlapping_details = [
+        f"Walk on {walk.date.strftime('%Y-%m-%d %H:%M')} for {walk.duration} minutes (status: {walk.status})"
+        for walk in conflicts
+    ]
+    return HTTPException(
+        status_code=HTTP_409_CONFLICT,
+        detail=f"Requested time slots overlap with existing walks: {', '.join(overlapping_details)}"
+    )
+
+
+def take_slots(db: Session, walks: list[WalksOrm]):
+    """
+    Inserts the hour slots of the walks and flushes them.
+    The slots primary key makes a concurrent booking of the same hour fail here, whichever request checked first.
+    The slots are inserted in a savepoint, a conflict rolls back only them and not the other changes of the caller,
+    and is reported as 409 with the overlapping walks.
+    """
+    windows = [(walk.animal_id, walk.date, walk.date + timedelta(minutes=walk.duration)) for walk in walks]
+    db.flush()
+    try:
+        with db.begin_nested():
+            db.add_all(WalkSlotsOrm(animal_id=walk.animal_id, hour=hour, walk_id=walk.id)
+                       for walk in walks for hour in walk_hours(walk.date, walk.duration))
+    except IntegrityError:
+        conflicts = {conflict.id: conflict for animal_id, start, end in windows
+                     for conflict in conflicting_walks(db, animal_id, start, end)}
+        raise overlap_exception(list(conflicts.values()))
+    for walk in walks:
+        record_occupancy_change(db, walk.animal_id, walk_hours(walk.date, walk.duration), True)
+
+
+def release_slots(db: Session, walk_ids: list[int]):
+    """
+    Frees the hours held by the walks, with set-based statements.
+    """
+    # only the hours the walks really hold are released
+    released: dict[int, list[datetime]] = {}
+    for animal_id, hour in db.execute(select(WalkSlotsOrm.animal_id, WalkSlotsOrm.hour)
+                                      .where(WalkSlotsOrm.walk_id.in_(walk_ids))):
+        released.setdefault(animal_id, []).append(hour)
+    if not released:
+        return
+    db.execute(delete(WalkSlotsOrm).where(WalkSlotsOrm.walk_id.in_(walk_ids)))
+    for animal_id, hours in released.items():
+        record_occupancy_change(db, animal_id, hours, False)
+
+
+def book_walks(db: Session, animal_id: int, user_id: int, sessions: list[tuple[datetime, datetime]],
+               location: str) -> list[WalksOrm]:
+    """
+    Adds a walk for every (start, end) session and takes its hours, the caller commits.
+    """
+    walks = [WalksOrm(animal_id=animal_id,
+                      user_id=user_id,
+                      date=start,
+                      duration=int((end - start).total_seconds() / 60),
+                      location=location)
+             for start, end in sessions]
+    db.add_all(walks)
+    take_slots(db, walks)
+    return walks
+
+
+def set_walk_status(db: Session, walk: WalksOrm, status: WalkStatus):
+    """
+    Changes the walk status, releasing its hours when it is rejected or cancelled and taking them back
+    when it is reopened. The caller commits.
+    """
+    released = walk.status in released_statuses
+    if released and status not in released_statuses:
+        # the hours are taken first, a conflict leaves the walk in its status
+        take_slots(db, [walk])
+    walk.status = status
+    if status in released_statuses and not released:
+        release_slots(db, [walk.id])
@@ -0,0 +1,75 @@
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def login(url: str, username: str, password: str) -> str:
+    """
+    Signs in and returns the session cookie header value.
+    """
+    request = urllib.request.Request(f"{url}/user/signin",
+                                     data=json.dumps({"username": username, "password": password}).encode(),
+                                     headers={"Content-Type": "application/json"},
+                                     method="POST")
+    with urllib.request.urlopen(request) as response:
+        return f"session_id={json.load(response)['session_id']}"
+
+
+def multipart(field: str, filename: str, content: bytes, content_type: str) -> tuple[bytes, str]:
+    """
+    Encodes a single file as multipart/form-data, returns the body and the content type header.
+    """
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n").encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def timed_request(request: urllib.request.Request) -> tuple[float, int]:
+    """
+    Sends the request, returns the latency in seconds and the status code.
+    """
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    return time.perf_counter() - start, status
+
+
+def run_load(make_request: callable, concurrency: int, duration: float) -> list[tuple[float, int]]:
+    """
+    Sends requests from concurrency threads for duration seconds, returns all latencies and statuses.
+    """
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        results = []
+        while time.perf_counter() < deadline:
+            results.append(timed_request(make_request()))
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker) for _ in range(concurrency)]
+        return [result for future in futures for result in future.result()]
+
+
+def percentile(latencies: list[float], percent: float) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[int(percent) - 1]
+
+
+def report(name: str, results: list[tuple[float, int]], duration: float):
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status >= 400)
+    print(f"{name:<32} requests={len(results):<6} rps={len(results) / duration:<8.1f} "
+          f"p50={percentile(latencies, 50) * 1000:<8.1f}ms p99={percentile(latencies, 99) * 1000:<8.1f}ms "
+          f"errors={errors}")
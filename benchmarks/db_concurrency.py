@@ -0,0 +1,28 @@
+"""
+Measures how the throughput of database-bound pages scales with the number of concurrent clients.
+
+The server must be running. Compare the async pages (/animals, /animals/{id}/profile use the AsyncSession)
+with the thread-offloaded ones (the routers use the blocking Session from `def` handlers):
+    python benchmarks/db_concurrency.py --path /animals --path /staff/walk_requests --username staff --password staff
+"""
+import argparse
+import urllib.request
+
+from common import login, run_load, report
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--url", default="http://localhost:8000")
+parser.add_argument("--path", action="append", required=True, help="page to load, can be repeated")
+parser.add_argument("--username", help="sign in before loading the pages")
+parser.add_argument("--password")
+parser.add_argument("--levels", default="1,2,4,8,16,32", help="comma separated numbers of concurrent clients")
+parser.add_argument("--duration", type=float, default=10, help="seconds of each measurement")
+args = parser.parse_args()
+
+headers = {"Cookie": login(args.url, args.username, args.password)} if args.username else {}
+
+for path in args.path:
+    for concurrency in map(int, args.levels.split(",")):
+        results = run_load(lambda: urllib.request.Request(f"{args.url}{path}", headers=headers),
+                           concurrency, args.duration)
+        report(f"{path} x{concurrency}", results, args.duration)
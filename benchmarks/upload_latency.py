@@ -0,0 +1,47 @@
+"""
+Measures the catalog latency with and without concurrent photo uploads.
+
+The server must be running, the photo of the given animal is replaced repeatedly:
+    python benchmarks/upload_latency.py --photo big.jpg --animal-id 1
+"""
+import argparse
+import threading
+import urllib.request
+from pathlib import Path
+
+from common import login, multipart, run_load, report
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--url", default="http://localhost:8000")
+parser.add_argument("--username", default="staff")
+parser.add_argument("--password", default="staff")
+parser.add_argument("--photo", type=Path, required=True, help="JPEG to upload")
+parser.add_argument("--animal-id", type=int, required=True, help="animal whose photo is replaced")
+parser.add_argument("--readers", type=int, default=8, help="concurrent catalog readers")
+parser.add_argument("--uploaders", type=int, default=4, help="concurrent photo uploaders")
+parser.add_argument("--duration", type=float, default=15, help="seconds of each phase")
+args = parser.parse_args()
+
+cookie = login(args.url, args.username, args.password)
+photo = args.photo.read_bytes()
+
+
+def catalog_request():
+    return urllib.request.Request(f"{args.url}/animals")
+
+
+def upload_request():
+    body, content_type = multipart("photo", args.photo.name, photo, "image/jpeg")
+    return urllib.request.Request(f"{args.url}/staff/animals/{args.animal_id}/photo", data=body, method="PATCH",
+                                  headers={"Content-Type": content_type, "Cookie": cookie})
+
+
+report("catalog", run_load(catalog_request, args.readers, args.duration), args.duration)
+
+uploads = []
+uploaders = threading.Thread(target=lambda: uploads.extend(run_load(upload_request, args.uploaders, args.duration)))
+uploaders.start()
+report("catalog during uploads", run_load(catalog_request, args.readers, args.duration), args.duration)
+uploaders.join()
+# 503 responses are uploads rejected by the photo pool admission control
+report("uploads", uploads, args.duration)
@@ -0,0 +1,137 @@
+import argparse
+import re
+from pathlib import Path
+
+from app.aggregates import reconcile_aggregates
+from app.assets import asset_manifest
+from app.config import settings
+from app.database import get_db, sweep_expired_sessions
+from app.imports import ImportJob, manifest_formats
+from app.password import calibrate_rounds
+from app.photos import migrate_photos, collect_garbage
+
+
+def migrate_photos_command(args):
+    db = next(get_db())
+    try:
+        moved = migrate_photos(db, args.batch_size)
+    finally:
+        db.close()
+    print(f"Moved {moved} photos to the photo storage")
+
+
+def collect_photos_command(args):
+    db = next(get_db())
+    try:
+        deleted = collect_garbage(db, args.min_age)
+    finally:
+        db.close()
+    print(f"Deleted {deleted} unreferenced photos")
+
+
+def sweep_sessions_command(args):
+    db = next(get_db())
+    try:
+        removed, duration = sweep_expired_sessions(db, args.batch_size)
+    finally:
+        db.close()
+    print(f"Removed {removed} expired sessions in {duration:.3f}s")
+
+
+def reconcile_aggregates_command(args):
+    db = next(get_db())
+    try:
+        corrections = reconcile_aggregates(db)
+    finally:
+        db.close()
+    for name, delta in sorted(corrections.items()):
+        print(f"{name}: {delta:+d}")
+    print(f"Corrected {len(corrections)} counters")
+
+
+def build_assets_command(args):
+    asset_manifest.build()
+    print(f"Built {len(asset_manifest.names)} static assets to {asset_manifest.build_path}")
+
+
+def import_animals_command(args):
+    manifest_format = manifest_formats.get(args.manifest.suffix.lower())
+    if manifest_format is None:
+        parser.error(f"the manifest must be one of {', '.join(manifest_formats)}")
+    job = ImportJob(args.manifest, manifest_format, args.photos, args.chunk_size)
+    db = next(get_db())
+    try:
+        job.run(db, report=lambda done: print(f"{done.rows} rows read, {done.imported} imported, "
+                                              f"{done.failed} failed"))
+    finally:
+        db.close()
+    for error in job.errors:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"Import {job.state} in {job.progress()['seconds']}s")
+
+
+def calibrate_passwords_command(args):
+    rounds, duration = calibrate_rounds(args.target_ms / 1000, args.min_rounds)
+    print(f"Password check with {rounds} rounds takes {duration * 1000:.1f}ms (target {args.target_ms:.0f}ms)")
+    if not args.write:
+        print(f"Set PASSWORD_HASH_ROUNDS={rounds} in the .env file to use it")
+        return
+    env_file = Path(".env")
+    env = env_file.read_text() if env_file.exists() else ""
+    setting = f"PASSWORD_HASH_ROUNDS={rounds}"
+    if re.search(r"^PASSWORD_HASH_ROUNDS=.*$", env, flags=re.MULTILINE):
+        env = re.sub(r"^PASSWORD_HASH_ROUNDS=.*$", setting, env, flags=re.MULTILINE)
+    else:
+        env += ("" if not env or env.endswith("\n") else "\n") + setting + "\n"
+    env_file.write_text(env)
+    # existing hashes are upgraded on the next login of each user
+    print(f"Saved {setting} to {env_file}, restart the server to use it")
+
+
+# Maintenance commands, run as `python manage.py <command>`
+parser = argparse.ArgumentParser(description="Animal shelter maintenance commands")
+commands = parser.add_subparsers(dest="command", required=True)
+
+migrate_photos_parser = commands.add_parser("migrate-photos",
+                                            help="move photos stored in the database to the photo storage")
+migrate_photos_parser.add_argument("--batch-size", type=int, default=50)
+migrate_photos_parser.set_defaults(handler=migrate_photos_command)
+
+collect_photos_parser = commands.add_parser("collect-photos",
+                                            help="delete stored photos not referenced by any animal")
+collect_photos_parser.add_argument("--min-age", type=float, default=3600,
+                                   help="keep photos younger than this number of seconds")
+collect_photos_parser.set_defaults(handler=collect_photos_command)
+
+sweep_sessions_parser = commands.add_parser("sweep-sessions", help="delete expired sessions")
+sweep_sessions_parser.add_argument("--batch-size", type=int, default=settings.SESSION_SWEEP_BATCH_SIZE)
+sweep_sessions_parser.set_defaults(handler=sweep_sessions_command)
+
+reconcile_aggregates_parser = commands.add_parser("reconcile-aggregates",
+                                                  help="recompute the dashboard counters from the tables")
+reconcile_aggregates_parser.set_defaults(handler=reconcile_aggregates_command)
+
+build_assets_parser = commands.add_parser("build-assets",
+                                          help="fingerprint and precompress the static files")
+build_assets_parser.set_defaults(handler=build_assets_command)
+
+import_animals_parser = commands.add_parser("import-animals",
+                                            help="add animals from a CSV or JSONL manifest and a ZIP of photos")
+import_animals_parser.add_argument("manifest", type=Path)
+import_animals_parser.add_argument("--photos", type=Path, help="ZIP archive with the photos named in the manifest")
+import_animals_parser.add_argument("--chunk-size", type=int, default=settings.IMPORT_CHUNK_SIZE)
+import_animals_parser.set_defaults(handler=import_animals_command)
+
+calibrate_passwords_parser = commands.add_parser("calibrate-passwords",
+                                                 help="pick the password hash rounds for this host")
+calibrate_passwords_parser.add_argument("--target-ms", type=float, default=250,
+                                        help="longest acceptable password check in milliseconds")
+calibrate_passwords_parser.add_argument("--min-rounds", type=int, default=10,
+                                        help="never pick fewer rounds than this")
+calibrate_passwords_parser.add_argument("--write", action="store_true",
+                                        help="save the rounds to the .env file")
+calibrate_passwords_parser.set_defaults(handler=calibrate_passwords_command)
+
+if __name__ == "__main__":
+    arguments = parser.parse_args()
+    arguments.handler(arguments)
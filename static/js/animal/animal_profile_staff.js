@@ -20,12 +20,17 @@ createRequestBtn.addEventListener('click', () => {
 
 hideBtn.addEventListener('click', () => {
     const isCurrentlyHidden = hideBtn.textContent.trim().toLowerCase() === 'show';
-    fetch(`/staff/animals/${animalId}/hide?hidden=${!isCurrentlyHidden}`, {
+    fetch(`/staff/animals/${animalId}`, {
         method: 'PATCH',
+        headers: {'Content-Type': 'application/json', 'If-Match': `"${animalVersion}"`},
+        body: JSON.stringify({hidden: !isCurrentlyHidden}),
     })
         .then(response => {
             if (response.ok) {
                 window.location.reload();
+            } else if (response.status === 412) {
+                alert('The animal was changed by someone else, the page will be reloaded');
+                window.location.reload();
             } else {
                 alert('Failed to hide the animal');
             }
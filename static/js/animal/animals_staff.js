@@ -1,4 +1,4 @@
-const form = document.querySelector('form');
+const form = document.getElementById('add_animal');
 
 form?.addEventListener('submit', async function (event) {
     event.preventDefault();
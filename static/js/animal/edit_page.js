@@ -1,15 +1,46 @@
-document.getElementById('edit-name').addEventListener('click', function() {
-    var name = prompt('Enter new name');
-    // put with new_name as query parameter
-    if (name) {
-        fetch(`/staff/animals/${animalId}/name?new_name=` + name, {
-            method: 'PUT'
-        })
-        .then(response => response.json())
-        .then(data => {
-            document.getElementById('name').textContent = data.name;
-        });
+const animalForm = document.getElementById('animal_form');
+// values the page was rendered with, only the changed ones are sent
+const initialValues = Object.fromEntries(new FormData(animalForm));
+
+function changedFields() {
+    let changes = {};
+    for (const [name, value] of new FormData(animalForm)) {
+        if (value !== initialValues[name]) {
+            changes[name] = name === 'age' ? parseInt(value, 10) : value;
+        }
     }
+    return changes;
+}
+
+animalForm.addEventListener('submit', function(event) {
+    event.preventDefault();
+    const changes = changedFields();
+    if (Object.keys(changes).length === 0) {
+        return;
+    }
+    fetch('/staff/animals/' + animalId, {
+        method: 'PATCH',
+        headers: {'Content-Type': 'application/json', 'If-Match': `"${animalVersion}"`},
+        body: JSON.stringify(changes)
+    })
+    .then(response => {
+        if (response.status === 412) {
+            alert('The animal was changed by someone else, the page will be reloaded');
+            window.location.reload();
+            return;
+        }
+        if (!response.ok) {
+            alert('Failed to update the animal');
+            return;
+        }
+        return response.json().then(data => {
+            animalVersion = data.version;
+            for (const name of Object.keys(initialValues)) {
+                initialValues[name] = String(data[name]);
+                animalForm.elements[name].value = data[name];
+            }
+        });
+    });
 });
 
 document.getElementById('photo_upload_form').addEventListener('submit', function(event) {
@@ -22,18 +53,36 @@ document.getElementById('photo_upload_form').addEventListener('submit', function
         formData.append('photo', photo);
         response = fetch('/staff/animals/'+ animalId +'/photo', {
             method: 'PATCH',
+            headers: {'If-Match': `"${animalVersion}"`},
             body: formData
         });
     } else {
         response = fetch('/staff/animals/'+ animalId +'/photo', {
-            method: 'DELETE'
+            method: 'DELETE',
+            headers: {'If-Match': `"${animalVersion}"`}
         });
     }
 
     if (response) {
         response
-        .then(response => response.json())
+        .then(response => {
+            if (response.status === 412) {
+                alert('The animal was changed by someone else, the page will be reloaded');
+                window.location.reload();
+                return null;
+            }
+            if (!response.ok) {
+                alert('Failed to update the photo');
+                return null;
+            }
+            return response.json();
+        })
         .then(data => {
+            if (!data) {
+                return;
+            }
+            // the photo changes the version too
+            animalVersion = data.version;
             // fetch new photo
             fetch('/animals/'+ animalId +'/photo', {
                 method: 'GET'
@@ -58,54 +107,3 @@ document.getElementById('photo').addEventListener('change', function() {
         document.getElementById('photo_submit').textContent = 'Delete Photo';
     }
 });
-
-document.getElementById('edit-age').addEventListener('click', function() {
-    var age = prompt('Enter new age');
-    if (age) {
-        fetch('/staff/animals/'+ animalId +'/age?new_age=' + age, {
-            method: 'PATCH'
-        })
-        .then(response => response.json())
-        .then(data => {
-            document.getElementById('age').textContent = data.age;
-        });
-    }
-});
-
-document.getElementById('edit-description').addEventListener('click', function() {
-    var description = document.getElementById('description').textContent;
-    console.log(description);
-    // encode description with newlines
-    var query_encoded = encodeURIComponent(description).replace(/%0A/g, '%0D%0A');
-    if (description) {
-        fetch('/staff/animals/'+ animalId +'/description?new_description=' + query_encoded, {
-            method: 'PATCH'
-        })
-        .then(response => response.json())
-        .then(data => {
-            document.getElementById('description').textContent = data.description;
-        });
-    }
-});
-
-document.getElementById('edit-species').addEventListener('click', function() {
-    var species = prompt('Enter new species');
-    if (species) {
-        fetch('/staff/animals/'+ animalId +'/species?new_species=' + species, {
-            method: 'PATCH'
-        })
-        .then(response => response.json())
-        .then(data => {
-            document.getElementById('species').textContent = data.species;
-        });
-    }
-});
-
-const editableDiv = document.getElementById('description');
-
-    editableDiv.addEventListener('keydown', function(event) {
-        if (event.key === 'Enter') {
-            event.preventDefault(); // Prevent the default behavior (new block)
-            document.execCommand('insertLineBreak'); // Insert a line break
-        }
-    });
\ No newline at end of file
@@ -0,0 +1,25 @@
+// static/js/stuff/bulk_status.js
+
+// Changes the status of all the rows listed in data-ids of a bulk button with one request
+document.querySelectorAll('.bulk-button').forEach(button => {
+    button.addEventListener('click', async () => {
+        const response = await fetch(button.dataset.url, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                ids: JSON.parse(button.dataset.ids),
+                status: button.dataset.status,
+            }),
+        });
+        if (!response.ok) {
+            alert('Failed to update the statuses.');
+            return;
+        }
+        const data = await response.json();
+        const failed = data.results.filter(result => !result.updated);
+        if (failed.length) {
+            alert(failed.map(result => `#${result.id}: ${result.detail}`).join('\n'));
+        }
+        window.location.reload();
+    });
+});
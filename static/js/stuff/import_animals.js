@@ -0,0 +1,50 @@
+// static/js/stuff/import_animals.js
+
+const form = document.getElementById('import_form');
+const progress = document.getElementById('import_progress');
+const errors = document.getElementById('import_errors');
+
+// Shows the progress of the import until it ends
+function showProgress(job) {
+    progress.textContent = `${job.state}: ${job.rows} rows read, ${job.imported} imported, ${job.failed} failed`;
+    errors.replaceChildren(...job.errors.map(error => {
+        const item = document.createElement('li');
+        item.textContent = `line ${error.line}: ${error.error}`;
+        return item;
+    }));
+}
+
+async function pollProgress(jobId) {
+    const response = await fetch(`/staff/animals/import/${jobId}`);
+    if (!response.ok) {
+        progress.textContent = 'Failed to read the import progress.';
+        return;
+    }
+    const job = await response.json();
+    showProgress(job);
+    if (job.state === 'queued' || job.state === 'running') {
+        setTimeout(() => pollProgress(jobId), 1000);
+    }
+}
+
+form.addEventListener('submit', async function (event) {
+    event.preventDefault();
+
+    const formData = new FormData(form);
+    // if no archive is selected, remove the photos field
+    if (formData.get('photos').size === 0) {
+        formData.delete('photos');
+    }
+
+    const response = await fetch('/staff/animals/import', {
+        method: 'POST',
+        body: formData
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        alert(data.detail);
+        return;
+    }
+    showProgress(data);
+    pollProgress(data.id);
+});
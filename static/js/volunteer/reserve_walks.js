@@ -73,20 +73,22 @@ const updateWeekDates = (startDate) => {
 };
 
 
-/** Function to fetch and render scheduled walks for a given week */
+/** Function to fetch and render the taken hours of a given week */
 const fetchScheduledWalks = (startDate) => {
-    const endDate = new Date(startDate.getTime() + 7 * 86400000);
+    const startDay = formatDate(startDate);
 
-    fetch(`/volunteer/animals/${animalId}/scheduled-walks?start_date=${formatDateTime(startDate)}&end_date=${formatDateTime(endDate)}`)
+    fetch(`/volunteer/availability?animal_ids=${animalId}&start=${startDay}&days=7`)
         .then(response => response.json())
         .then(data => {
-            const occupiedSlots = new Set(data.scheduled_slots.map(s => `${s.hour}|${s.date}`));
+            // one mask per day, the bit h is set when the hour h is taken
+            const masks = data.occupancy[animalId] || [];
 
             // Update calendar with booked slots
             document.querySelectorAll(".time-slot").forEach(slot => {
-                const slotKey = `${slot.dataset.hour}|${slot.dataset.date}`;
+                const day = Math.round((new Date(slot.dataset.date) - new Date(startDay)) / 86400000);
+                const hour = parseInt(slot.dataset.hour, 10);
                 slot.classList.remove("occupied", "selected");
-                if (occupiedSlots.has(slotKey)) {
+                if ((masks[day] >> hour) & 1) {
                     slot.classList.add("occupied");
                 }
             });
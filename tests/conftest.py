@@ -0,0 +1,227 @@
+"""
+The tests run the application on a SQLite database in a temporary directory, through the SQLite compatibility
+shim of tests/sqlite_compat.py. The tests marked mysql are skipped then.
+
+With TEST_MYSQL_DATABASE set, they run on that MySQL database instead, on the server of the .env settings,
+without the shim and with the mysql tests. The database is emptied by the tests.
+"""
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+test_dir = Path(tempfile.mkdtemp(prefix="iis-tests-"))
+mysql_database = os.environ.get("TEST_MYSQL_DATABASE")
+
+# the settings are read when the application is imported, the environment takes precedence over the .env files
+os.environ.update({
+    "STATEMENT_BUDGET_STRICT": "True",
+    "PAGE_SIZE": "2",
+    "QUEUE_PAGE_SIZE": "2",
+    "PASSWORD_HASH_ROUNDS": "4",
+    "SESSION_SWEEP_INTERVAL": "0",
+    "AGGREGATES_RECONCILE_INTERVAL": "0",
+    "PHOTO_STORAGE_PATH": str(test_dir / "photos"),
+    "ASSETS_BUILD_PATH": str(test_dir / "assets"),
+})
+if mysql_database:
+    os.environ["DB_NAME"] = mysql_database
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+import app.database.database as database
+import app.database.schema as schema
+from app import app
+from app.aggregates import aggregates_cache
+from app.database import Base, UsersOrm, Role, AnimalsOrm, AnimalStatus, WalksOrm, WalkSlotsOrm, WalkStatus, \
+    AdoptionRequestsOrm, AdoptionStatus, VetRequestOrm, VetRequestStatus, MedicalHistoriesOrm, TreatmentsOrm, \
+    VaccinationsOrm
+from app.database.budget import count_statement, measure_statement
+from app.database.models import VolunteerApplicationsOrm, ApplicationStatus
+from app.password import hash_password
+from app.utils import page_cache, invalidate_all_sessions
+from app.walks import invalidate_occupancy
+from tests.sqlite_compat import install_sqlite_compat
+
+# the day of the seeded walks
+walk_day = datetime(2026, 10, 5)
+
+
+def pytest_collection_modifyitems(items: list[pytest.Item]):
+    if mysql_database:
+        return
+    skip_mysql = pytest.mark.skip(reason="runs a MySQL only statement, set TEST_MYSQL_DATABASE to run it")
+    for item in items:
+        if "mysql" in item.keywords:
+            item.add_marker(skip_mysql)
+
+
+class StatementLog(list):
+    """
+    SQL statements run since the log was cleared, whichever engine ran them.
+    """
+
+    def record(self, _, __, statement: str, *___):
+        self.append(statement)
+
+
+@pytest.fixture(scope="session")
+def statements() -> StatementLog:
+    return StatementLog()
+
+
+@pytest.fixture(scope="session")
+def engines(statements: StatementLog):
+    if mysql_database:
+        yield from mysql_engines(statements)
+    else:
+        yield from sqlite_engines(statements)
+    shutil.rmtree(test_dir, ignore_errors=True)
+
+
+def mysql_engines(statements: StatementLog):
+    # the application engines, with the budget listeners registered on import
+    engine, async_engine = database.engine, database.async_engine
+    with engine.begin() as connection:
+        Base.metadata.drop_all(connection)
+        connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    for counted_engine in (engine, async_engine.sync_engine):
+        event.listen(counted_engine, "before_cursor_execute", statements.record)
+    yield engine, async_engine
+
+
+def sqlite_engines(statements: StatementLog):
+    engine = create_engine(f"sqlite:///{test_dir / 'test.db'}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{test_dir / 'test.db'}", poolclass=NullPool)
+    # the budget listeners are registered on the MySQL engines when the application is imported
+    for counted_engine in (engine, async_engine.sync_engine):
+        event.listen(counted_engine, "before_cursor_execute", count_statement)
+        event.listen(counted_engine, "after_cursor_execute", measure_statement)
+        event.listen(counted_engine, "before_cursor_execute", statements.record)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setitem(database.session_factory.kw, "bind", engine)
+        patch.setitem(database.async_session_factory.kw, "bind", async_engine)
+        patch.setattr(schema, "engine", engine)
+        install_sqlite_compat(patch)
+        yield engine, async_engine
+    engine.dispose()
+
+
+def add_user(db: Session, username: str, role: Role) -> UsersOrm:
+    user = UsersOrm(username=username, name=username, password=hash_password(username), role=role)
+    db.add(user)
+    return user
+
+
+def seed_database(db: Session) -> dict[str, int]:
+    """
+    Adds several rows to every relationship the pages render, returns the ids the tested urls use.
+    """
+    users = {user.username: user for user in db.query(UsersOrm)}
+    volunteers = [users["volunteer"]] + [add_user(db, f"volunteer{i}", Role.volunteer) for i in range(2)]
+    registered = [users["registered"]] + [add_user(db, f"registered{i}", Role.registered) for i in range(2)]
+    applicants = [add_user(db, f"applicant{i}", Role.registered) for i in range(5)]
+    db.flush()
+
+    animals = []
+    for i in range(6):
+        animal = AnimalsOrm(name=f"Animal {i}", age=i + 1, species="dog" if i % 2 else "cat",
+                            description=f"A friendly {'dog' if i % 2 else 'cat'}", hidden=i == 5,
+                            status=AnimalStatus.available if i < 4 else AnimalStatus.adopted)
+        animals.append(animal)
+    # one animal still has its photo in the legacy column
+    animals[0].photo = b"\xff\xd8\xff\xe0 not really a jpeg"
+    db.add_all(animals)
+    db.flush()
+
+    walk_statuses = list(WalkStatus)
+    adoption_statuses = list(AdoptionStatus)
+    vet_request_statuses = list(VetRequestStatus)
+    for i, animal in enumerate(animals):
+        history = MedicalHistoriesOrm(animal_id=animal.id, start_date=walk_day - timedelta(days=100),
+                                      description=f"History of {animal.name}")
+        db.add(history)
+        db.flush()
+        for j in range(3):
+            db.add(TreatmentsOrm(medical_history_id=history.id, date=walk_day - timedelta(days=j),
+                                 description=f"Treatment {j}"))
+            db.add(VaccinationsOrm(medical_history_id=history.id, date=walk_day - timedelta(days=j),
+                                   description=f"Vaccination {j}"))
+            db.add(VetRequestOrm(animal_id=animal.id, user_id=users["staff"].id, date=walk_day - timedelta(days=j),
+                                 description=f"Check {j}",
+                                 status=vet_request_statuses[(i + j) % len(vet_request_statuses)]))
+        for j, user in enumerate(registered):
+            db.add(AdoptionRequestsOrm(animal_id=animal.id, user_id=user.id, date=walk_day - timedelta(hours=i * 3 + j),
+                                       message="I would like to adopt it",
+                                       status=adoption_statuses[(i + j) % len(adoption_statuses)]))
+        for j in range(len(walk_statuses)):
+            walk = WalksOrm(animal_id=animal.id, user_id=volunteers[j % len(volunteers)].id,
+                            date=walk_day + timedelta(days=j // 3, hours=8 + i + j % 3 * 2), duration=1,
+                            location="Park", status=walk_statuses[(i + j) % len(walk_statuses)])
+            db.add(walk)
+            db.flush()
+            db.add(WalkSlotsOrm(animal_id=animal.id, hour=walk.date, walk_id=walk.id))
+
+    application_statuses = list(ApplicationStatus)
+    for i, user in enumerate(applicants):
+        db.add(VolunteerApplicationsOrm(user_id=user.id, date=walk_day - timedelta(days=i), message="I can help",
+                                        status=application_statuses[i % len(application_statuses)]))
+    db.commit()
+
+    vet_request = db.query(VetRequestOrm).filter(VetRequestOrm.animal_id == animals[1].id).first()
+    return {"animal_id": animals[1].id, "photo_animal_id": animals[0].id, "adopted_animal_id": animals[4].id,
+            "hidden_animal_id": animals[5].id, "vet_request_id": vet_request.id}
+
+
+@pytest.fixture(scope="session")
+def client(engines) -> TestClient:
+    # the startup creates the schema and the default users on the empty database
+    with TestClient(app, base_url="https://testserver") as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def seeded(client: TestClient) -> dict[str, int]:
+    db = database.session_factory()
+    try:
+        return seed_database(db)
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def login(client: TestClient) -> Callable[[str | None], TestClient]:
+    """
+    Signs the client in as the default user with the given username, which is also the password.
+    """
+
+    def login_as(username: str | None) -> TestClient:
+        client.cookies.clear()
+        if username is not None:
+            response = client.post("/user/signin", json={"username": username, "password": username})
+            assert response.status_code == 200, response.text
+        return client
+
+    return login_as
+
+
+@pytest.fixture
+def cold_caches() -> Callable[[], None]:
+    """
+    Empties the in-process caches, so the requests run every statement a cache miss would.
+    """
+
+    def clear():
+        invalidate_all_sessions()
+        page_cache.clear()
+        aggregates_cache.clear()
+        invalidate_occupancy()
+
+    return clear
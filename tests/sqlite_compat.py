@@ -0,0 +1,36 @@
+"""
+SQLite compatibility shim, lets the tests run the application without a MySQL server.
+
+Only the statements every write goes through are translated. The statements which exist only in MySQL, like the
+full-text search, are not imitated: their tests are marked mysql and run with TEST_MYSQL_DATABASE set.
+"""
+import pytest
+from sqlalchemy.dialects import sqlite
+
+import app.aggregates.counters as counters
+
+
+class SqliteUpsert:
+    """
+    The MySQL INSERT ... ON DUPLICATE KEY UPDATE of the counters, written as INSERT ... ON CONFLICT DO UPDATE.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.statement = None
+
+    def values(self, rows: list[dict]) -> "SqliteUpsert":
+        self.statement = sqlite.insert(self.table).values(rows)
+        return self
+
+    @property
+    def inserted(self):
+        return self.statement.excluded
+
+    def on_duplicate_key_update(self, **values):
+        return self.statement.on_conflict_do_update(index_elements=list(self.table.primary_key.columns),
+                                                    set_=values)
+
+
+def install_sqlite_compat(patch: pytest.MonkeyPatch):
+    patch.setattr(counters, "insert", SqliteUpsert)
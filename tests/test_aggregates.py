@@ -0,0 +1,23 @@
+import pytest
+
+from app.aggregates import reconcile_aggregates, get_aggregates, aggregates_cache
+from app.database import AnimalsOrm
+from app.database.database import session_factory
+
+
+@pytest.mark.mysql
+def test_counters_follow_inserted_rows(seeded):
+    db = session_factory()
+    try:
+        aggregates_cache.clear()
+        before = get_aggregates(db)["animals.available"]
+        # the first insert of a session creates or updates the counter rows, the second one updates them
+        for name in ("Counted", "Counted again"):
+            db.add(AnimalsOrm(name=name, age=1, species="rabbit", description="Counted"))
+            db.commit()
+        aggregates_cache.clear()
+        assert get_aggregates(db)["animals.available"] == before + 2
+        # the stored counters match the counted tables
+        assert reconcile_aggregates(db) == {}
+    finally:
+        db.close()
@@ -0,0 +1,42 @@
+import time
+
+from app.database import AnimalsOrm
+from app.database.database import session_factory
+from app.utils import page_cache
+
+
+def wait_for_refreshes(timeout: float = 5.0):
+    # the stale pages are rendered again by tasks on the event loop of the test client
+    deadline = time.monotonic() + timeout
+    while page_cache.refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not page_cache.refreshing
+
+
+def test_deleted_animal_profile_is_not_served_from_cache(seeded, login):
+    db = session_factory()
+    try:
+        animal = AnimalsOrm(name="Short stay", age=2, species="cat", description="Adopted soon")
+        db.add(animal)
+        db.commit()
+        animal_id = animal.id
+    finally:
+        db.close()
+    url = f"/animals/{animal_id}/profile"
+
+    client = login(None)
+    assert client.get(url).headers["X-Cache"] == "MISS"
+    assert client.get(url).headers["X-Cache"] == "HIT"
+
+    client = login("staff")
+    assert client.delete(f"/staff/animals/{animal_id}").status_code == 200
+
+    client = login(None)
+    # the catalog changed, the cached copy may be served once while the page is rendered again
+    response = client.get(url, follow_redirects=False)
+    assert response.status_code in (200, 307)
+    wait_for_refreshes()
+    response = client.get(url, follow_redirects=False)
+    assert response.status_code == 307
+    assert "X-Cache" not in response.headers or response.headers["X-Cache"] == "MISS"
+    assert page_cache.get(url) is None
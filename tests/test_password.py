@@ -0,0 +1,24 @@
+import bcrypt
+
+from app.password import hash_password, verify_password, needs_rehash
+from app.password.password import rounds
+
+
+def with_rounds(hashed_password: bytes, hash_rounds: int) -> bytes:
+    # only the cost field is read by needs_rehash, "$2b$05$..." has 5 rounds
+    prefix, _, _, rest = hashed_password.split(b"$", 3)
+    return b"$".join([prefix, b"", b"%02d" % hash_rounds, rest])
+
+
+def test_current_hash_is_kept():
+    hashed_password = hash_password("secret")
+    assert verify_password("secret", hashed_password)
+    assert not needs_rehash(hashed_password)
+
+
+def test_weaker_hash_is_upgraded():
+    assert needs_rehash(with_rounds(hash_password("secret"), rounds - 1))
+
+
+def test_stronger_hash_is_not_downgraded():
+    assert not needs_rehash(bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds + 1)))
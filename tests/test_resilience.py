@@ -0,0 +1,26 @@
+import pytest
+from pymysql.err import OperationalError as MySQLOperationalError, ProgrammingError as MySQLProgrammingError
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.database.resilience import is_retryable
+
+
+def database_error(error_class, driver_error, connection_invalidated=False):
+    return error_class("SELECT 1", {}, driver_error, connection_invalidated=connection_invalidated)
+
+
+@pytest.mark.parametrize("code", [1205, 1213, 2006, 2013])
+def test_transient_errors_are_retried(code):
+    assert is_retryable(database_error(OperationalError, MySQLOperationalError(code, "transient")))
+
+
+@pytest.mark.parametrize("code", [1054, 1146, 1364])
+def test_deterministic_errors_are_not_retried(code):
+    # PyMySQL raises OperationalError for the server errors it does not map to another class
+    assert not is_retryable(database_error(OperationalError, MySQLOperationalError(code, "statement error")))
+
+
+def test_invalidated_connection_is_retried():
+    error = database_error(ProgrammingError, MySQLProgrammingError(2014, "commands out of sync"), True)
+    assert is_retryable(error)
+    assert not is_retryable(database_error(ProgrammingError, MySQLProgrammingError(1064, "syntax error")))
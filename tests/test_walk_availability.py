@@ -0,0 +1,48 @@
+import pytest
+
+# the seeded walks start on this day, see conftest.walk_day
+start = "2026-10-05"
+
+
+def test_availability_of_requested_animals(seeded, login):
+    client = login("volunteer")
+    response = client.get("/volunteer/availability",
+                          params={"start": start, "days": 2, "animal_ids": [seeded["animal_id"]]})
+    assert response.status_code == 200, response.text
+    masks = response.json()["occupancy"][str(seeded["animal_id"])]
+    assert len(masks) == 2
+    assert any(masks)
+
+
+@pytest.mark.parametrize("animal, status_code", [("adopted_animal_id", 403), ("hidden_animal_id", 403)])
+def test_availability_of_animals_which_cannot_be_walked(animal, status_code, seeded, login):
+    client = login("volunteer")
+    response = client.get("/volunteer/availability",
+                          params={"start": start, "animal_ids": [seeded["animal_id"], seeded[animal]]})
+    assert response.status_code == status_code
+
+
+def test_availability_of_missing_animal(seeded, login):
+    client = login("volunteer")
+    response = client.get("/volunteer/availability", params={"start": start, "animal_ids": [seeded["animal_id"], 0]})
+    assert response.status_code == 404
+
+
+def test_scheduled_walks_match_availability(seeded, login):
+    client = login("volunteer")
+    animal_id = seeded["animal_id"]
+    masks = client.get("/volunteer/availability",
+                       params={"start": start, "days": 2, "animal_ids": [animal_id]}).json()["occupancy"][str(animal_id)]
+    response = client.get(f"/volunteer/animals/{animal_id}/scheduled-walks",
+                          params={"start_date": f"{start}T00:00:00", "end_date": "2026-10-07T00:00:00"})
+    assert response.status_code == 200, response.text
+    taken = {(slot["date"], int(slot["hour"][:2])) for slot in response.json()["scheduled_slots"]}
+    assert taken == {(day, hour) for day, mask in zip([start, "2026-10-06"], masks) for hour in range(24)
+                     if mask >> hour & 1}
+
+
+def test_scheduled_walks_of_hidden_animal(seeded, login):
+    client = login("volunteer")
+    response = client.get(f"/volunteer/animals/{seeded['hidden_animal_id']}/scheduled-walks",
+                          params={"start_date": f"{start}T00:00:00", "end_date": "2026-10-07T00:00:00"})
+    assert response.status_code == 403
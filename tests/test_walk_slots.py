@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import AnimalsOrm, WalksOrm, WalkStatus, UsersOrm
+from app.database.database import session_factory
+from app.walks import book_walks, set_walk_status
+
+walk_start = datetime(2026, 11, 2, 10)
+
+
+@pytest.fixture
+def walk_animal(seeded) -> int:
+    db = session_factory()
+    try:
+        animal = AnimalsOrm(name="Walker", age=3, species="dog", description="Likes long walks")
+        db.add(animal)
+        db.commit()
+        return animal.id
+    finally:
+        db.close()
+
+
+def test_booking_taken_hour_is_conflict(walk_animal, login):
+    client = login("volunteer")
+    reservation = {"slots": [walk_start.isoformat()], "location": "Park"}
+    response = client.post(f"/volunteer/animals/{walk_animal}/reserve", json=reservation)
+    assert response.status_code == 201, response.text
+    response = client.post(f"/volunteer/animals/{walk_animal}/reserve", json=reservation)
+    assert response.status_code == 409
+    assert "overlap" in response.json()["detail"]
+
+
+def test_conflict_keeps_other_changes_of_the_transaction(walk_animal):
+    db = session_factory()
+    try:
+        volunteer_id = db.query(UsersOrm.id).filter(UsersOrm.username == "volunteer").scalar()
+        book_walks(db, walk_animal, volunteer_id, [(walk_start, walk_start + timedelta(hours=1))], "Park")
+        cancelled = WalksOrm(animal_id=walk_animal, user_id=volunteer_id, date=walk_start, duration=60,
+                             location="Park", status=WalkStatus.cancelled)
+        db.add(cancelled)
+        db.commit()
+        cancelled_id = cancelled.id
+
+        animal = db.get(AnimalsOrm, walk_animal)
+        animal.description = "Changed in the same transaction"
+        # reopening the cancelled walk needs the hour taken by the other one
+        with pytest.raises(HTTPException) as conflict:
+            set_walk_status(db, cancelled, WalkStatus.pending)
+        assert conflict.value.status_code == 409
+        db.commit()
+    finally:
+        db.close()
+
+    db = session_factory()
+    try:
+        assert db.get(AnimalsOrm, walk_animal).description == "Changed in the same transaction"
+        assert db.get(WalksOrm, cancelled_id).status == WalkStatus.cancelled
+    finally:
+        db.close()